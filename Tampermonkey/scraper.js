@@ -10,6 +10,24 @@
 // @require      file:///C:/Users/eduardo/Desktop/TamperScraper/Tampermonkey/scraper.js
 // ==/UserScript==
 
+// Format of the downloaded file. "csv" is the table as shown on the page. "jsonl" and "typed_csv"
+// start with a schema line and hold ISO dates and plain numbers, which money_manager reads with
+// their types instead of parsing the text (see money_manager/utils/typed_statement.py)
+const EXPORT_FORMAT = "csv";
+// Decimal separator of the amounts shown on the page, "." or ","
+const DECIMAL_SEPARATOR = ".";
+const SCHEMA_NAME = "money_manager.typed_statement";
+const SCHEMA_VERSION = 1;
+// Type of the table columns in typed exports, the other columns are text
+const COLUMN_TYPES = {
+  Fecha: "date",
+  "Monto lempiras": "number",
+  "Monto dólares": "number",
+  Débitos: "number",
+  Créditos: "number",
+  Balance: "number",
+};
+
 // Check if an element has display none
 function isElementVisible(elem) {
   if (!elem) return false;
@@ -108,13 +126,79 @@ function tableToList(table) {
   return result;
 }
 
+// Amounts like "L 1,234.56", "-1,234.56" or "(1,234.56)" to numbers, null if empty or unreadable
+function parseAmount(text) {
+  const trimmed = text.trim();
+  if (trimmed === "") return null;
+  const negative = /-|^\(.*\)$/.test(trimmed);
+  let digits = trimmed.replace(/[^\d.,]/g, "");
+  // Thousands separators are the other of "." and ","
+  digits = digits.replaceAll(DECIMAL_SEPARATOR === "." ? "," : ".", "");
+  digits = digits.replaceAll(DECIMAL_SEPARATOR, ".");
+  const amount = digits === "" ? NaN : Number(digits);
+  if (Number.isNaN(amount)) return null;
+  return negative ? -amount : amount;
+}
+
+// Dates shown as dd/mm/yyyy to yyyy-mm-dd, null if they don't look like one
+function parseDate(text) {
+  const match = text.trim().match(/^(\d{1,2})\/(\d{1,2})\/(\d{4})$/);
+  if (!match) return null;
+  const [, day, month, year] = match;
+  return `${year}-${month.padStart(2, "0")}-${day.padStart(2, "0")}`;
+}
+
+// Runs of whitespace to a single space, null if empty
+function parseText(text) {
+  const collapsed = text.split(/\s+/).filter(Boolean).join(" ");
+  return collapsed === "" ? null : collapsed;
+}
+
+// The schema and the typed rows of a table whose first row is the header
+function toTypedTable(array, account_name) {
+  const [header, ...rows] = array;
+  const types = header.map((name) => COLUMN_TYPES[name] || "string");
+  const parsers = { date: parseDate, number: parseAmount, string: parseText };
+  const schema = {
+    schema: SCHEMA_NAME,
+    version: SCHEMA_VERSION,
+    account: account_name,
+    columns: header.map((name, i) => ({ name: name, type: types[i] })),
+  };
+  const typedRows = rows.map((row) =>
+    header.map((_, i) => parsers[types[i]](row[i] || "")),
+  );
+  return { schema: schema, header: header, rows: typedRows };
+}
+
+function typedTableToJSONL(table) {
+  const lines = table.rows.map((row) =>
+    JSON.stringify(
+      Object.fromEntries(table.header.map((name, i) => [name, row[i]])),
+    ),
+  );
+  return [JSON.stringify(table.schema), ...lines].join("\n");
+}
+
+function typedTableToCSV(table) {
+  const cells = table.rows.map((row) =>
+    row.map((value) => (value === null ? "" : String(value))),
+  );
+  return `#${JSON.stringify(table.schema)}\n${arrayToCSV([table.header, ...cells])}`;
+}
+
 function downloadCSV(array, filename) {
   // Convert array to CSV
   var csvContent = arrayToCSV(array); // Use the arrayToCSV function from the previous example
   console.log(csvContent);
-  // Create a Blob from the CSV string
+  // Excel needs the BOM to read the file as UTF-8
   var BOM = "\uFEFF";
-  var blob = new Blob([BOM + csvContent], { type: "text/csv;charset=utf-8;" });
+  downloadFile(BOM + csvContent, filename, "text/csv;charset=utf-8;");
+}
+
+function downloadFile(content, filename, type) {
+  // Create a Blob from the string
+  var blob = new Blob([content], { type: type });
 
   // Create a link and set the URL and download attributes
   var link = document.createElement("a");
@@ -202,8 +286,24 @@ function getData() {
     }
   }
 
-  // Convert to CSV
-  downloadCSV(tableData, `${account_name}.csv`);
+  if (EXPORT_FORMAT === "jsonl") {
+    const table = toTypedTable(tableData, account_name);
+    downloadFile(
+      typedTableToJSONL(table),
+      `${account_name}.jsonl`,
+      "application/jsonl;charset=utf-8;",
+    );
+  } else if (EXPORT_FORMAT === "typed_csv") {
+    const table = toTypedTable(tableData, account_name);
+    downloadFile(
+      typedTableToCSV(table),
+      `${account_name}.csv`,
+      "text/csv;charset=utf-8;",
+    );
+  } else {
+    // Convert to CSV
+    downloadCSV(tableData, `${account_name}.csv`);
+  }
 }
 
 // Add event listener to the button
@@ -0,0 +1,359 @@
+import json
+import os
+import shutil
+
+import numpy as np
+from pandas import DataFrame, Timestamp, concat, to_timedelta
+
+from money_manager.utils.utils import get_tran_cols
+
+try:
+    import xlwt  # pyright: ignore [reportMissingImports]
+except ImportError:
+    xlwt = None
+
+MERCHANTS = [
+    "UBER TRIP",
+    "UBER EATS",
+    "SUPERMERCADO LA COLONIA",
+    "WALMART",
+    "AMAZON MKTP",
+    "NETFLIX.COM",
+    "SPOTIFY",
+    "FARMACIA KIELSA",
+    "SHELL",
+    "PUMA ENERGY",
+    "CAFE ESPRESSO AMERICANO",
+    "MERCADONA",
+    "LIDL",
+    "RENFE VIAJEROS",
+    "TRANSFERENCIA RECIBIDA",
+    "PAGO DE NOMINA",
+]
+
+# One account per supported input format. The id patterns match the first characters of the
+# statements as Inputs sees them.
+ACCOUNTS = {
+    "BENCH BAC CC": {
+        "currency": "MIXED",
+        "bank": "BAC",
+        "type": "credit_card",
+        "id_pattern": "BENCHBACCC",
+    },
+    "BENCH BAC SAVINGS": {
+        "currency": "HNL",
+        "bank": "BAC",
+        "type": "savings",
+        "id_pattern": "BENCHBACSAVINGS",
+    },
+    "BENCH REVOLUT": {
+        "currency": "EUR",
+        "bank": "REVOLUT",
+        "type": "savings",
+        "id_pattern": "TYPEPRODUCTSTARTEDDATE",
+    },
+    "BENCH FICOHSA": {
+        "currency": "HNL",
+        "bank": "FICOHSA",
+        "type": "savings",
+        "id_pattern": "BENCHFICOHSA",
+    },
+    "BENCH SANTANDER": {
+        "currency": "EUR",
+        "bank": "SANTANDER",
+        "type": "savings",
+        "id_pattern": "BENCHSANTANDER",
+    },
+}
+
+
+def available_accounts() -> dict[str, dict[str, str]]:
+    """The benchmark accounts whose statements can be written here.
+
+    Santander exports are legacy .xls files, which pandas can only write with the optional xlwt
+    package.
+    """
+    if xlwt is not None:
+        return ACCOUNTS
+    return {
+        name: atts for name, atts in ACCOUNTS.items() if atts["bank"] != "SANTANDER"
+    }
+
+
+class StatementGenerator:
+    def __init__(self, seed: int = 0) -> None:
+        """Generate synthetic transactions and render them in the format of each bank export.
+
+        Args:
+            seed (int, optional): Seed of the random generator, so runs are comparable.
+        """
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+
+    def transactions(
+        self, account_name: str, rows: int, start: Timestamp, days: int
+    ) -> DataFrame:
+        """Random transactions of one account, sorted by date, in the ledger's canonical form.
+
+        Args:
+            account_name (str): Account the transactions belong to.
+            rows (int): Number of transactions.
+            start (Timestamp): First possible date.
+            days (int): Number of days the transactions are spread over.
+
+        Returns:
+            DataFrame: date, account_name, description, currency and amount (minor units).
+        """
+        rng = self.rng
+        attributes = ACCOUNTS[account_name]
+        merchants = np.array(MERCHANTS)[rng.integers(0, len(MERCHANTS), rows)]
+        references = rng.integers(0, 100000, rows).astype(str)
+
+        # Mostly small expenses with a few large incomes, like a real account
+        amounts = -np.round(rng.lognormal(6.5, 1.2, rows)).astype(np.int64)
+        incomes = rng.random(rows) < 0.08
+        amounts[incomes] = np.round(rng.lognormal(10, 0.8, incomes.sum())).astype(
+            np.int64
+        )
+        if attributes["type"] == "credit_card":
+            amounts = -np.abs(amounts)
+
+        currency = attributes["currency"]
+        if currency == "MIXED":
+            currencies = np.where(rng.random(rows) < 0.7, "HNL", "USD")
+        else:
+            currencies = np.full(rows, currency)
+
+        return (
+            DataFrame(
+                {
+                    "date": start
+                    + to_timedelta(np.sort(rng.integers(0, days, rows)), "D"),
+                    "account_name": account_name,
+                    "description": np.char.add(np.char.add(merchants, " "), references),
+                    "currency": currencies,
+                    "amount": amounts,
+                }
+            )
+            .sort_values("date", kind="stable")
+            .reset_index(drop=True)
+        )
+
+    def ledger(self, transactions: DataFrame) -> DataFrame:
+        """Render transactions as rows of transactions.csv. Ids are recomputed when it's read."""
+        ledger = transactions.assign(
+            date=transactions["date"].dt.strftime("%Y-%m-%d"),
+            amount=transactions["amount"] / 100,
+            tran_type=np.where(transactions["amount"] < 0, "Expense", "Income"),
+            id="",
+        )
+        return ledger.reindex(columns=get_tran_cols())
+
+    def write_statement(self, transactions: DataFrame, folder: str) -> str:
+        """Write the transactions of one account in the export format of its bank.
+
+        Returns:
+            str: Path of the written file.
+        """
+        account_name = transactions["account_name"].iloc[0]
+        attributes = ACCOUNTS[account_name]
+        bank, acc_type = attributes["bank"], attributes["type"]
+        file_stem = os.path.join(folder, account_name)
+
+        if bank == "BAC" and acc_type == "credit_card":
+            return self.write_bac_credit_card(transactions, f"{file_stem}.csv")
+        if bank == "BAC":
+            return self.write_bac_savings(transactions, f"{file_stem}.csv")
+        if bank == "REVOLUT":
+            return self.write_revolut(transactions, f"{file_stem}.csv")
+        if bank == "FICOHSA":
+            return self.write_ficohsa(transactions, f"{file_stem}.csv")
+        return self.write_santander(transactions, f"{file_stem}.xls")
+
+    def write_bac_credit_card(self, transactions: DataFrame, path: str) -> str:
+        # Charges are positive, payments negative, with the amount in the column of its currency
+        amounts = (-transactions["amount"] / 100).map("{:,.2f}".format)
+        is_hnl = transactions["currency"] == "HNL"
+        DataFrame(
+            {
+                "Account Name": transactions["account_name"],
+                "Fecha": transactions["date"].dt.strftime("%d/%m/%Y"),
+                "Concepto": transactions["description"],
+                "Monto lempiras": ("L " + amounts).where(is_hnl, ""),
+                "Monto dólares": ("$ " + amounts).where(~is_hnl, ""),
+            }
+        ).to_csv(path, index=False, encoding="utf_8_sig")
+        return path
+
+    def write_bac_savings(self, transactions: DataFrame, path: str) -> str:
+        amounts = transactions["amount"] / 100
+        DataFrame(
+            {
+                "Account Name": transactions["account_name"],
+                "Fecha": transactions["date"].dt.strftime("%d/%m/%Y"),
+                "Referencia": np.arange(transactions.shape[0]),
+                "Descripción": transactions["description"],
+                "Débitos": (-amounts).clip(lower=0).map("{:,.2f}".format),
+                "Créditos": amounts.clip(lower=0).map("{:,.2f}".format),
+                "Balance": amounts.cumsum().map("{:,.2f}".format),
+            }
+        ).to_csv(path, index=False)
+        return path
+
+    def write_revolut(self, transactions: DataFrame, path: str) -> str:
+        amounts = transactions["amount"] / 100
+        started = transactions["date"] + to_timedelta(
+            self.rng.integers(0, 86400, transactions.shape[0]), "s"
+        )
+        DataFrame(
+            {
+                "Type": np.where(amounts < 0, "CARD_PAYMENT", "TOPUP"),
+                "Product": "Current",
+                "Started Date": started.dt.strftime("%Y-%m-%d %H:%M:%S"),
+                "Completed Date": started.dt.strftime("%Y-%m-%d %H:%M:%S"),
+                "Description": transactions["description"],
+                "Amount": amounts.map("{:.2f}".format),
+                "Fee": "0.00",
+                "Currency": transactions["currency"],
+                "State": "COMPLETED",
+                "Balance": amounts.cumsum().map("{:.2f}".format),
+            }
+        ).to_csv(path, index=False)
+        return path
+
+    def write_ficohsa(self, transactions: DataFrame, path: str) -> str:
+        # The export starts with a few lines about the account before the header row
+        amounts = transactions["amount"] / 100
+        body = DataFrame(
+            {
+                "Fecha": transactions["date"].dt.strftime("%d/%m/%Y"),
+                "Descripción": transactions["description"],
+                "Débito": (-amounts).clip(lower=0).map("{:.2f}".format),
+                "Crédito": amounts.clip(lower=0).map("{:.2f}".format),
+                "Balance": amounts.cumsum().map("{:.2f}".format),
+                "N° Cheque": "",
+            }
+        )
+        preamble = DataFrame(
+            [
+                [transactions["account_name"].iloc[0], "", "", "", "", ""],
+                ["Estado de cuenta", "", "", "", "", ""],
+                list(body.columns),
+            ],
+            columns=body.columns,
+        )
+        concat([preamble, body]).to_csv(path, index=False, header=False)
+        return path
+
+    def write_santander(self, transactions: DataFrame, path: str) -> str:
+        # The header is on the 8th row, after a preamble about the account
+        if xlwt is None:
+            raise RuntimeError("Writing Santander .xls statements requires xlwt")
+
+        amounts = transactions["amount"] / 100
+        dates = transactions["date"].dt.strftime("%d/%m/%Y")
+        rows = [[transactions["account_name"].iloc[0]]] + [[""]] * 6
+        rows.append(
+            ["FECHA OPERACIÓN", "FECHA VALOR", "CONCEPTO", "IMPORTE EUR", "SALDO"]
+        )
+        rows.extend(
+            zip(
+                dates,
+                dates,
+                transactions["description"],
+                amounts.map(lambda x: f"{x:.2f}".replace(".", ",")),
+                amounts.cumsum().map(lambda x: f"{x:.2f}".replace(".", ",")),
+            )
+        )
+
+        workbook = xlwt.Workbook()
+        sheet = workbook.add_sheet("Movimientos")
+        for row_number, row in enumerate(rows):
+            for col_number, value in enumerate(row):
+                sheet.write(row_number, col_number, value)
+        workbook.save(path)
+        return path
+
+
+def build_workspace(
+    base_dir: str,
+    ledger_rows: int,
+    new_rows: int,
+    overlap: float = 0.2,
+    seed: int = 0,
+) -> dict[str, int]:
+    """Create configs, a ledger and a batch of new statements to process under base_dir.
+
+    Every account gets an equal share of the ledger. Each statement repeats the last rows already
+    in the ledger (overlap of the statement), a few of them with a changed description so they
+    are merged, followed by rows that are new.
+
+    Args:
+        base_dir (str): Directory to create the workspace in. Anything in it is replaced.
+        ledger_rows (int): Rows in the existing ledger.
+        new_rows (int): Rows across all the statements to process.
+        overlap (float, optional): Share of each statement already in the ledger.
+        seed (int, optional): Seed of the random generator.
+
+    Returns:
+        dict[str, int]: Number of ledger rows, statement rows and statement files written.
+    """
+    repo_configs = os.path.join(os.path.dirname(os.path.dirname(__file__)), "configs")
+    configs_dir = os.path.join(base_dir, "configs")
+    in_dir = os.path.join(base_dir, "data", "in")
+    out_dir = os.path.join(base_dir, "data", "out")
+    for folder in [configs_dir, in_dir, out_dir]:
+        shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder)
+
+    accounts = available_accounts()
+    shutil.copy(os.path.join(repo_configs, "transaction_structure.json"), configs_dir)
+    with open(os.path.join(configs_dir, "accounts.json"), "w") as accounts_file:
+        json.dump(accounts, accounts_file, indent=2)
+    with open(os.path.join(configs_dir, "configs.json"), "w") as configs_file:
+        json.dump(
+            {
+                "path_configs": {
+                    "out_file_path": "data/out/transactions.csv",
+                    "in_folder_path": "data/in/",
+                }
+            },
+            configs_file,
+            indent=2,
+        )
+
+    generator = StatementGenerator(seed)
+    start = Timestamp("2015-01-01")
+    ledger_parts = []
+    statement_rows = 0
+    for account_name in accounts:
+        account_ledger_rows = ledger_rows // len(accounts)
+        account_new_rows = new_rows // len(accounts)
+        repeated = min(int(account_new_rows * overlap), account_ledger_rows)
+        history = generator.transactions(
+            account_name, account_ledger_rows, start, days=365 * 10
+        )
+        fresh = generator.transactions(
+            account_name,
+            account_new_rows - repeated,
+            start + to_timedelta(365 * 10, "D"),
+            days=30,
+        )
+        ledger_parts.append(history)
+
+        statement = concat([history.tail(repeated), fresh], ignore_index=True)
+        # Banks sometimes change descriptions between exports, which Merger reconciles
+        drifted = generator.rng.random(statement.shape[0]) < 0.02
+        drifted[repeated:] = False
+        statement.loc[drifted, "description"] += " HN"
+        generator.write_statement(statement, in_dir)
+        statement_rows += statement.shape[0]
+
+    generator.ledger(concat(ledger_parts, ignore_index=True)).to_csv(
+        os.path.join(out_dir, "transactions.csv"), index=False, encoding="utf_8_sig"
+    )
+
+    return {
+        "ledger_rows": sum(part.shape[0] for part in ledger_parts),
+        "statement_rows": statement_rows,
+        "statement_files": len(accounts),
+    }
@@ -0,0 +1,280 @@
+"""Benchmark the whole pipeline on synthetic ledgers of growing size.
+
+Every ledger size runs in its own process, so peak memory is measured per size:
+
+    python -m benchmarks.run --sizes 10000 100000 1000000 --new-rows 2000
+
+With --reimport the statements are processed once before the timed run, which then measures a
+run on statements whose rows are all in the ledger already.
+
+Results are written as JSON to benchmarks/results/ unless --output is given.
+"""
+
+import argparse
+import contextlib
+import functools
+import importlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.generator import ACCOUNTS, available_accounts, build_workspace
+
+# Stage name and the method whose time is attributed to it, or the module function when the class
+# is None
+STAGES = [
+    ("load_ledger", "money_manager.existing_transactions", "Ledger", "get"),
+    ("read", "money_manager.input_transactions", "Inputs", "read_file"),
+    ("identify", "money_manager.input_transactions", "Inputs", "identify_statement"),
+    ("clean", "money_manager.transformers.bac", "BacTransformer", "clean"),
+    ("clean", "money_manager.transformers.ficohsa", "FicohsaTransformer", "clean"),
+    ("clean", "money_manager.transformers.revolut", "RevolutTransformer", "clean"),
+    ("clean", "money_manager.transformers.santander", "SantanderTransformer", "clean"),
+    (
+        "hash",
+        "money_manager.utils.dataframe_hasher",
+        "DataFrameHasher",
+        "get_hashed_df",
+    ),
+    ("merge", "money_manager.utils.merger", "Merger", "get_clean_ledger"),
+    ("concat", "money_manager.processor", None, "find_new_rows"),
+    ("write", "money_manager.existing_transactions", "Ledger", "save"),
+]
+
+
+class StageTimer:
+    """Exclusive wall time, calls and traced memory peak of every stage.
+
+    Stages nest, e.g. hashing happens inside cleaning, so the time of an inner stage is taken out
+    of the stage that called it and each second is counted once.
+    """
+
+    def __init__(self, trace_memory: bool) -> None:
+        self.trace_memory: bool = trace_memory
+        self.stages: dict[str, dict] = {}
+        self.stack: list[list] = []
+
+    def wrap(self, stage: str, method):
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            self.start(stage)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.stop()
+
+        return timed
+
+    def start(self, stage: str) -> None:
+        now = time.perf_counter()
+        if self.stack:
+            self._add(self.stack[-1][0], now - self.stack[-1][1])
+        self.stack.append([stage, now])
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+    def stop(self) -> None:
+        now = time.perf_counter()
+        stage, started = self.stack.pop()
+        self._add(stage, now - started)
+        self.stages[stage]["calls"] += 1
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.stages[stage]["peak_bytes"] = max(
+                self.stages[stage]["peak_bytes"], peak
+            )
+        if self.stack:
+            self.stack[-1][1] = now
+
+    def _add(self, stage: str, seconds: float) -> None:
+        totals = self.stages.setdefault(
+            stage,
+            {
+                "seconds": 0.0,
+                "calls": 0,
+                "peak_bytes": 0 if self.trace_memory else None,
+            },
+        )
+        totals["seconds"] += seconds
+
+
+def instrument(timer: StageTimer) -> None:
+    for stage, module_name, class_name, method_name in STAGES:
+        owner = importlib.import_module(module_name)
+        if class_name is not None:
+            owner = getattr(owner, class_name)
+        setattr(owner, method_name, timer.wrap(stage, getattr(owner, method_name)))
+
+
+def run_size(
+    size: int,
+    new_rows: int,
+    trace_memory: bool,
+    seed: int,
+    workers: int,
+    reimport: bool = False,
+) -> dict:
+    """Build a workspace with a ledger of the given size, process it and time every stage.
+
+    Stages run by merge worker processes are only timed by the run report, so the stage
+    breakdown is complete with a single worker.
+    """
+    with tempfile.TemporaryDirectory(prefix="money_manager_bench_") as base_dir:
+        workspace = build_workspace(base_dir, size, new_rows, seed=seed)
+
+        from money_manager.processor import Processor
+        from money_manager.utils.run_metrics import RunMetrics
+
+        if reimport:
+            # Untimed first run, the inputs are kept for the timed one
+            with contextlib.redirect_stdout(io.StringIO()):
+                first = Processor(base_dir, workers=workers)
+                first.process()
+                first.save()
+
+        timer = StageTimer(trace_memory)
+        instrument(timer)
+        if trace_memory:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        # The pipeline reports progress on stdout, which would drown the results
+        with contextlib.redirect_stdout(io.StringIO()):
+            timer.start("other")
+            metrics = RunMetrics(base_dir)
+            processor = Processor(base_dir, metrics=metrics, workers=workers)
+            processor.process()
+            processor.save()
+            timer.stop()
+        total = time.perf_counter() - started
+
+        if trace_memory:
+            tracemalloc.stop()
+
+        return {
+            "size": size,
+            **workspace,
+            "reimport": reimport,
+            "added_rows": int(processor.get_added_rows().shape[0]),
+            "stages": {
+                stage: {**totals, "seconds": round(totals["seconds"], 4)}
+                for stage, totals in timer.stages.items()
+            },
+            # Wall and CPU time, rows and memory of the stages as the run reports them
+            "run_summary": metrics.summary(),
+            "total_seconds": round(total, 4),
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            * (1 if sys.platform == "darwin" else 1024),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the money_manager pipeline")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10000, 100000, 1000000],
+        help="Rows of the existing ledger, one run per size",
+    )
+    parser.add_argument(
+        "--new-rows",
+        type=int,
+        default=2000,
+        help="Rows across the statements merged into the ledger",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes merging accounts in parallel",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Also record the peak of Python allocations of every stage, slows the run",
+    )
+    parser.add_argument(
+        "--reimport",
+        action="store_true",
+        help="Time a second run on the same statements, once their rows are in the ledger",
+    )
+    parser.add_argument("--output", help="Path of the JSON results file")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process: run one size and hand the result to the parent on stdout
+        result = run_size(
+            args.sizes[0],
+            args.new_rows,
+            args.trace_memory,
+            args.seed,
+            args.workers,
+            args.reimport,
+        )
+        print(json.dumps(result))
+        return
+
+    results = []
+    for size in args.sizes:
+        print(f"Benchmarking a ledger of {size} rows", end=" | ", flush=True)
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.run",
+            "--single",
+            "--sizes",
+            str(size),
+            "--new-rows",
+            str(args.new_rows),
+            "--seed",
+            str(args.seed),
+            "--workers",
+            str(args.workers),
+        ]
+        if args.trace_memory:
+            command.append("--trace-memory")
+        if args.reimport:
+            command.append("--reimport")
+        completed = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{result['total_seconds']}s")
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__),
+        "results",
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(
+            {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "skipped_formats": sorted(
+                    ACCOUNTS[name]["bank"]
+                    for name in ACCOUNTS.keys() - available_accounts().keys()
+                ),
+                "results": results,
+            },
+            output_file,
+            indent=2,
+        )
+    print(f"Wrote benchmark results to {output}")
+
+
+if __name__ == "__main__":
+    main()
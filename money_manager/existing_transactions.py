@@ -5,8 +5,13 @@ from pandas import DataFrame, read_csv
 
 from money_manager.utils.dataframe_hasher import DataFrameHasher
 from money_manager.utils.exceptions import FileReadError
-from money_manager.utils.pandas_utils import replace_empty_string_with_nan
-from money_manager.utils.utils import enforce_dataframe_schema, load_config
+from money_manager.utils.pandas_utils import (
+    from_minor_units,
+    replace_empty_string_with_nan,
+    to_minor_units,
+)
+from money_manager.utils.schema_validator import ERROR_COLUMNS, SchemaValidator
+from money_manager.utils.utils import get_csv_dtypes, load_config
 
 
 class Ledger:
@@ -28,6 +33,7 @@ class Ledger:
         self.base_dir = base_dir
         self.existing_transactions: DataFrame = DataFrame()
         self.transaction_structure = load_config(transaction_structure_path)
+        self.schema_errors: DataFrame = DataFrame(columns=ERROR_COLUMNS)
 
     def get(self) -> DataFrame:
         self.build_output_path()
@@ -49,6 +55,11 @@ class Ledger:
         self.existing_transactions = dataframe_hasher.get_hashed_df()
 
     def clean_dataframe(self):
+        self.add_optional_columns()
+        # Amounts are stored as decimals in the file and handled as integer minor units in memory
+        self.existing_transactions = to_minor_units(
+            self.existing_transactions, self.transaction_structure["minor_unit_cols"]
+        )
         self.validate_transaction_df()
         columns = list(self.transaction_structure["structure"].keys())
         self.existing_transactions = replace_empty_string_with_nan(
@@ -56,15 +67,28 @@ class Ledger:
         )
         self.hash_rows()
 
+    def add_optional_columns(self):
+        """Add the optional columns missing from ledgers written before those columns existed."""
+        for col in self.transaction_structure["optional_cols"]:
+            if col not in self.existing_transactions.columns:
+                self.existing_transactions[col] = None
+
     def validate_transaction_df(self):
         """Enforce transaction file structure. Important because a different datatype inference can cause
         the entries to be rehashed to a different hash. For example date vs datetime are different objects therefore
-        have different hashes.
+        have different hashes. Rows breaking the Transaction model are collected in schema_errors.
         """
         if not (self.existing_transactions is None):
-            self.existing_transactions = enforce_dataframe_schema(
-                self.existing_transactions, self.transaction_structure["structure"]
+            validator = SchemaValidator(self.transaction_structure["structure"])
+            self.existing_transactions, self.schema_errors = validator.validate(
+                self.existing_transactions
             )
+            if not self.schema_errors.empty:
+                rows = self.schema_errors["row"].nunique()
+                print(
+                    f"{self.schema_errors.shape[0]} schema violations in {rows} ledger rows",
+                    end=" | ",
+                )
 
     def validate_output_dir(self):
         directory = os.path.dirname(self.output_path)
@@ -80,7 +104,14 @@ class Ledger:
 
     def read_existing_transactions(self):
         try:
-            self.existing_transactions = read_csv(self.output_path)
+            # Read the columns directly into their schema types to avoid converting them afterwards
+            self.existing_transactions = read_csv(
+                self.output_path,
+                dtype=get_csv_dtypes(
+                    self.transaction_structure["structure"],
+                    self.transaction_structure["minor_unit_cols"],
+                ),
+            )
         except Exception as e:
             raise FileReadError(f"Couldn't read transaction file.", self.output_path)
 
@@ -99,3 +130,22 @@ class Ledger:
 
     def get_output_path(self):
         return self.output_path
+
+    def get_schema_errors(self) -> DataFrame:
+        return self.schema_errors
+
+    def save_schema_errors(self) -> None:
+        """Write the violations found when reading the ledger to schema_errors.csv beside it."""
+        self.build_output_path()
+        errors_path = os.path.join(
+            os.path.dirname(self.output_path), "schema_errors.csv"
+        )
+        self.schema_errors.to_csv(errors_path, index=False)
+
+    def save(self, ledger: DataFrame) -> None:
+        """Write the ledger to the output file, rendering minor unit columns as decimal amounts."""
+        self.build_output_path()
+        rendered = from_minor_units(
+            ledger, self.transaction_structure["minor_unit_cols"]
+        )
+        rendered.to_csv(self.output_path, encoding="utf_8_sig", index=False)
@@ -1,23 +1,35 @@
 import os
 import re
 import shutil
+from collections.abc import Iterator
+from dataclasses import replace
+from itertools import chain
 
 from pandas import (
     DataFrame,
+    concat,
     read_csv,
     read_excel,  # pyright: ignore [ reportUnknownVariableType]
 )
 
 from money_manager.models.statement import Statement
-from money_manager.transformers.bac import BacTransformer
-from money_manager.transformers.ficohsa import FicohsaTransformer
-from money_manager.transformers.revolut import RevolutTransformer
-from money_manager.transformers.santander import SantanderTransformer
+from money_manager.transformers.registry import Transformer, TransformerRegistry
+from money_manager.utils.pandas_utils import keep_runs_together
+from money_manager.utils.run_journal import file_sha256
+from money_manager.utils.run_metrics import RunMetrics
+from money_manager.utils.typed_statement import read_schema, read_typed_statement
 from money_manager.utils.utils import get_out_file_path, load_config
 
 
 class Inputs:
-    def __init__(self, base_dir: str, clear_input_dir: bool = False) -> None:
+    def __init__(
+        self,
+        base_dir: str,
+        clear_input_dir: bool = False,
+        metrics: RunMetrics | None = None,
+        skip_files: dict[str, str] | None = None,
+        chunk_size: int | None = None,
+    ) -> None:
         configs_dir = os.path.join(base_dir, "configs")
         accounts_attributes_path = os.path.join(configs_dir, "accounts.json")
         configs_path = os.path.join(configs_dir, "configs.json")
@@ -35,6 +47,13 @@ class Inputs:
         self.cleaned_statements: list[Statement] = []
         self.existing_transactions: DataFrame | None = None
         self.clear_input_dir: bool = clear_input_dir
+        self.metrics: RunMetrics = metrics or RunMetrics(base_dir, enabled=False)
+        self.transformers: TransformerRegistry = TransformerRegistry(base_dir)
+        # Files already merged by an unfinished run, by name with their SHA-256
+        self.skip_files: dict[str, str] = skip_files or {}
+        self.skipped_files: list[str] = []
+        # Read CSV statements this many rows at a time instead of whole
+        self.chunk_size: int | None = chunk_size
 
     def clear_input_directory(self) -> None:
         if self.clear_input_dir:
@@ -60,22 +79,139 @@ class Inputs:
     def get_statements(self):
         return self.cleaned_statements
 
-    def clean_statements(self) -> None:
-        transformers = {
-            "BAC": BacTransformer(self.base_dir),
-            "SANTANDER": SantanderTransformer(self.base_dir),
-            "REVOLUT": RevolutTransformer(self.base_dir),
-            "FICOHSA": FicohsaTransformer(self.base_dir),
-        }
+    def get_skipped_files(self) -> list[str]:
+        return self.skipped_files
 
+    def clean_statements(self) -> None:
         for statement in self.raw_statements:
-            if statement.bank_name in transformers:
-                clean_stmt = transformers[statement.bank_name].clean(statement)
+            # Only the transformers of the banks with statements in this run are imported
+            transformer = self.transformers.get(statement.bank_name)
+            if (
+                transformer is not None
+                and statement.typed
+                and not getattr(transformer, "reads_typed", False)
+            ):
+                print(
+                    f"{statement.bank_name} can't clean typed exports, skipping {statement.filename}"
+                )
+                continue
+            if transformer is not None and statement.chunks is not None:
+                statement = self.prepare_chunks(statement, transformer)
+            if transformer is not None:
+                with self.metrics.stage(
+                    "clean", statement.filename, statement.data.shape[0]
+                ) as stage:
+                    clean_stmt = transformer.clean(statement)
+                    if clean_stmt is not None:
+                        stage.rows_out = clean_stmt.data.shape[0]
                 if clean_stmt is not None:
+                    if statement.chunks is not None:
+                        clean_stmt.chunks = self.clean_chunks(statement, transformer)
                     self.cleaned_statements.append(clean_stmt)
             else:
                 print(f"No transformer found for bank: {statement.bank_name}")
 
+    def prepare_chunks(
+        self, statement: Statement, transformer: Transformer
+    ) -> Statement:
+        """Get a chunked statement ready for its transformer.
+
+        Transformers that can clean a statement a chunk at a time declare stream_key, the raw
+        column whose runs of equal values must be cleaned together, or None. The statements of
+        other transformers are read whole.
+        """
+        chunks = chain([statement.data], statement.chunks or [])
+        if not hasattr(transformer, "stream_key"):
+            print(
+                f"{statement.bank_name} statements can't be cleaned in chunks, reading it whole"
+            )
+            return replace(statement, data=concat(list(chunks)), chunks=None)
+        if transformer.stream_key is not None:
+            chunks = keep_runs_together(chunks, transformer.stream_key)
+        return replace(statement, data=next(chunks), chunks=chunks)
+
+    def clean_chunks(
+        self, statement: Statement, transformer: Transformer
+    ) -> Iterator[DataFrame]:
+        """Read and clean the rest of a chunked statement, one chunk at a time as it is merged."""
+        chunks = statement.chunks or iter([])
+        while True:
+            with self.metrics.stage("read", statement.filename) as stage:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    stage.rows_out = chunk.shape[0]
+            if chunk is None:
+                return
+
+            with self.metrics.stage(
+                "clean", statement.filename, chunk.shape[0]
+            ) as stage:
+                clean_stmt = transformer.clean(
+                    replace(statement, data=chunk, chunks=None)
+                )
+                if clean_stmt is not None:
+                    stage.rows_out = clean_stmt.data.shape[0]
+            if clean_stmt is not None:
+                yield clean_stmt.data
+
+    def read_csv_chunks(
+        self, file_path: str
+    ) -> tuple[DataFrame | None, Iterator[DataFrame] | None]:
+        """Read the first chunk of a CSV file, and an iterator over the others.
+
+        Returns:
+            tuple: The first chunk and the rest of the file, both None if it can't be read.
+        """
+        print(
+            f"Reading {os.path.basename(file_path)} in chunks of {self.chunk_size} rows",
+            end=" | ",
+        )
+        try:
+            # Decoding errors can't be retried halfway through, so the encoding is checked first
+            reader = read_csv(
+                file_path,
+                encoding=None if self.is_utf8(file_path) else "cp1252",
+                chunksize=self.chunk_size,
+            )
+            first = next(reader, DataFrame())
+            print("read success", end=" | ")
+            return first, reader
+        except Exception as e:
+            print(f"failure {e}")
+            return None, None
+
+    def read_typed_file(
+        self, file_path: str, schema: dict
+    ) -> tuple[DataFrame | None, Iterator[DataFrame] | None]:
+        """Read a typed export with the dtypes of its schema, in chunks if chunk_size is set.
+
+        Returns:
+            tuple: The first chunk, or the whole file, and an iterator over the other chunks if
+                read in chunks. Both None if it can't be read.
+        """
+        print(f"Reading {os.path.basename(file_path)} as typed", end=" | ")
+        try:
+            chunks = read_typed_statement(file_path, schema, self.chunk_size)
+            first = next(chunks, DataFrame())
+            print("read success", end=" | ")
+            if self.chunk_size:
+                return first, chunks
+            # The whole file is in the first chunk, this closes it
+            chunks.close()
+            return first, None
+        except Exception as e:
+            print(f"failure {e}")
+            return None, None
+
+    def is_utf8(self, file_path: str) -> bool:
+        with open(file_path, "r", encoding="utf-8") as input_file:
+            try:
+                for _ in iter(lambda: input_file.read(1 << 20), ""):
+                    pass
+            except UnicodeDecodeError:
+                return False
+        return True
+
     def read_csv_with_fallback(self, file_path: str) -> DataFrame:
         try:
             # Try reading with default encoding
@@ -113,7 +249,24 @@ class Inputs:
         for filename in os.listdir(self.in_folder_path):
             # Attempt to read the file
             filepath = os.path.join(self.in_folder_path, filename)
-            stmt_data: DataFrame | None = self.read_file(filepath)
+            # Unchanged files the journal already has are replayed instead of read
+            expected_hash = self.skip_files.get(filename)
+            if expected_hash is not None and file_sha256(filepath) == expected_hash:
+                print(f"Skipping {filename}, merged by the unfinished run")
+                self.skipped_files.append(filename)
+                continue
+
+            chunks: Iterator[DataFrame] | None = None
+            schema = read_schema(filepath)
+            with self.metrics.stage("read", filename) as stage:
+                if schema is not None:
+                    stmt_data, chunks = self.read_typed_file(filepath, schema)
+                elif self.chunk_size and filepath.endswith(".csv"):
+                    stmt_data, chunks = self.read_csv_chunks(filepath)
+                else:
+                    stmt_data = self.read_file(filepath)
+                if stmt_data is not None:
+                    stage.rows_out = stmt_data.shape[0]
 
             # Skip if the file couldn't be read
             if stmt_data is None:
@@ -129,17 +282,20 @@ class Inputs:
             # Attempt to identify the file based on its contents and the id_pattern
             # We try all accounts to see if we can match more than 1 account
             # If more than 1 account is matched then the id process yields ambiguous results
-            for curr_acc_name in self.acc_atts.keys():
-                id_pattern: str = self.acc_atts[curr_acc_name]["id_pattern"]
-                found_match: bool = self.identify_statement(stmt_data, id_pattern, 400)
-
-                # If a match is found then break out of the loop
-                if found_match:
-                    matches_found += 1
-                    acc_name = curr_acc_name
-                    acc_currency = self.acc_atts[curr_acc_name]["currency"]
-                    acc_bank = self.acc_atts[curr_acc_name]["bank"]
-                    acc_type = self.acc_atts[curr_acc_name]["type"]
+            with self.metrics.stage("identify", filename, stmt_data.shape[0]):
+                for curr_acc_name in self.acc_atts.keys():
+                    id_pattern: str = self.acc_atts[curr_acc_name]["id_pattern"]
+                    found_match: bool = self.identify_statement(
+                        stmt_data, id_pattern, 400
+                    )
+
+                    # If a match is found then break out of the loop
+                    if found_match:
+                        matches_found += 1
+                        acc_name = curr_acc_name
+                        acc_currency = self.acc_atts[curr_acc_name]["currency"]
+                        acc_bank = self.acc_atts[curr_acc_name]["bank"]
+                        acc_type = self.acc_atts[curr_acc_name]["type"]
 
             # If no match was found then we print a message and we skip the file
             if matches_found == 0:
@@ -162,6 +318,8 @@ class Inputs:
                 acc_currency,
                 acc_type,
                 False,
+                chunks,
+                schema is not None,
             )
             self.raw_statements.append(stmt)
 
@@ -175,7 +333,10 @@ class Inputs:
     ) -> bool:
         try:
             # print(df.head())
-            content = str.upper(df.to_string()[:num_chars].replace(" ", ""))
+            # The first num_chars characters come from fewer rows than that, the rest isn't rendered
+            content = str.upper(
+                df.head(num_chars).to_string()[:num_chars].replace(" ", "")
+            )
             # print(content)
             if re.search(id_pattern, content):
                 return True
@@ -1,27 +1,335 @@
+import argparse
+import logging
 import os
+import sys
+from typing import TYPE_CHECKING
 
-from money_manager.existing_transactions import Ledger
-from money_manager.input_transactions import Inputs
-from money_manager.processor import Processor
+from money_manager.reporting.dimensions import ROLLUP_KEYS
 
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
 
-def main():
-    print("Starting file processing..")
+logger = logging.getLogger(__name__)
 
-    # Get the directory of the configs file
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    base_dir = os.path.dirname(script_dir)
-    out_path = os.path.join(base_dir, "data/out/transactions.csv")
+# Commands import what they use when they run, so --help and argument errors don't pay for
+# loading pandas, numpy and the bank transformers
+
+
+def process(
+    base_dir: str, args: argparse.Namespace, executor: "Executor | None" = None
+) -> None:
+    from money_manager.processor import Processor
+    from money_manager.utils.run_metrics import Profiler, RunMetrics
+
+    print("Starting file processing..")
+    metrics = RunMetrics(base_dir, enabled=args.profile or not args.no_metrics)
 
     # Process data
-    processor = Processor(base_dir=base_dir, delete_inputs=True)
-    processor.process()
+    processor = Processor(
+        base_dir=base_dir,
+        delete_inputs=True,
+        metrics=metrics,
+        executor=executor,
+        chunk_size=args.chunk_size,
+    )
+    if args.profile:
+        with Profiler(metrics):
+            processor.process()
+            processor.save()
+    else:
+        processor.process()
+        processor.save()
     ledger = processor.get_ledger()
+    metrics.save()
+
+    if processor.unchanged:
+        print("Success, ledger unchanged")
+    else:
+        print(f"Success, ledger has {ledger.shape[0]} rows")
+
+
+def batch(args: argparse.Namespace) -> None:
+    """Process every base directory in this interpreter, sharing one merge worker pool.
+
+    A ledger that fails to read, clean or merge its files is reported and skipped, the others are
+    still processed. The exit code is 1 when any ledger failed. Any other error stops the batch.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    from money_manager.utils.exceptions import FileReadError
+
+    failed: list[str] = []
+    executor = ProcessPoolExecutor(max_workers=args.workers)
+    try:
+        for base_dir in args.base_dirs:
+            base_dir = os.path.abspath(base_dir)
+            print(f"Processing ledger in {base_dir}")
+            try:
+                process(base_dir, args, executor)
+            except (
+                FileReadError,
+                OSError,
+                ValueError,
+                KeyError,
+                BrokenProcessPool,
+            ) as e:
+                logger.exception("Failed to process ledger in %s", base_dir)
+                failed.append(base_dir)
+                # A worker that died breaks the pool for every later ledger, start a new one
+                if isinstance(e, BrokenProcessPool):
+                    executor.shutdown(cancel_futures=True)
+                    executor = ProcessPoolExecutor(max_workers=args.workers)
+    finally:
+        executor.shutdown()
+
+    processed = len(args.base_dirs) - len(failed)
+    print(f"Processed {processed} of {len(args.base_dirs)} ledgers")
+    for base_dir in failed:
+        print(f"Failed: {base_dir}")
+    if failed:
+        sys.exit(1)
+
+
+def report(base_dir: str, args: argparse.Namespace) -> None:
+    from money_manager.reporting.rollup import Rollup
+    from money_manager.utils.pandas_utils import from_minor_units
+
+    filters = {
+        "account_name": args.account,
+        "currency": args.currency,
+        "tran_type": args.tran_type,
+        "category": args.category,
+    }
+    totals = Rollup(base_dir).query(
+        group_by=args.by,
+        from_month=args.from_month,
+        to_month=args.to_month,
+        filters={key: value for key, value in filters.items() if value is not None},
+    )
+    print(from_minor_units(totals, ["amount"]).to_string(index=False))
+
+
+def query(base_dir: str, args: argparse.Namespace) -> None:
+    from money_manager.reporting.ledger_store import LedgerStore
+    from money_manager.utils.pandas_utils import from_minor_units, to_minor_amount
+
+    rows = LedgerStore(base_dir).query(
+        accounts=args.account,
+        from_date=args.from_date,
+        to_date=args.to_date,
+        min_amount=to_minor_amount(args.min_amount),
+        max_amount=to_minor_amount(args.max_amount),
+        categories=args.category,
+        tran_types=args.tran_type,
+    )
+    columns = [
+        "date",
+        "account_name",
+        "tran_type",
+        "category",
+        "description",
+        "currency",
+    ]
+    rendered = from_minor_units(rows, ["amount"])[columns + ["amount", "id"]]
+    print(rendered.to_string(index=False))
+    print(f"{rows.shape[0]} rows")
+
+
+def search(base_dir: str, args: argparse.Namespace) -> None:
+    from money_manager.reporting.text_index import TextIndex
+
+    mode = "prefix" if args.prefix else "fuzzy" if args.fuzzy else "exact"
+    ids = TextIndex(base_dir).search(args.terms, mode=mode, max_edits=args.max_edits)
+    for tran_id in ids:
+        print(tran_id)
+    print(f"{len(ids)} rows")
+
 
-    # Save
-    ledger.to_csv(out_path, encoding="utf_8_sig", index=False)
+def audit_duplicates(base_dir: str, args: argparse.Namespace) -> None:
+    from money_manager.existing_transactions import Ledger
+    from money_manager.utils.duplicate_auditor import DuplicateAuditor
+    from money_manager.utils.utils import get_tran_cols
+
+    ledger = Ledger(base_dir).get().reset_index()[get_tran_cols()]
+    auditor = DuplicateAuditor(
+        base_dir,
+        ledger,
+        max_days=args.max_days,
+        min_similarity=args.min_similarity,
+        workers=args.workers,
+    )
+    auditor.audit()
+    auditor.save_report()
+
+
+def serve(base_dir: str, args: argparse.Namespace) -> None:
+    from money_manager.server import serve as run_server
+
+    run_server(base_dir, host=args.host, port=args.port, flush_delay=args.flush_delay)
+
+
+def rebuild_id_filter(base_dir: str, args: argparse.Namespace) -> None:
+    from money_manager.utils.id_filter import IdFilter
+
+    IdFilter(base_dir).rebuild()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="money_manager",
+        description="Process bank statements into a single ledger. Runs 'process' when no command is given.",
+    )
+    parser.add_argument(
+        "--base-dir",
+        help="Directory containing configs/ and data/. Defaults to the project directory.",
+    )
+    parser.add_argument(
+        "--no-metrics",
+        action="store_true",
+        help="Don't time the stages of the run or write its run report.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Run under cProfile and a memory sampler, saved beside the run report.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        help="Read CSV statements this many rows at a time, for exports too large to load whole.",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("process", help="Read, clean and merge the input statements.")
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Process the statements of several base directories in one run.",
+    )
+    batch_parser.add_argument(
+        "base_dirs", nargs="+", help="Directories containing configs/ and data/."
+    )
+    batch_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes merging accounts, shared by all ledgers. Defaults to the number of CPUs.",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Keep the ledger in memory, merge uploaded statements and answer queries over HTTP.",
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to listen on."
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=8765, help="Port to listen on."
+    )
+    serve_parser.add_argument(
+        "--flush-delay",
+        type=float,
+        default=2.0,
+        help="Seconds to wait for more uploads before writing the ledger.",
+    )
+
+    report_parser = subparsers.add_parser(
+        "report", help="Show totals from the monthly rollup."
+    )
+    report_parser.add_argument(
+        "--by",
+        nargs="+",
+        choices=ROLLUP_KEYS,
+        default=["month"],
+        help="Dimensions to group the totals by.",
+    )
+    report_parser.add_argument("--from-month", help="First month, as YYYY-MM.")
+    report_parser.add_argument("--to-month", help="Last month, as YYYY-MM.")
+    report_parser.add_argument("--account", help="Only this account_name.")
+    report_parser.add_argument("--currency", help="Only this currency.")
+    report_parser.add_argument("--tran-type", help="Only this tran_type.")
+    report_parser.add_argument("--category", help="Only this category.")
+
+    query_parser = subparsers.add_parser(
+        "query", help="Look up ledger rows without loading the whole ledger."
+    )
+    query_parser.add_argument("--account", nargs="+", help="Only these account_names.")
+    query_parser.add_argument("--from-date", help="First date, as YYYY-MM-DD.")
+    query_parser.add_argument("--to-date", help="Last date, as YYYY-MM-DD.")
+    query_parser.add_argument("--min-amount", type=float, help="Lowest amount.")
+    query_parser.add_argument("--max-amount", type=float, help="Highest amount.")
+    query_parser.add_argument("--category", nargs="+", help="Only these categories.")
+    query_parser.add_argument("--tran-type", nargs="+", help="Only these tran_types.")
+
+    search_parser = subparsers.add_parser(
+        "search", help="Find the ids of the rows whose description has all the words."
+    )
+    search_parser.add_argument("terms", nargs="+", help="Words to look for.")
+    mode_group = search_parser.add_mutually_exclusive_group()
+    mode_group.add_argument(
+        "--prefix", action="store_true", help="Match words starting with the terms."
+    )
+    mode_group.add_argument(
+        "--fuzzy", action="store_true", help="Match words close to the terms."
+    )
+    search_parser.add_argument(
+        "--max-edits",
+        type=int,
+        default=1,
+        help="Typos allowed per word with --fuzzy.",
+    )
+
+    audit_parser = subparsers.add_parser(
+        "audit-duplicates",
+        help="Report suspected duplicates already inside the ledger.",
+    )
+    audit_parser.add_argument(
+        "--max-days",
+        type=int,
+        default=3,
+        help="Largest number of days between two duplicates.",
+    )
+    audit_parser.add_argument(
+        "--min-similarity",
+        type=float,
+        default=0.80,
+        help="Lowest description similarity to report, between 0 and 1.",
+    )
+    audit_parser.add_argument(
+        "--workers", type=int, help="Worker processes. Defaults to the number of CPUs."
+    )
+
+    subparsers.add_parser(
+        "rebuild-id-filter",
+        help="Rebuild the filter of ledger ids from the ledger file, e.g. after changing its false positive rate.",
+    )
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    # Get the directory of the configs file
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_dir = args.base_dir or os.path.dirname(script_dir)
 
-    print(f"Success, ledger has {ledger.shape[0]} rows")
+    if args.command == "batch":
+        batch(args)
+    elif args.command == "serve":
+        serve(base_dir, args)
+    elif args.command == "report":
+        report(base_dir, args)
+    elif args.command == "query":
+        query(base_dir, args)
+    elif args.command == "search":
+        search(base_dir, args)
+    elif args.command == "audit-duplicates":
+        audit_duplicates(base_dir, args)
+    elif args.command == "rebuild-id-filter":
+        rebuild_id_filter(base_dir, args)
+    else:
+        process(base_dir, args)
 
 
 if __name__ == "__main__":
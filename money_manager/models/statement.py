@@ -1,3 +1,4 @@
+from collections.abc import Iterator
 from dataclasses import dataclass
 
 from pandas import DataFrame
@@ -13,3 +14,7 @@ class Statement:
     currency: str
     account_type: str
     merged: bool
+    # Rest of a statement read in chunks, data only holding the first chunk
+    chunks: Iterator[DataFrame] | None = None
+    # Read from a typed export, its dates and amounts already parsed, see utils/typed_statement.py
+    typed: bool = False
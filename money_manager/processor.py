@@ -1,76 +1,476 @@
-from pandas import DataFrame, concat
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import chain
+
+import numpy as np
+from pandas import DataFrame, Index, concat
 
 from money_manager.existing_transactions import Ledger
 from money_manager.input_transactions import Inputs
 from money_manager.models.statement import Statement
+from money_manager.reporting.change_feed import ChangeFeed
+from money_manager.reporting.ledger_store import LedgerStore
+from money_manager.reporting.rollup import Rollup
+from money_manager.reporting.text_index import TextIndex
+from money_manager.utils.categorizer import Categorizer
+from money_manager.utils.fx_converter import FxConverter
+from money_manager.utils.id_filter import IdFilter
 from money_manager.utils.merger import Merger
+from money_manager.utils.pandas_utils import concat_keeping_categories
+from money_manager.utils.reconciler import Reconciler
+from money_manager.utils.run_journal import RunJournal
+from money_manager.utils.run_metrics import RunMetrics
+from money_manager.utils.suggester import CategorySuggester
+from money_manager.utils.transfer_detector import TransferDetector
 from money_manager.utils.utils import delete_inputs, get_tran_cols
 
 
+def merge_account(
+    base_dir: str,
+    ledger: DataFrame,
+    statements: list[tuple[str, DataFrame | Iterable[DataFrame]]],
+    metrics_enabled: bool,
+    started: float,
+) -> tuple[DataFrame, list[DataFrame], list[DataFrame], list[dict]]:
+    """Merge the statements of one account, in order, into the ledger rows of that account.
+
+    Module level so worker processes can run it.
+
+    Args:
+        base_dir (str): Path to the project base directory.
+        ledger (DataFrame): The ledger rows of the account, indexed by id.
+        statements (list[tuple[str, DataFrame | Iterable[DataFrame]]]): Filename and cleaned
+            data of every statement, or its cleaned chunks for statements read in chunks.
+        metrics_enabled (bool): Whether to measure the stages.
+        started (float): Start of the run, so stage start times line up with the parent's.
+
+    Returns:
+        tuple: The merged ledger rows of the account, the rows added and the merges of every
+            statement, and the stage records.
+    """
+    metrics = RunMetrics(base_dir, enabled=metrics_enabled)
+    metrics.started = started
+    added: list[DataFrame] = []
+    merges: list[DataFrame] = []
+    for filename, stmt_data in statements:
+        print(f"Merging {filename}", end=" | ")
+
+        # Chunks are merged into the ledger one after the other, but their new rows are only
+        # added at the end, so like a whole statement they are never matched with each other
+        chunks = [stmt_data] if isinstance(stmt_data, DataFrame) else stmt_data
+        chunk_added: list[DataFrame] = []
+        chunk_merges: list[DataFrame] = []
+        for chunk in chunks:
+            # Rows already in the ledger have nothing to merge or add
+            with metrics.stage("screen", filename, chunk.shape[0]) as stage:
+                chunk = find_new_rows(ledger, chunk)
+                stage.rows_out = chunk.shape[0]
+
+            # This merges considering non-exact matches since the bank can slightly
+            # change the transaction description throughout the lifetime of the statement
+            with metrics.stage("merge", filename, chunk.shape[0]) as stage:
+                merger = Merger(base_dir, ledger, chunk)
+                ledger = merger.get_clean_ledger()
+                chunk_merges.append(merger.get_merges())
+                stage.rows_out = ledger.shape[0]
+            with metrics.stage("concat", filename, chunk.shape[0]) as stage:
+                chunk_added.append(find_new_rows(ledger, chunk))
+                stage.rows_out = chunk_added[-1].shape[0]
+
+        valid_stmt = concat_keeping_categories(chunk_added).sort_values(
+            by=["date"], ascending=False
+        )
+        ledger = concat_keeping_categories([ledger, valid_stmt])
+        print(f"added {valid_stmt.shape[0]} rows")
+        added.append(valid_stmt)
+        merges.append(chain_merges(chunk_merges))
+
+    # Later statements can merge into the rows earlier ones added, which keep their positions
+    # at the end of the ledger, so the added rows are taken as they ended up
+    start = ledger.shape[0] - sum(rows.shape[0] for rows in added)
+    for i, rows in enumerate(added):
+        added[i] = ledger.iloc[start : start + rows.shape[0]]
+        start += rows.shape[0]
+
+    return ledger, added, merges, metrics.records
+
+
+def find_new_rows(ledger: DataFrame, stmt: DataFrame) -> DataFrame:
+    """Rows of the statement whose id is not in the ledger, in statement order.
+
+    Bank statement exports can contain records already in the existing transactions.
+    """
+    return stmt.loc[~stmt.index.isin(ledger.index)]
+
+
+def chain_merges(merges: list[DataFrame]) -> DataFrame:
+    """The merges of consecutive chunks as one frame, as if a whole statement made them.
+
+    A row merged again by a later chunk keeps its first old_id and takes the last id and
+    description.
+    """
+    chained = merges[0].reset_index(drop=True)
+    for later in merges[1:]:
+        if later.empty:
+            continue
+        follow = later.drop_duplicates("old_id", keep="last").set_index("old_id")
+        earlier_ids = chained["id"]
+        moved = earlier_ids.isin(follow.index).to_numpy()
+        chained = chained.copy()
+        chained.loc[moved, ["id", "description"]] = follow.loc[
+            earlier_ids[moved], ["id", "description"]
+        ].to_numpy()
+        chained = concat(
+            [chained, later.loc[~later["old_id"].isin(earlier_ids)]],
+            ignore_index=True,
+        )
+    return chained
+
+
 class Processor:
-    def __init__(self, base_dir: str, delete_inputs: bool = False) -> None:
+    def __init__(
+        self,
+        base_dir: str,
+        delete_inputs: bool = False,
+        metrics: RunMetrics | None = None,
+        workers: int | None = None,
+        executor: Executor | None = None,
+        chunk_size: int | None = None,
+    ) -> None:
         self.base_dir: str = base_dir
         self.ledger: DataFrame = DataFrame()
+        self.original_ledger: DataFrame = DataFrame(columns=get_tran_cols()).set_index(
+            "id"
+        )
+        self.merges: list[DataFrame] = []
+        self.added_rows: DataFrame = DataFrame(columns=get_tran_cols())
+        self.replaced_rows: DataFrame = DataFrame(columns=get_tran_cols())
+        self.reconciler: Reconciler | None = None
+        self.categorizer: Categorizer | None = None
+        self.suggester: CategorySuggester | None = None
         self.cleaned_statements: list[Statement] = []
         self.delete_inputs: bool = delete_inputs
+        self.metrics: RunMetrics = metrics or RunMetrics(base_dir, enabled=False)
+        self.workers: int = workers or os.cpu_count() or 1
+        # A pool shared by several runs, e.g. in batch mode. Without one each run starts its own
+        self.executor: Executor | None = executor
+        # Read CSV statements this many rows at a time, so memory doesn't grow with their size
+        self.chunk_size: int | None = chunk_size
+        # Set by process, so runs on a ledger in memory, e.g. in the server, aren't journaled
+        self.journal: RunJournal | None = None
+        # Set by process when every statement row is in the ledger already, see known_statements
+        self.unchanged: bool = False
 
     def get_ledger(self):
         return self.ledger
 
+    def get_added_rows(self):
+        return self.added_rows
+
+    def get_replaced_rows(self):
+        return self.replaced_rows
+
+    def save(self) -> None:
+        """Write the processed ledger and bring the reporting rollup up to date with this run."""
+        if self.unchanged:
+            # The ledger wasn't read and the run would write it as it is
+            if self.delete_inputs:
+                delete_inputs(self.cleaned_statements)
+            if self.journal is not None:
+                self.journal.clear()
+            return
+
+        # Rows changed by this run are swapped in the rollup: old versions out, new versions in
+        rollup_added = self.ledger[
+            self.ledger["id"].isin(self.added_rows["id"])
+            | self.ledger["id"].isin(self.replaced_rows["id"])
+        ]
+
+        rows = self.ledger.shape[0]
+        metrics = self.metrics
+
+        # The rollup checks the ledger file before it is overwritten to detect outside edits
+        with metrics.stage("rollup_sync", rows_in=rollup_added.shape[0]):
+            rollup = Rollup(self.base_dir)
+            rollup.sync(self.ledger, rollup_added, self.replaced_rows)
+        with metrics.stage("id_filter_sync", rows_in=rows):
+            id_filter = IdFilter(self.base_dir)
+            ids = self.ledger["id"]
+            id_filter.sync(
+                Index(ids), Index(ids[~ids.isin(self.original_ledger.index)])
+            )
+
+        with metrics.stage("write", rows_in=rows):
+            Ledger(self.base_dir).save(self.ledger)
+            if self.journal is not None:
+                self.journal.mark_saved()
+        with metrics.stage("rollup_save"):
+            rollup.save()
+        with metrics.stage("id_filter_save"):
+            id_filter.save()
+        with metrics.stage("change_feed", rows_in=rows):
+            ChangeFeed(self.base_dir).write(
+                self.original_ledger, self.ledger, self.merges
+            )
+        with metrics.stage("ledger_store", rows_in=rows):
+            LedgerStore(self.base_dir).save(self.ledger)
+        with metrics.stage("text_index", rows_in=rows):
+            TextIndex(self.base_dir).update(self.ledger)
+
+        with metrics.stage("save_state"):
+            if self.reconciler is not None:
+                self.reconciler.save_discrepancies()
+            if self.categorizer is not None:
+                self.categorizer.save_applied_rules()
+            if self.suggester is not None:
+                self.suggester.save_index()
+
+        # Inputs are only deleted once the ledger holding them is written
+        if self.delete_inputs:
+            delete_inputs(self.cleaned_statements)
+        if self.journal is not None:
+            self.journal.clear()
+
     def process(self) -> None:
-        # Read the existing ledger file or create a new one
-        ledger = Ledger(self.base_dir).get()
+        metrics = self.metrics
+
+        # Resume the run stopped before finishing on this ledger, if any
+        self.journal = RunJournal(self.base_dir)
+        self.journal.open()
+        if self.journal.saved:
+            # It wrote the ledger but was stopped before deleting its inputs
+            if self.delete_inputs:
+                delete_inputs(self.journal.statements())
+            self.journal.reset()
 
         # Read the new files and get the cleaned statements
-        inputs: Inputs = Inputs(self.base_dir)
+        inputs: Inputs = Inputs(
+            self.base_dir,
+            metrics=metrics,
+            skip_files=self.journal.files(),
+            chunk_size=self.chunk_size,
+        )
         inputs.process()
         clean_statements: list[Statement] = inputs.get_statements()
 
-        # Merge each input with the ledger considering non-exact duplicates
-        for stmt in clean_statements:
-            stmt_data = stmt.data
-            filename = stmt.filename
+        # A run on statements the ledger already has would write it as it is, so it isn't read
+        if clean_statements and not inputs.get_skipped_files():
+            rows = sum(stmt.data.shape[0] for stmt in clean_statements)
+            with metrics.stage("known_rows", rows_in=rows):
+                self.unchanged = self.known_statements(clean_statements)
+            if self.unchanged:
+                print(f"All {rows} rows are in the ledger already, it is left as it is")
+                self.cleaned_statements = clean_statements
+                return
 
-            print(f"Merging {filename}", end=" | ")
+        # Read the existing ledger file or create a new one
+        with metrics.stage("load_ledger") as stage:
+            ledger_file = Ledger(self.base_dir)
+            ledger = ledger_file.get()
+            ledger_file.save_schema_errors()
+            self.original_ledger = ledger
+            stage.rows_out = ledger.shape[0]
 
-            # This merges considering non-exact matches since the bank can slightly
-            # change the transaction description throughout the lifetime of the statement
-            merger = Merger(self.base_dir, ledger, stmt_data)
-            ledger = merger.get_clean_ledger()
-            ledger = self.concat_statement(ledger, stmt_data)
-            stmt.merged = True
+        with metrics.stage("replay") as stage:
+            ledger, replayed, replayed_added, self.merges = self.journal.replay(
+                ledger, inputs.get_skipped_files()
+            )
+            stage.rows_out = sum(rows.shape[0] for rows in replayed_added)
+        self.cleaned_statements = replayed + clean_statements
+
+        self.process_statements(ledger, clean_statements, replayed_added)
+
+    def known_statements(self, statements: list[Statement]) -> bool:
+        """Check, without reading the ledger file, whether every statement row is in it already.
+
+        The id filter rules out the rows that are certainly new. The ids of the others are only
+        looked up in the ledger store partitions of their account and year. When all rows are
+        found and the ledger and the configs are as the last run left them, a run would only
+        screen out every row and write the ledger unchanged.
+
+        Args:
+            statements (list[Statement]): The cleaned statements of the run.
+
+        Returns:
+            bool: Whether the run can leave the ledger as it is.
+        """
+        # Chunked statements would have to be read whole to be checked
+        if any(stmt.chunks is not None for stmt in statements):
+            return False
+        id_filter = IdFilter(self.base_dir)
+        if not id_filter.load() or not id_filter.configs_unchanged():
+            return False
+        store = LedgerStore(self.base_dir)
+        if not store.is_current():
+            return False
+
+        partitions: set[tuple[str, int]] = set()
+        for stmt in statements:
+            data = stmt.data
+            if data.empty:
+                continue
+            if not id_filter.might_contain(data.index).all():
+                return False
+            years = data["date"].dt.year
+            if years.isna().any():
+                return False
+            accounts = data["account_name"].astype("string")
+            partitions.update(zip(accounts, years.astype(int)))
+
+        ids = store.read_ids(partitions)
+        return all(stmt.data.index.isin(ids).all() for stmt in statements)
+
+    def process_statements(
+        self,
+        ledger: DataFrame,
+        statements: list[Statement],
+        replayed_added: list[DataFrame] | None = None,
+    ) -> None:
+        """Merge cleaned statements into a ledger and run every stage after the merge.
+
+        Args:
+            ledger (DataFrame): The ledger indexed by id, as Ledger.get returns it.
+            statements (list[Statement]): The cleaned statements, in the order they were read.
+            replayed_added (list[DataFrame] | None, optional): Rows the ledger already got from
+                statements replayed from the journal, processed as added by this run.
+        """
+        metrics = self.metrics
+
+        # Merge each input with the ledger considering non-exact duplicates
+        ledger, added = self.merge_statements(ledger, statements)
+        added = (replayed_added or []) + added
 
         tran_cols = get_tran_cols()
         self.ledger = ledger.reset_index()[tran_cols]
+        if added:
+            self.added_rows = (
+                concat_keeping_categories(added)
+                .reset_index()
+                .reindex(columns=tran_cols)
+            )
 
-        # Delete the input files
-        if self.delete_inputs:
-            delete_inputs(clean_statements)
-
-    def concat_statement(self, ledger: DataFrame, stmt: DataFrame):
-        # Perform a left join to identify new records since the bank statement exports can contain records already in the existing
-        # transactions. Add a placeholder column with a constant value to perform the join without pandas
-        # adding _x and _y to the output column names because both dataframes have the same column names.
-
-        # Create a copy of the ledger
-        ledger_c = ledger.copy()
-        ledger_c["placeholder"] = 1
-        valid_stmt = (
-            stmt.merge(
-                ledger_c[["placeholder"]],
-                left_index=True,
-                right_index=True,
-                how="left",
+        # Extend the running balances with the new rows and compare them with the statements
+        rows = self.ledger.shape[0]
+        with metrics.stage("reconcile", rows_in=self.added_rows.shape[0]):
+            self.reconciler = Reconciler(self.base_dir, self.ledger)
+            self.ledger = self.reconciler.get_reconciled_ledger(self.added_rows)
+
+        # Add the amounts in the reporting currency to the rows that don't have them yet
+        with metrics.stage("fx", rows_in=rows):
+            self.ledger = FxConverter(self.base_dir, self.ledger).get_converted_ledger()
+
+        # Link the two sides of transfers between accounts so they don't count as expense and income
+        with metrics.stage("transfers", rows_in=rows) as stage:
+            transfer_detector = TransferDetector(self.base_dir, self.ledger)
+            self.ledger = transfer_detector.get_transfer_ledger()
+            stage.rows_out = transfer_detector.get_replaced_rows().shape[0]
+
+        # Categorize the new rows and the rows affected by changes to the rules
+        with metrics.stage("categorize", rows_in=self.added_rows.shape[0]) as stage:
+            self.categorizer = Categorizer(self.base_dir, self.ledger)
+            self.ledger = self.categorizer.get_categorized_ledger(self.added_rows)
+            stage.rows_out = self.categorizer.get_replaced_rows().shape[0]
+
+        # Suggest categories for the rows no rule matched from similar hand-categorized rows
+        with metrics.stage("suggest", rows_in=rows) as stage:
+            self.suggester = CategorySuggester(self.base_dir, self.ledger)
+            self.ledger = self.suggester.get_suggested_ledger()
+            stage.rows_out = self.suggester.get_replaced_rows().shape[0]
+
+        # A row changed by several stages keeps the version it had before the first one ran
+        replaced_frames = [
+            rows
+            for rows in [
+                transfer_detector.get_replaced_rows(),
+                self.categorizer.get_replaced_rows(),
+                self.suggester.get_replaced_rows(),
+            ]
+            if not rows.empty
+        ]
+        if replaced_frames:
+            replaced = concat_keeping_categories(replaced_frames).drop_duplicates(
+                subset=["id"], keep="first"
             )
-            .query("placeholder.isnull()")
-            .sort_values(by=["date"], ascending=False)
-            .drop(["placeholder"], axis=1)
-        )
+            # Only rows that were already in the ledger file need their old version replaced
+            self.replaced_rows = replaced[~replaced["id"].isin(self.added_rows["id"])]
 
-        # Drop the helper column and concatenate
-        ledger_c.drop(["placeholder"], axis=1, inplace=True)
-        concatenated: DataFrame = concat([ledger_c, valid_stmt])
+    def merge_statements(
+        self, ledger: DataFrame, statements: list[Statement]
+    ) -> tuple[DataFrame, list[DataFrame]]:
+        """Merge the statements into the ledger, one account per worker process.
 
-        print(f"added {valid_stmt.shape[0]} rows")
+        Merges only match rows of the same account_name, so each account is merged on its own rows
+        of the ledger. The result doesn't depend on how accounts are spread over the workers: rows
+        already in the ledger keep their positions and the rows of each statement are added after
+        them in the order the statements were read.
+
+        Returns:
+            tuple[DataFrame, list[DataFrame]]: The merged ledger and the rows each statement added.
+        """
+        by_account: dict[str, list[int]] = {}
+        for position, stmt in enumerate(statements):
+            by_account.setdefault(stmt.account_name, []).append(position)
+        if not by_account:
+            return ledger, []
+
+        ledger_accounts = ledger["account_name"].astype("string").to_numpy()
+        masks = [ledger_accounts == account_name for account_name in by_account]
+        jobs = [
+            (
+                self.base_dir,
+                ledger.loc[mask],
+                [
+                    (statements[i].filename, self.statement_data(statements[i]))
+                    for i in positions
+                ],
+                self.metrics.enabled,
+                self.metrics.started,
+            )
+            for mask, positions in zip(masks, by_account.values())
+        ]
+
+        # Put the rows of every account back where they were, then the added rows in read order
+        untouched = ~np.logical_or.reduce(masks)
+        existing_parts = [ledger.loc[untouched]]
+        existing_positions = [np.flatnonzero(untouched)]
+        added: list[DataFrame] = [DataFrame()] * len(statements)
+        # Accounts are journaled as they finish, so a crash keeps the ones already merged
+        results = self.run_merge_jobs(jobs)
+        for result, mask, positions in zip(results, masks, by_account.values()):
+            account_ledger, account_added, account_merges, records = result
+            existing_parts.append(account_ledger.iloc[: int(mask.sum())])
+            existing_positions.append(np.flatnonzero(mask))
+            for i, valid_stmt, merges in zip(positions, account_added, account_merges):
+                added[i] = valid_stmt
+                statements[i].merged = True
+                if self.journal is not None:
+                    self.journal.record(statements[i], valid_stmt, merges)
+                self.merges.append(merges[["old_id", "id"]])
+            self.metrics.records.extend(records)
+
+        order = np.argsort(np.concatenate(existing_positions), kind="stable")
+        existing = concat_keeping_categories(existing_parts).iloc[order]
+        return concat_keeping_categories([existing] + added), added
+
+    def run_merge_jobs(self, jobs: list[tuple]) -> Iterator[tuple]:
+        """Run merge_account for every job, yielding the results in job order as they finish."""
+        workers = min(self.workers, len(jobs))
+        # Chunks are read from the input files as they are merged, which only this process can do
+        streamed = any(
+            not isinstance(data, DataFrame) for job in jobs for _, data in job[2]
+        )
+        if self.executor is not None and len(jobs) > 1 and not streamed:
+            yield from self.executor.map(merge_account, *zip(*jobs))
+        elif workers == 1 or self.executor is not None or streamed:
+            for job in jobs:
+                yield merge_account(*job)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                yield from executor.map(merge_account, *zip(*jobs))
 
-        return concatenated
+    def statement_data(self, statement: Statement) -> DataFrame | Iterator[DataFrame]:
+        """The cleaned data of a statement, or all its chunks if it was read in chunks."""
+        if statement.chunks is None:
+            return statement.data
+        return chain([statement.data], statement.chunks)
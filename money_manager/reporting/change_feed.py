@@ -0,0 +1,170 @@
+import glob
+import json
+import os
+import re
+
+import numpy as np
+from pandas import CategoricalDtype, DataFrame, Series, concat
+
+from money_manager.utils.pandas_utils import from_minor_units
+from money_manager.utils.utils import get_out_file_path, get_tran_cols, load_config
+
+
+class ChangeFeed:
+    """Per-run deltas of the ledger as JSON Lines files, kept beside the ledger in changes/.
+
+    Every run that changes the ledger writes changes/<sequence>.jsonl, the sequence growing by one
+    per file, so consumers only apply the files after the last one they synced. Each line is one
+    change with its sequence and op:
+
+    - insert: a row new to the ledger, with all its columns.
+    - update: a row already in the ledger that changed. It carries all its new columns, old_id
+      (different from id when a merge replaced the description), old_description and the list of
+      changed_columns.
+    - delete: only the id of a row no longer in the ledger.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        configs_dir = os.path.join(base_dir, "configs")
+        configs = load_config(os.path.join(configs_dir, "configs.json"))
+        ledger_path = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.feed_dir: str = os.path.join(os.path.dirname(ledger_path), "changes")
+        self.sequence_path: str = os.path.join(self.feed_dir, "sequence.json")
+        self.minor_unit_cols: list[str] = load_config(
+            os.path.join(configs_dir, "transaction_structure.json")
+        )["minor_unit_cols"]
+
+    def write(
+        self, before: DataFrame, after: DataFrame, merges: list[DataFrame]
+    ) -> int | None:
+        """Write the changes between the ledger before and after a run.
+
+        Args:
+            before (DataFrame): The ledger as it was read, indexed by id.
+            after (DataFrame): The ledger as it was written, with an id column.
+            merges (list[DataFrame]): The old_id and id of the rows merged by every statement,
+                in the order the statements were merged.
+
+        Returns:
+            int | None: Sequence of the written file, None if the run changed nothing.
+        """
+        changes = self.changes(before, after, merges)
+        if changes.empty:
+            print("No ledger changes to export")
+            return None
+
+        sequence = self.next_sequence()
+        changes.insert(0, "sequence", sequence)
+        os.makedirs(self.feed_dir, exist_ok=True)
+        feed_path = os.path.join(self.feed_dir, f"{sequence:08d}.jsonl")
+        staging_path = f"{feed_path}.tmp"
+        changes.to_json(
+            staging_path,
+            orient="records",
+            lines=True,
+            date_format="iso",
+            force_ascii=False,
+        )
+        os.replace(staging_path, feed_path)
+        # The file is in place before the sequence moves, so a crash never skips a number
+        with open(self.sequence_path, "w") as sequence_file:
+            json.dump({"sequence": sequence}, sequence_file)
+
+        counts = changes["op"].value_counts()
+        print(
+            f"Exported changes #{sequence}: {counts.get('insert', 0)} inserted, "
+            f"{counts.get('update', 0)} updated, {counts.get('delete', 0)} deleted"
+        )
+        return sequence
+
+    def changes(
+        self, before: DataFrame, after: DataFrame, merges: list[DataFrame]
+    ) -> DataFrame:
+        """Pair every row read with the row it became and classify the differences."""
+        cols = get_tran_cols()
+        value_cols = [col for col in cols if col != "id"]
+        # A ledger read from an empty or missing file has no columns
+        before = before.reset_index().reindex(columns=cols)
+        after = after[cols].reset_index(drop=True)
+
+        # Follow each row read through the merges of every statement to its final id
+        resolved = before["id"].astype("string")
+        for merged in merges:
+            if merged.empty:
+                continue
+            id_map = merged.drop_duplicates("old_id", keep="last").set_index("old_id")[
+                "id"
+            ]
+            resolved = resolved.map(id_map).astype("string").fillna(resolved)
+
+        after_ids = after["id"].astype("string")
+        first_position = Series(np.arange(after.shape[0]), index=after_ids)
+        first_position = first_position[~first_position.index.duplicated()]
+        matched = first_position.reindex(resolved).to_numpy()
+        kept = ~np.isnan(matched)
+        before_rows = np.flatnonzero(kept)
+        after_rows = matched[kept].astype(np.int64)
+
+        old = before.iloc[before_rows].reset_index(drop=True)
+        new = after.iloc[after_rows].reset_index(drop=True)
+        differs = DataFrame(
+            {col: self.column_differs(old[col], new[col]) for col in value_cols}
+        )
+        changed = differs.any(axis=1).to_numpy() | (
+            old["id"].to_numpy() != new["id"].to_numpy()
+        )
+
+        updates = new.loc[changed].reset_index(drop=True)
+        updates["old_id"] = old.loc[changed, "id"].to_numpy()
+        updates["old_description"] = old.loc[changed, "description"].to_numpy()
+        updates["changed_columns"] = [
+            [col for col, is_different in zip(value_cols, row) if is_different]
+            for row in differs.loc[changed].itertuples(index=False)
+        ]
+
+        matched_after = np.zeros(after.shape[0], dtype=bool)
+        matched_after[matched[kept].astype(np.int64)] = True
+        inserts = after.loc[~matched_after]
+        deletes = before.loc[~kept, ["id"]]
+
+        frames = [
+            frame
+            for frame in [
+                inserts.assign(op="insert"),
+                updates.assign(op="update"),
+                deletes.assign(op="delete"),
+            ]
+            if not frame.empty
+        ]
+        if not frames:
+            return DataFrame()
+        changes = concat(frames, ignore_index=True)
+        changes = from_minor_units(changes, self.minor_unit_cols)
+        return changes.reindex(
+            columns=["op"] + cols + ["old_id", "old_description", "changed_columns"]
+        )
+
+    def column_differs(self, old: Series, new: Series) -> np.ndarray:
+        """Whether each pair of aligned values differs, two missing values being equal."""
+        # Categoricals of both ledgers can have different categories, compare their values
+        if isinstance(old.dtype, CategoricalDtype):
+            old = old.astype("string")
+        if isinstance(new.dtype, CategoricalDtype):
+            new = new.astype("string")
+        different = (old != new).fillna(True)
+        both_missing = old.isna() & new.isna()
+        return (different & ~both_missing).to_numpy(dtype=bool)
+
+    def next_sequence(self) -> int:
+        """One more than the last sequence written, even if sequence.json was lost."""
+        last = 0
+        if os.path.exists(self.sequence_path):
+            with open(self.sequence_path, "r") as sequence_file:
+                last = json.load(sequence_file)["sequence"]
+        for feed_path in glob.glob(os.path.join(self.feed_dir, "*.jsonl")):
+            match = re.fullmatch(r"(\d+)\.jsonl", os.path.basename(feed_path))
+            if match:
+                last = max(last, int(match.group(1)))
+        return last + 1
@@ -0,0 +1,3 @@
+# Dimensions of the rollup, in the order they are stored. Kept apart from the rollup so the CLI
+# can offer them without importing pandas.
+ROLLUP_KEYS = ["month", "account_name", "currency", "tran_type", "category"]
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from pandas import DataFrame, Index, Timestamp, concat, read_parquet
+from pandas.util import hash_pandas_object
+
+from money_manager.existing_transactions import Ledger
+from money_manager.utils.utils import (
+    cast_dataframe_columns,
+    get_out_file_path,
+    get_tran_cols,
+    load_config,
+)
+
+
+class LedgerStore:
+    """A copy of the ledger partitioned for lookups, kept beside the ledger in ledger_store/.
+
+    Every (account_name, year) partition is a Parquet file sorted by date. manifest.json holds a
+    zone map per partition (row count, date and amount ranges, categories and tran_types present)
+    so a query only opens the partitions that can contain matching rows, and Parquet row group
+    statistics skip the parts of those files outside the date and amount ranges. Only partitions
+    whose content changed are rewritten on save. Like the rollup, the store records the ledger
+    file it was built from and is rebuilt when that file was edited outside of a run.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        configs_dir = os.path.join(base_dir, "configs")
+        configs = load_config(os.path.join(configs_dir, "configs.json"))
+        self.base_dir: str = base_dir
+        self.ledger_path: str = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.store_dir: str = os.path.join(
+            os.path.dirname(self.ledger_path), "ledger_store"
+        )
+        self.manifest_path: str = os.path.join(self.store_dir, "manifest.json")
+        self.transaction_structure: dict = load_config(
+            os.path.join(configs_dir, "transaction_structure.json")
+        )
+
+    def save(self, ledger: DataFrame) -> None:
+        """Write the partitions that changed and the manifest. Call after the ledger file is written."""
+        manifest = self.load_manifest()
+        previous = {
+            partition["path"]: partition for partition in manifest.get("partitions", [])
+        }
+
+        partitions = []
+        written = 0
+        ledger = ledger[get_tran_cols()]
+        years = ledger["date"].dt.year
+        for (account_name, year), rows in ledger.groupby(
+            [ledger["account_name"].astype("string"), years], sort=True
+        ):
+            rows = rows.sort_values("date", kind="stable").reset_index(drop=True)
+            path = self.partition_path(account_name, int(year))
+            zone_map = self.zone_map(rows, account_name, int(year), path)
+            if previous.get(path, {}).get("hash") != zone_map["hash"]:
+                file_path = os.path.join(self.store_dir, path)
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                rows.to_parquet(file_path, index=False, row_group_size=5000)
+                written += 1
+            partitions.append(zone_map)
+
+        # Partitions left without rows, e.g. after a merge moved them to another day
+        kept = {partition["path"] for partition in partitions}
+        for path in previous.keys() - kept:
+            file_path = os.path.join(self.store_dir, path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(self.manifest_path, "w") as manifest_file:
+            json.dump(
+                {"ledger": self._ledger_fingerprint(), "partitions": partitions},
+                manifest_file,
+                indent=2,
+            )
+        print(
+            f"Updated ledger store, {written} of {len(partitions)} partitions written"
+        )
+
+    def query(
+        self,
+        accounts: list[str] | None = None,
+        from_date: str | None = None,
+        to_date: str | None = None,
+        min_amount: int | None = None,
+        max_amount: int | None = None,
+        categories: list[str] | None = None,
+        tran_types: list[str] | None = None,
+    ) -> DataFrame:
+        """Find the ledger rows matching all of the given conditions.
+
+        Args:
+            accounts (list[str] | None): Only these account names.
+            from_date (str | None): First date to include, formatted as YYYY-MM-DD.
+            to_date (str | None): Last date to include, formatted as YYYY-MM-DD.
+            min_amount (int | None): Lowest amount to include, in minor units.
+            max_amount (int | None): Highest amount to include, in minor units.
+            categories (list[str] | None): Only these categories.
+            tran_types (list[str] | None): Only these transaction types.
+
+        Returns:
+            DataFrame: The matching rows ordered by account_name and date, amounts in minor units.
+        """
+        self.ensure_current()
+        start = Timestamp(from_date) if from_date else None
+        end = Timestamp(to_date) if to_date else None
+
+        selected = []
+        for partition in self.load_manifest()["partitions"]:
+            if accounts and partition["account_name"] not in accounts:
+                continue
+            if start is not None and Timestamp(partition["max_date"]) < start:
+                continue
+            if end is not None and Timestamp(partition["min_date"]) > end:
+                continue
+            # Partitions without any amount have a zone map of None, read as 0
+            if min_amount is not None and (partition["max_amount"] or 0) < min_amount:
+                continue
+            if max_amount is not None and (partition["min_amount"] or 0) > max_amount:
+                continue
+            if categories and not set(categories) & set(partition["categories"]):
+                continue
+            if tran_types and not set(tran_types) & set(partition["tran_types"]):
+                continue
+            selected.append(partition["path"])
+
+        filters = []
+        if start is not None:
+            filters.append(("date", ">=", start))
+        if end is not None:
+            filters.append(("date", "<=", end))
+        if min_amount is not None:
+            filters.append(("amount", ">=", min_amount))
+        if max_amount is not None:
+            filters.append(("amount", "<=", max_amount))
+        if categories:
+            filters.append(("category", "in", categories))
+        if tran_types:
+            filters.append(("tran_type", "in", tran_types))
+
+        frames = [
+            read_parquet(os.path.join(self.store_dir, path), filters=filters or None)
+            for path in selected
+        ]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return DataFrame(columns=get_tran_cols())
+
+        rows = concat(frames, ignore_index=True)
+        return cast_dataframe_columns(rows, self.transaction_structure["structure"])
+
+    def read_ids(self, partitions: set[tuple[str, int]]) -> Index:
+        """The ids of the given (account_name, year) partitions, without reading their other
+        columns. Partitions the store doesn't have hold no ids. Call when is_current."""
+        stored = {partition["path"] for partition in self.load_manifest()["partitions"]}
+        paths = [
+            path
+            for path in (self.partition_path(*partition) for partition in partitions)
+            if path in stored
+        ]
+        ids = [
+            read_parquet(os.path.join(self.store_dir, path), columns=["id"])["id"]
+            for path in paths
+        ]
+        return Index(concat(ids, ignore_index=True) if ids else [], dtype=object)
+
+    def is_current(self) -> bool:
+        """Check whether the store was built from the ledger file as it is on disk right now."""
+        return self.load_manifest().get("ledger") == self._ledger_fingerprint()
+
+    def ensure_current(self) -> None:
+        """Rebuild the store from the ledger file if it doesn't match it."""
+        if self.is_current():
+            return
+        print("Ledger store is out of date, rebuilding it")
+        if os.path.exists(self.store_dir):
+            shutil.rmtree(self.store_dir)
+        self.save(Ledger(self.base_dir).get().reset_index()[get_tran_cols()])
+
+    def zone_map(
+        self, rows: DataFrame, account_name: str, year: int, path: str
+    ) -> dict:
+        """Summarize a partition so queries can tell whether to open it."""
+        amounts = rows["amount"].dropna()
+        return {
+            "path": path,
+            "account_name": account_name,
+            "year": year,
+            "rows": rows.shape[0],
+            "min_date": rows["date"].min().isoformat(),
+            "max_date": rows["date"].max().isoformat(),
+            "min_amount": int(amounts.min()) if not amounts.empty else None,
+            "max_amount": int(amounts.max()) if not amounts.empty else None,
+            "categories": sorted(rows["category"].dropna().astype(str).unique()),
+            "tran_types": sorted(rows["tran_type"].dropna().astype(str).unique()),
+            "hash": str(hash_pandas_object(rows, index=False).sum()),
+        }
+
+    def partition_path(self, account_name: str, year: int) -> str:
+        # Account names can contain any character, the digest keeps similar names apart
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", account_name).strip("_")
+        digest = hashlib.sha256(account_name.encode()).hexdigest()[:8]
+        return f"{slug}-{digest}/{year}.parquet"
+
+    def load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+
+    def _ledger_fingerprint(self) -> dict[str, int] | None:
+        if not os.path.exists(self.ledger_path):
+            return None
+        stat = os.stat(self.ledger_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
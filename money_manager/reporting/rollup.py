@@ -0,0 +1,151 @@
+import json
+import os
+
+from pandas import DataFrame, concat, read_csv
+
+from money_manager.reporting.dimensions import ROLLUP_KEYS
+from money_manager.utils.pandas_utils import from_minor_units, to_minor_units
+from money_manager.utils.utils import get_out_file_path, load_config
+
+
+class Rollup:
+    """Materialized totals of the ledger by (month, account_name, currency, tran_type, category).
+
+    The rollup is persisted beside the ledger as rollup.csv, together with rollup.json which records
+    the size and modification time of the ledger file it was built from. Each run only adds the
+    aggregates of the rows it appended (and subtracts the rows it replaced) instead of re-aggregating
+    the whole history. If the ledger file was changed outside of a run, e.g. categorized by hand,
+    the rollup is rebuilt from the full ledger instead.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        configs = load_config(configs_path)
+        self.ledger_path: str = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        out_dir = os.path.dirname(self.ledger_path)
+        self.rollup_path: str = os.path.join(out_dir, "rollup.csv")
+        self.meta_path: str = os.path.join(out_dir, "rollup.json")
+        self.totals: DataFrame = DataFrame(columns=ROLLUP_KEYS + ["amount", "count"])
+
+    def load(self) -> DataFrame:
+        if os.path.exists(self.rollup_path):
+            totals = read_csv(
+                self.rollup_path,
+                dtype={key: "string" for key in ROLLUP_KEYS} | {"count": "int64"},
+            )
+            self.totals = to_minor_units(totals, ["amount"])
+        return self.totals
+
+    def is_current(self) -> bool:
+        """Check whether the rollup was built from the ledger file as it is on disk right now."""
+        if not (os.path.exists(self.rollup_path) and os.path.exists(self.meta_path)):
+            return False
+        if not os.path.exists(self.ledger_path):
+            return False
+
+        with open(self.meta_path, "r") as meta_file:
+            meta = json.load(meta_file)
+        return meta == self._ledger_fingerprint()
+
+    def rebuild(self, ledger: DataFrame) -> DataFrame:
+        self.totals = self.aggregate(ledger)
+        print(f"Rebuilt rollup with {self.totals.shape[0]} groups")
+        return self.totals
+
+    def update(self, added: DataFrame, removed: DataFrame | None = None) -> DataFrame:
+        """Add the totals of the added rows and subtract the totals of the removed rows."""
+        deltas = [self.totals, self.aggregate(added)]
+        if removed is not None and not removed.empty:
+            removed_totals = self.aggregate(removed)
+            removed_totals["amount"] = -removed_totals["amount"]
+            removed_totals["count"] = -removed_totals["count"]
+            deltas.append(removed_totals)
+
+        non_empty = [delta for delta in deltas if not delta.empty]
+        if not non_empty:
+            return self.totals
+
+        self.totals = (
+            concat(non_empty, ignore_index=True)
+            .groupby(ROLLUP_KEYS, dropna=False, sort=True)[["amount", "count"]]
+            .sum()
+            .reset_index()
+            .loc[lambda df: df["count"] != 0]
+            .reset_index(drop=True)
+        )
+        print(f"Updated rollup with {added.shape[0]} rows")
+        return self.totals
+
+    def sync(
+        self, ledger: DataFrame, added: DataFrame, removed: DataFrame | None = None
+    ) -> DataFrame:
+        """Bring the rollup up to date with a run: apply the run's rows if the persisted rollup
+        matches the ledger file, otherwise rebuild it from the full ledger."""
+        if self.is_current():
+            self.load()
+            return self.update(added, removed)
+        return self.rebuild(ledger)
+
+    def save(self) -> None:
+        """Persist the rollup. Call after the ledger file has been written."""
+        from_minor_units(self.totals, ["amount"]).to_csv(self.rollup_path, index=False)
+        with open(self.meta_path, "w") as meta_file:
+            json.dump(self._ledger_fingerprint(), meta_file)
+
+    def query(
+        self,
+        group_by: list[str],
+        from_month: str | None = None,
+        to_month: str | None = None,
+        filters: dict[str, str] | None = None,
+    ) -> DataFrame:
+        """Aggregate the persisted rollup over the requested dimensions.
+
+        Args:
+            group_by (list[str]): Rollup dimensions to keep in the result.
+            from_month (str | None): First month to include, formatted as YYYY-MM.
+            to_month (str | None): Last month to include, formatted as YYYY-MM.
+            filters (dict[str, str] | None): Exact values to filter dimensions on.
+
+        Returns:
+            DataFrame: Totals (in minor units) and row counts per group.
+        """
+        totals = self.load()
+        mask = totals["month"].notna()
+        if from_month:
+            mask &= totals["month"] >= from_month
+        if to_month:
+            mask &= totals["month"] <= to_month
+        for key, value in (filters or {}).items():
+            mask &= totals[key] == value
+
+        return (
+            totals[mask]
+            .groupby(group_by, dropna=False, sort=True)[["amount", "count"]]
+            .sum()
+            .reset_index()
+        )
+
+    def aggregate(self, transactions: DataFrame) -> DataFrame:
+        """Total the amounts and count the rows of the transactions per rollup group."""
+        if transactions.empty:
+            return DataFrame(columns=ROLLUP_KEYS + ["amount", "count"])
+
+        keyed = DataFrame(
+            {
+                "month": transactions["date"].dt.strftime("%Y-%m"),
+                **{key: transactions[key].astype("string") for key in ROLLUP_KEYS[1:]},
+                "amount": transactions["amount"],
+            }
+        )
+        return (
+            keyed.groupby(ROLLUP_KEYS, dropna=False, sort=True, observed=True)
+            .agg(amount=("amount", "sum"), count=("amount", "size"))
+            .reset_index()
+        )
+
+    def _ledger_fingerprint(self) -> dict[str, int]:
+        stat = os.stat(self.ledger_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
@@ -0,0 +1,297 @@
+import os
+import shutil
+
+import numpy as np
+from pandas import DataFrame, Series
+
+from money_manager.existing_transactions import Ledger
+from money_manager.utils.utils import get_out_file_path, get_tran_cols, load_config
+
+
+def tokenize(descriptions: Series) -> DataFrame:
+    """Split descriptions into upper-case word tokens.
+
+    Args:
+        descriptions (Series): Descriptions, as normalized by clean_column_values.
+
+    Returns:
+        DataFrame: One row per distinct (position, token) pair, position being the position of the
+            description in the Series.
+    """
+    tokens = (
+        descriptions.reset_index(drop=True)
+        .astype("string")
+        .fillna("")
+        .str.upper()
+        .str.findall(r"[^\W_]+")
+        .explode()
+        .dropna()
+    )
+    return (
+        DataFrame(
+            {"position": tokens.index.to_numpy(), "token": tokens.to_numpy(dtype=str)}
+        )
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between a and b, stopping early once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TextIndex:
+    """Inverted index from description tokens to ledger ids, kept beside the ledger.
+
+    text_index/ holds one .npy file per array: the sorted vocabulary of tokens, the postings of every token (positions
+    into the array of indexed ids) and a trigram index over the vocabulary used for fuzzy search.
+    Each update only tokenizes the rows whose id is new, e.g. rows added or merged by the run, and
+    drops the postings of ids no longer in the ledger. Tokens stay in the vocabulary once seen.
+    Searches memory-map the arrays, so they only read the pages their binary searches touch.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        configs = load_config(configs_path)
+        self.base_dir: str = base_dir
+        self.ledger_path: str = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.index_dir: str = os.path.join(
+            os.path.dirname(self.ledger_path), "text_index"
+        )
+        self.index: dict[str, np.ndarray] = {}
+
+    def update(self, ledger: DataFrame, save: bool = True) -> None:
+        """Bring the index in line with the ledger. Call after the ledger file is written.
+
+        Args:
+            ledger (DataFrame): The ledger with an id column.
+            save (bool, optional): Write the index to disk. Without saving, e.g. in the server, the
+                next update starts from the index in memory.
+        """
+        index = self.index or self.load()
+        doc_ids = index["doc_ids"]
+        # Ids are hex digests, stored as bytes to keep the file small and fast to load
+        ids = ledger["id"].astype("string").to_numpy(dtype=str).astype(bytes)
+
+        kept = np.isin(doc_ids, ids)
+        is_new = ~np.isin(ids, doc_ids)
+        new_rows = ledger.loc[is_new]
+
+        # Renumber the kept documents and drop the postings of the removed ones
+        doc_map = np.cumsum(kept) - 1
+        live = kept[index["posting_doc"]]
+        new_tokens = tokenize(new_rows["description"])
+        new_token_values = new_tokens["token"].to_numpy(dtype=str)
+
+        # The vocabulary only grows, so old token numbers are remapped with a binary search
+        vocab = np.union1d(index["vocab"], new_token_values)
+        old_to_new = np.searchsorted(vocab, index["vocab"])
+        added_vocab = np.flatnonzero(~np.isin(vocab, index["vocab"]))
+
+        posting_token = np.concatenate(
+            [
+                old_to_new[index["posting_token"][live]],
+                np.searchsorted(vocab, new_token_values),
+            ]
+        )
+        posting_doc = np.concatenate(
+            [
+                doc_map[index["posting_doc"][live]],
+                new_tokens["position"].to_numpy(dtype=np.int64) + int(kept.sum()),
+            ]
+        )
+        order = np.lexsort((posting_doc, posting_token))
+
+        added_grams, added_gram_token = self.vocab_trigrams(vocab[added_vocab])
+        grams = np.concatenate([index["grams"], added_grams])
+        gram_token = np.concatenate(
+            [old_to_new[index["gram_token"]], added_vocab[added_gram_token]]
+        )
+        gram_order = np.argsort(grams, kind="stable")
+
+        stat = os.stat(self.ledger_path)
+
+        self.index = {
+            "doc_ids": np.concatenate([doc_ids[kept], ids[is_new]]),
+            "vocab": vocab,
+            "posting_token": posting_token[order].astype(np.int32),
+            "posting_doc": posting_doc[order].astype(np.int32),
+            "grams": grams[gram_order],
+            "gram_token": gram_token[gram_order].astype(np.int32),
+            "ledger": np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64),
+        }
+        if save:
+            self.save()
+        print(
+            f"Updated text index, {new_rows.shape[0]} rows added, "
+            f"{int((~kept).sum())} removed"
+        )
+
+    def search(
+        self, terms: list[str], mode: str = "exact", max_edits: int = 1
+    ) -> list[str]:
+        """Find the ids of the rows whose description contains every term.
+
+        Args:
+            terms (list[str]): Words to look for, case-insensitive.
+            mode (str, optional): "exact" for whole words, "prefix" for words starting with the
+                term, "fuzzy" for words within max_edits edits of the term.
+            max_edits (int, optional): Edit distance allowed in fuzzy mode.
+
+        Returns:
+            list[str]: Ids of the matching rows, in the order they were indexed.
+        """
+        self.ensure_current()
+        return self.find(terms, mode, max_edits)
+
+    def find(
+        self, terms: list[str], mode: str = "exact", max_edits: int = 1
+    ) -> list[str]:
+        """Search the index already in memory, see search."""
+        index = self.index
+        matches = None
+        for term in terms:
+            tokens = self.matching_tokens(term.upper(), mode, max_edits)
+            starts = np.searchsorted(index["posting_token"], tokens, "left")
+            ends = np.searchsorted(index["posting_token"], tokens, "right")
+            docs = np.unique(
+                np.concatenate(
+                    [index["posting_doc"][s:e] for s, e in zip(starts, ends)]
+                    + [np.empty(0, dtype=np.int64)]
+                )
+            )
+            matches = docs if matches is None else np.intersect1d(matches, docs)
+
+        if matches is None:
+            return []
+        return [tran_id.decode() for tran_id in index["doc_ids"][matches]]
+
+    def matching_tokens(self, term: str, mode: str, max_edits: int) -> np.ndarray:
+        """Positions in the vocabulary of the tokens that match the term."""
+        vocab = self.index["vocab"]
+        if mode == "prefix":
+            # Tokens starting with the term form a contiguous range of the sorted vocabulary
+            start = np.searchsorted(vocab, term, "left")
+            end = np.searchsorted(vocab, term + "\U0010ffff", "left")
+            return np.arange(start, end)
+        if mode == "fuzzy":
+            return self.fuzzy_tokens(term, max_edits)
+
+        position = np.searchsorted(vocab, term)
+        if position < vocab.shape[0] and vocab[position] == term:
+            return np.array([position])
+        return np.empty(0, dtype=np.int64)
+
+    def fuzzy_tokens(self, term: str, max_edits: int) -> np.ndarray:
+        """Tokens within max_edits of the term.
+
+        Every edit changes at most three trigrams, so only tokens sharing enough trigrams with the
+        term are compared with it. Terms too short for that bound are compared with the whole
+        vocabulary of similar length.
+        """
+        vocab = self.index["vocab"]
+        term_grams = self.trigrams(term)
+        required = len(term_grams) - 3 * max_edits
+
+        if required > 0:
+            grams, gram_token = self.index["grams"], self.index["gram_token"]
+            starts = np.searchsorted(grams, term_grams, "left")
+            ends = np.searchsorted(grams, term_grams, "right")
+            shared = np.concatenate(
+                [gram_token[s:e] for s, e in zip(starts, ends)]
+                + [np.empty(0, dtype=np.int64)]
+            )
+            candidates, counts = np.unique(shared, return_counts=True)
+            candidates = candidates[counts >= required]
+        else:
+            lengths = np.char.str_len(vocab)
+            candidates = np.flatnonzero(np.abs(lengths - len(term)) <= max_edits)
+
+        return np.array(
+            [
+                position
+                for position in candidates
+                if edit_distance(term, vocab[position], max_edits) <= max_edits
+            ],
+            dtype=np.int64,
+        )
+
+    def vocab_trigrams(self, vocab: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sorted trigrams of every token with the position of the token they come from."""
+        pairs = [
+            (gram, position)
+            for position, token in enumerate(vocab)
+            for gram in set(self.trigrams(token))
+        ]
+        if not pairs:
+            return np.empty(0, dtype="U3"), np.empty(0, dtype=np.int64)
+        grams = np.array([gram for gram, _ in pairs])
+        positions = np.array([position for _, position in pairs], dtype=np.int64)
+        order = np.argsort(grams, kind="stable")
+        return grams[order], positions[order]
+
+    def trigrams(self, token: str) -> list[str]:
+        # Boundary markers so the first and last letters count as much as the middle ones
+        marked = f"^{token}$"
+        return [marked[i : i + 3] for i in range(len(marked) - 2)]
+
+    def ensure_current(self) -> None:
+        """Load the index, updating it first if the ledger file changed since it was built."""
+        self.index = self.load()
+        stat = os.stat(self.ledger_path)
+        if self.index["ledger"].tolist() != [stat.st_size, stat.st_mtime_ns]:
+            print("Text index is out of date, updating it")
+            self.update(Ledger(self.base_dir).get().reset_index()[get_tran_cols()])
+
+    def save(self) -> None:
+        """Write the arrays to a new directory and swap it in, so a crash never mixes versions."""
+        staging_dir = f"{self.index_dir}.new"
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)
+        os.makedirs(staging_dir)
+        for name, values in self.index.items():
+            np.save(os.path.join(staging_dir, f"{name}.npy"), values)
+
+        previous_dir = f"{self.index_dir}.old"
+        if os.path.exists(self.index_dir):
+            os.replace(self.index_dir, previous_dir)
+        os.replace(staging_dir, self.index_dir)
+        if os.path.exists(previous_dir):
+            shutil.rmtree(previous_dir)
+
+    def load(self) -> dict[str, np.ndarray]:
+        if not os.path.exists(self.index_dir):
+            return {
+                "doc_ids": np.empty(0, dtype=bytes),
+                "vocab": np.empty(0, dtype=str),
+                "posting_token": np.empty(0, dtype=np.int32),
+                "posting_doc": np.empty(0, dtype=np.int32),
+                "grams": np.empty(0, dtype="U3"),
+                "gram_token": np.empty(0, dtype=np.int32),
+                "ledger": np.empty(0, dtype=np.int64),
+            }
+        return {
+            name.removesuffix(".npy"): np.load(
+                os.path.join(self.index_dir, name), mmap_mode="r"
+            )
+            for name in os.listdir(self.index_dir)
+        }
@@ -0,0 +1,360 @@
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from pandas import DataFrame, Timestamp
+from pandas.errors import ParserError
+
+from money_manager.existing_transactions import Ledger
+from money_manager.input_transactions import Inputs
+from money_manager.processor import Processor
+from money_manager.reporting.text_index import TextIndex
+from money_manager.utils.exceptions import FileReadError
+from money_manager.utils.pandas_utils import (
+    concat_keeping_categories,
+    from_minor_units,
+    to_minor_amount,
+)
+from money_manager.utils.utils import get_tran_cols, load_config
+
+logger = logging.getLogger(__name__)
+# Errors of a statement that can't be read or cleaned, answered with 422 instead of 500
+READ_ERRORS = (ValueError, KeyError, OSError, ParserError)
+
+
+class LedgerService:
+    def __init__(self, base_dir: str, flush_delay: float = 2.0) -> None:
+        """The ledger and its text index held in memory, shared by the requests of the server.
+
+        The ledger file is read once, when the service starts. Uploaded statements are merged into
+        the ledger in memory and queries are answered from it, so neither reads the file again.
+        Writes happen on a background thread: it waits flush_delay seconds after the first change,
+        so the uploads arriving meanwhile are written together, then saves the ledger and its
+        derived files once like a regular run would.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            flush_delay (float, optional): Seconds to wait for more changes before writing.
+        """
+        self.base_dir: str = base_dir
+        self.flush_delay: float = flush_delay
+        # Uploads and queries share the ledger, the lock keeps each one seeing a whole version
+        self.lock: threading.Lock = threading.Lock()
+        # Uploads are merged one at a time, without the state lock so queries go on meanwhile
+        self.ingest_lock: threading.Lock = threading.Lock()
+        # Only one write at a time, held without the state lock so queries go on while writing
+        self.write_lock: threading.Lock = threading.Lock()
+        self.changed: threading.Event = threading.Event()
+        self.stopped: threading.Event = threading.Event()
+        self.minor_unit_cols: list[str] = load_config(
+            os.path.join(base_dir, "configs", "transaction_structure.json")
+        )["minor_unit_cols"]
+
+        ledger = Ledger(base_dir).get()
+        tran_cols = get_tran_cols()
+        self.ledger: DataFrame = ledger.reset_index()[tran_cols]
+        # The ledger as it was last written, the change feed diffs the next write against it
+        self.persisted_ledger: DataFrame = self.ledger
+        self.text_index: TextIndex = TextIndex(base_dir)
+        self.text_index.update(self.ledger, save=False)
+
+        # Changes of the uploads not written yet, in upload order
+        self.pending: list[Processor] = []
+        self.uploads: int = 0
+        self.writer: threading.Thread = threading.Thread(
+            target=self.write_changes, daemon=True
+        )
+
+    def start(self) -> None:
+        self.writer.start()
+
+    def stop(self) -> None:
+        """Stop the writer and write what is still pending."""
+        self.stopped.set()
+        self.changed.set()
+        self.writer.join()
+        self.flush()
+
+    def ingest(self, filename: str, content: bytes) -> dict | None:
+        """Identify, clean and merge one uploaded statement into the ledger in memory.
+
+        Args:
+            filename (str): Name of the uploaded file. Its extension tells how to read it.
+            content (bytes): The file as exported by the bank.
+
+        Raises:
+            FileReadError: If the statement was identified but couldn't be cleaned.
+
+        Returns:
+            dict | None: The account and the rows added and merged, None if the statement
+                couldn't be read or identified.
+        """
+        with tempfile.TemporaryDirectory(prefix="money_manager_upload_") as in_dir:
+            with open(os.path.join(in_dir, os.path.basename(filename)), "wb") as upload:
+                upload.write(content)
+            inputs = Inputs(self.base_dir)
+            inputs.in_folder_path = in_dir
+            try:
+                inputs.process()
+            except READ_ERRORS as e:
+                raise FileReadError(
+                    f"Couldn't clean the statement: {e}", filename
+                ) from e
+            statements = inputs.get_statements()
+        if not statements:
+            return None
+
+        with self.ingest_lock:
+            # Merged on the latest version, which only the uploads holding this lock change
+            with self.lock:
+                ledger = self.ledger
+            processor = Processor(self.base_dir, workers=1)
+            processor.process_statements(ledger.set_index("id"), statements)
+            merged = processor.get_ledger()
+            # Queries keep searching the current index until the new one is swapped in
+            text_index = copy.copy(self.text_index)
+            text_index.update(merged, save=False)
+
+            with self.lock:
+                self.ledger = merged
+                self.text_index = text_index
+                self.pending.append(processor)
+                self.uploads += 1
+        self.changed.set()
+
+        return {
+            "account_name": statements[0].account_name,
+            "added_rows": int(processor.get_added_rows().shape[0]),
+            "merged_rows": int(sum(merges.shape[0] for merges in processor.merges)),
+            "ledger_rows": int(merged.shape[0]),
+        }
+
+    def query(self, params: dict[str, list[str]]) -> DataFrame:
+        """Find the ledger rows matching all of the given conditions.
+
+        Args:
+            params (dict[str, list[str]]): Query string parameters. account, category and
+                tran_type can be repeated. from and to are dates as YYYY-MM-DD, min_amount and
+                max_amount decimal amounts. text holds words the description must have, matched
+                as set by mode (exact, prefix or fuzzy) and max_edits. limit caps the rows.
+
+        Raises:
+            ValueError: If a value can't be parsed.
+
+        Returns:
+            DataFrame: The matching rows ordered by account_name and date, amounts in minor units.
+        """
+        first = lambda name: params[name][0] if params.get(name) else None
+        with self.lock:
+            ledger = self.ledger
+            text = first("text")
+            ids = (
+                self.text_index.find(
+                    text.split(),
+                    mode=first("mode") or "exact",
+                    max_edits=int(first("max_edits") or 1),
+                )
+                if text
+                else None
+            )
+
+        mask = np.ones(ledger.shape[0], dtype=bool)
+        if params.get("account"):
+            mask &= ledger["account_name"].isin(params["account"]).to_numpy()
+        if first("from"):
+            mask &= (ledger["date"] >= Timestamp(first("from"))).to_numpy()
+        if first("to"):
+            mask &= (ledger["date"] <= Timestamp(first("to"))).to_numpy()
+        amounts = ledger["amount"]
+        if first("min_amount"):
+            min_amount = to_minor_amount(float(first("min_amount")))
+            mask &= (amounts >= min_amount).to_numpy(dtype=bool, na_value=False)
+        if first("max_amount"):
+            max_amount = to_minor_amount(float(first("max_amount")))
+            mask &= (amounts <= max_amount).to_numpy(dtype=bool, na_value=False)
+        if params.get("category"):
+            mask &= ledger["category"].isin(params["category"]).to_numpy()
+        if params.get("tran_type"):
+            mask &= ledger["tran_type"].isin(params["tran_type"]).to_numpy()
+        if ids is not None:
+            mask &= ledger["id"].isin(ids).to_numpy()
+
+        rows = ledger.loc[mask].sort_values(["account_name", "date"], kind="stable")
+        limit = first("limit")
+        return rows.head(int(limit)) if limit else rows
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "ledger_rows": int(self.ledger.shape[0]),
+                "uploads": self.uploads,
+                "pending_writes": len(self.pending),
+            }
+
+    def write_changes(self) -> None:
+        """Writer thread: write the pending changes some time after they start arriving."""
+        while not self.stopped.is_set():
+            self.changed.wait()
+            # Uploads arriving while waiting are written with this one
+            self.stopped.wait(self.flush_delay)
+            self.changed.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(
+                    "Failed to write the ledger, retrying with the next change"
+                )
+
+    def flush(self) -> None:
+        """Write the ledger and its derived files with every pending change."""
+        with self.write_lock:
+            with self.lock:
+                pending = list(self.pending)
+                if not pending:
+                    return
+                processor = self.combine(pending)
+
+            processor.save()
+
+            with self.lock:
+                # Uploads merged while writing stay pending for the next write
+                del self.pending[: len(pending)]
+                self.persisted_ledger = processor.get_ledger()
+            print(
+                f"Wrote {len(pending)} uploads, ledger has {processor.ledger.shape[0]} rows"
+            )
+
+    def combine(self, pending: list[Processor]) -> Processor:
+        """One processor holding the changes of several uploads, as if a single run made them."""
+        tran_cols = get_tran_cols()
+        last = pending[-1]
+        processor = Processor(self.base_dir)
+        processor.original_ledger = self.persisted_ledger.set_index("id")
+        processor.ledger = self.ledger
+        processor.merges = [merges for upload in pending for merges in upload.merges]
+        processor.added_rows = concat_keeping_categories(
+            [upload.get_added_rows() for upload in pending]
+        ).reindex(columns=tran_cols)
+        # A row changed by several uploads keeps the version it had before the first one
+        replaced = concat_keeping_categories(
+            [upload.get_replaced_rows() for upload in pending]
+        ).drop_duplicates(subset=["id"], keep="first")
+        processor.replaced_rows = replaced[
+            ~replaced["id"].isin(processor.added_rows["id"])
+        ].reindex(columns=tran_cols)
+        processor.reconciler = last.reconciler
+        processor.categorizer = last.categorizer
+        processor.suggester = last.suggester
+        return processor
+
+
+class LedgerRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of the server.
+
+    GET /health: rows in memory, uploads and writes pending.
+    GET /transactions: rows matching the query string, see LedgerService.query.
+    POST /statements?filename=NAME: merge the statement sent as the request body.
+    POST /flush: write the pending changes now.
+    """
+
+    server: "LedgerServer"
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        service = self.server.service
+        if url.path == "/health":
+            self.send_json(HTTPStatus.OK, service.status())
+        elif url.path == "/transactions":
+            try:
+                rows = service.query(parse_qs(url.query))
+            except ValueError as e:
+                self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+            rendered = from_minor_units(rows, service.minor_unit_cols)
+            body = rendered.to_json(
+                orient="records", date_format="iso", force_ascii=False
+            )
+            self.send_body(
+                HTTPStatus.OK, f'{{"count": {rows.shape[0]}, "rows": {body}}}'
+            )
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"No route {url.path}"})
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        service = self.server.service
+        if url.path == "/statements":
+            filename = parse_qs(url.query).get("filename", [""])[0]
+            if not filename:
+                self.send_json(
+                    HTTPStatus.BAD_REQUEST,
+                    {"error": "The filename parameter is required"},
+                )
+                return
+            content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                result = service.ingest(filename, content)
+            except FileReadError as e:
+                self.send_json(HTTPStatus.UNPROCESSABLE_ENTITY, {"error": str(e)})
+                return
+            except Exception as e:
+                logger.exception("Failed to merge %s", filename)
+                self.send_json(
+                    HTTPStatus.INTERNAL_SERVER_ERROR,
+                    {"error": f"Failed to merge {filename}: {e}"},
+                )
+                return
+            if result is None:
+                self.send_json(
+                    HTTPStatus.UNPROCESSABLE_ENTITY,
+                    {"error": f"{filename} couldn't be read or identified"},
+                )
+                return
+            self.send_json(HTTPStatus.OK, result)
+        elif url.path == "/flush":
+            service.flush()
+            self.send_json(HTTPStatus.OK, service.status())
+        else:
+            self.send_json(HTTPStatus.NOT_FOUND, {"error": f"No route {url.path}"})
+
+    def send_json(self, status: HTTPStatus, payload: dict) -> None:
+        self.send_body(status, json.dumps(payload))
+
+    def send_body(self, status: HTTPStatus, body: str) -> None:
+        encoded = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+class LedgerServer(ThreadingHTTPServer):
+    def __init__(self, service: LedgerService, host: str, port: int) -> None:
+        """HTTP server answering every request on its own thread from the shared service."""
+        super().__init__((host, port), LedgerRequestHandler)
+        self.service: LedgerService = service
+
+
+def serve(
+    base_dir: str, host: str = "127.0.0.1", port: int = 8765, flush_delay: float = 2.0
+) -> None:
+    """Run the server until interrupted, then write what is still pending."""
+    service = LedgerService(base_dir, flush_delay=flush_delay)
+    server = LedgerServer(service, host, port)
+    service.start()
+    print(f"Serving the ledger of {base_dir} on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping the server")
+    finally:
+        server.server_close()
+        service.stop()
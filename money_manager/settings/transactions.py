@@ -1,21 +1,30 @@
 from datetime import datetime
-from typing import ClassVar
+from typing import TYPE_CHECKING, ClassVar
 
-import polars as pl
 from pydantic import BaseModel
 
+if TYPE_CHECKING:
+    import polars as pl
+
 
 class Transaction(BaseModel):
-    # 1. Define the structure
-    id: str
+    # 1. Define the structure. Amounts are integer minor units, optional fields default to None
     date: datetime
     account_name: str
+    tran_type: str
+    category: str | None = None
+    tag: str | None = None
+    category_rule: str | None = None
     description: str
-    category: str = ""
-    notes: str = ""
+    notes: str | None = None
     currency: str
-    amount: float
-    tran_type: str
+    amount: int
+    statement_balance: int | None = None
+    running_balance: int | None = None
+    reporting_amount: int | None = None
+    transfer_id: str | None = None
+    # Derived from COLS_TO_HASH, so rows are valid before they are hashed
+    id: str | None = None
 
     COLS_TO_HASH: ClassVar[list[str]] = [
         "date",
@@ -25,16 +34,19 @@ class Transaction(BaseModel):
     ]
 
     @classmethod
-    def get_polars_schema(cls) -> dict[str, pl.DataType]:
+    def get_polars_schema(cls) -> dict[str, "pl.DataType"]:
         """Helper to get Polars dtypes for Step 7 and 9."""
+        # Polars is only needed here, so importing the model doesn't load it
+        import polars as pl
+
         return {
             "id": pl.String(),
             "date": pl.Datetime(),
-            "account_name": pl.String(),
+            "account_name": pl.Categorical(),
             "description": pl.String(),
-            "category": pl.String(),
+            "category": pl.Categorical(),
             "notes": pl.String(),
-            "currency": pl.String(),
-            "amount": pl.Float64(),
-            "tran_type": pl.String(),
+            "currency": pl.Categorical(),
+            "amount": pl.Int64(),
+            "tran_type": pl.Categorical(),
         }
@@ -1,15 +1,25 @@
 import os
 
 import numpy as np
-from pandas import DataFrame, to_datetime, to_numeric
+from pandas import DataFrame
 
 from money_manager.models.statement import Statement
 from money_manager.utils import pandas_utils as pu
 from money_manager.utils import utils as ut
 from money_manager.utils.dataframe_hasher import DataFrameHasher
 
+# Default decimal separator of BAC exports, overridable with "decimal_separator" in accounts.json
+DECIMAL_SEPARATOR = "."
+DATE_FORMATS = ["%d/%m/%Y"]
+
 
 class BacTransformer:
+    # Statements can be cleaned in chunks. The rows of a day stay in one chunk so its end-of-day
+    # balance is picked from all of them
+    stream_key: str | None = "Fecha"
+    # Typed exports of the scraper skip parsing the text of the amounts, dates and descriptions
+    reads_typed: bool = True
+
     def __init__(self, base_dir: str) -> None:
         """Initialize TransformationsBac with account configurations and folder path.
 
@@ -42,13 +52,23 @@ class BacTransformer:
         # Clean either credit_card or savings statement
         print(f"Cleaning {filename} | {bank_name}-{acc_type} | ", end="")
         if acc_type == "credit_card":
-            clean_stmt_data = self.clean_cc(stmt_data, acc_name)
+            clean_stmt_data = self.clean_cc(stmt_data, acc_name, statement.typed)
         elif acc_type == "savings":
-            clean_stmt_data = self.clean_savings(stmt_data, acc_name)
+            clean_stmt_data = self.clean_savings(stmt_data, acc_name, statement.typed)
         else:
             print("account type not supported")
             return None
 
+        # Convert amounts to integer minor units and cast the output to the ledger column types
+        # once, so later stages don't convert them
+        clean_stmt_data = pu.to_minor_units(
+            clean_stmt_data, self.transaction_structure["minor_unit_cols"]
+        )
+        clean_stmt_data = pu.keep_end_of_day_balances(clean_stmt_data)
+        clean_stmt_data = ut.cast_dataframe_columns(
+            clean_stmt_data, self.transaction_structure["structure"]
+        )
+
         # Hash the dataframe
         hashed_data = DataFrameHasher(
             clean_stmt_data, self.transaction_structure["cols_to_hash"], "id"
@@ -70,11 +90,14 @@ class BacTransformer:
 
         return clean_stmt
 
-    def clean_cc(self, df: DataFrame, account_name: str) -> DataFrame:
+    def clean_cc(
+        self, df: DataFrame, account_name: str, typed: bool = False
+    ) -> DataFrame:
         """Clean and transform a credit card statement CSV file.
 
         Args:
             csv_path (str): Path to the CSV file containing credit card statement data.
+            typed (bool, optional): Whether the statement is a typed export, already parsed.
 
         Returns:
             DataFrame: Cleaned and transformed DataFrame containing financial transactions.
@@ -90,24 +113,18 @@ class BacTransformer:
 
         # Intake the DataFrame from a path and rename columns
         raw_df: DataFrame = df.rename(columns=rename_dict)
+        if not typed:
+            raw_df = self.parse_text(
+                raw_df, ["monto_lempiras", "monto_dolares"], account_name
+            )
 
         # Apply transformation functions
         clean_df: DataFrame = (
-            raw_df.pipe(pu.drop_null_or_empty_rows, col_index=0)
-            .pipe(pu.remove_unwanted_chars, columns=["monto_lempiras", "monto_dolares"])
-            .pipe(
-                pu.replace_empty_string_with_nan,
-                columns=["monto_lempiras", "monto_dolares"],
-            )
-            .pipe(pu.clean_column_values)
+            raw_df.loc[lambda df: df["date"].notna()]
             .assign(
                 currency=lambda df: np.where(df["monto_lempiras"].isna(), "USD", "HNL")
             )
-            .assign(date=lambda df: to_datetime(df["date"], format="%d/%m/%Y"))
-            .loc[lambda df: df["date"].notna()]
             .assign(amount=lambda df: df["monto_lempiras"].fillna(df["monto_dolares"]))
-            .assign(amount=lambda df: to_numeric(df["amount"], errors="coerce"))
-            .assign(amount=lambda df: df["amount"].astype(float).round(2))
             .assign(amount=lambda df: df["amount"] * -1.0)
             .assign(tran_type=lambda df: "Expense")
             .assign(account_name=lambda df: account_name)
@@ -125,12 +142,14 @@ class BacTransformer:
         self,
         df: DataFrame,
         acc_name: str,
+        typed: bool = False,
     ) -> DataFrame:
         """
         Clean and transform a savings account statement CSV file.
 
         Args:
             csv_path (str): Path to the CSV file containing savings account statement data.
+            typed (bool, optional): Whether the statement is a typed export, already parsed.
 
         Returns:
             DataFrame: Cleaned and transformed DataFrame containing financial transactions.
@@ -142,26 +161,22 @@ class BacTransformer:
             "Descripción": "description",
             "Débitos": "debits",
             "Créditos": "credits",
+            "Balance": "statement_balance",
         }
 
         # Intake the DataFrame from a path and rename columns
         raw_df: DataFrame = df.rename(columns=rename_dict)
+        if not typed:
+            raw_df = self.parse_text(
+                raw_df, ["debits", "credits", "statement_balance"], acc_name
+            )
 
         # Get the file name and based on this assign a currency. The mapping is in configs.json
         currency = self.account_attributes[acc_name]["currency"]
 
         # Apply transformation functions
         clean_df: DataFrame = (
-            raw_df.pipe(pu.drop_null_or_empty_rows, col_index=0)
-            .pipe(pu.remove_unwanted_chars, columns=["debits", "credits"])
-            .pipe(pu.replace_empty_string_with_nan, columns=["debits", "credits"])
-            .pipe(pu.clean_column_values)
-            .assign(date=lambda df: to_datetime(df["date"], format="%d/%m/%Y"))
-            .loc[lambda df: df["date"].notna()]
-            .assign(debits=lambda df: to_numeric(df["debits"], errors="coerce"))
-            .assign(credits=lambda df: to_numeric(df["credits"], errors="coerce"))
-            .assign(debits=lambda df: df["debits"].astype(float).round(2))
-            .assign(credits=lambda df: df["credits"].astype(float).round(2))
+            raw_df.loc[lambda df: df["date"].notna()]
             .assign(debits=lambda df: df["debits"] * -1.0)
             .assign(
                 amount=lambda df: np.where(
@@ -175,13 +190,31 @@ class BacTransformer:
             )
             .assign(currency=lambda df: currency)
             .assign(account_name=lambda df: acc_name)
-            .drop(
-                ["Referencia", "debits", "credits", "Balance", "Account Name"], axis=1
-            )
+            .drop(["Referencia", "debits", "credits", "Account Name"], axis=1)
         )
 
         return clean_df
 
+    def parse_text(
+        self, df: DataFrame, amount_cols: list[str], acc_name: str
+    ) -> DataFrame:
+        """Parse the text of a statement as the bank exports it: formatted amounts, dd/mm/yyyy
+        dates and descriptions with extra whitespace. Rows with an empty first column are dropped.
+        """
+        decimal_sep = self.account_attributes[acc_name].get(
+            "decimal_separator", DECIMAL_SEPARATOR
+        )
+        amounts_df, unparsed = pu.parse_amounts(
+            df.pipe(pu.drop_null_or_empty_rows, col_index=0),
+            columns=amount_cols,
+            decimal_sep=decimal_sep,
+        )
+        if unparsed:
+            print(f"{unparsed} unparsed amounts", end=" | ")
+        return amounts_df.pipe(pu.clean_column_values).pipe(
+            pu.parse_dates, column="date", formats=DATE_FORMATS
+        )
+
     def get_account_type(self, account_name: str) -> str:
         """
         Get the type for the account based on the CSV file name.
@@ -2,13 +2,17 @@ import os
 from sqlite3.dbapi2 import DataError
 
 import numpy as np
-from pandas import DataFrame, to_datetime, to_numeric
+from pandas import DataFrame
 
 import money_manager.utils.pandas_utils as pu
 from money_manager.models.statement import Statement
 from money_manager.utils import utils as ut
 from money_manager.utils.dataframe_hasher import DataFrameHasher
 
+# Default decimal separator of Ficohsa exports, overridable with "decimal_separator" in accounts.json
+DECIMAL_SEPARATOR = "."
+DATE_FORMATS = ["%d/%m/%Y"]
+
 
 class FicohsaTransformer:
     def __init__(self, base_dir: str) -> None:
@@ -50,6 +54,15 @@ class FicohsaTransformer:
         if clean_stmt_data is None:
             return None
 
+        # Convert amounts to integer minor units and cast the output to the ledger column types
+        # once, so later stages don't convert them
+        clean_stmt_data = pu.to_minor_units(
+            clean_stmt_data, self.transaction_structure["minor_unit_cols"]
+        )
+        clean_stmt_data = ut.cast_dataframe_columns(
+            clean_stmt_data, self.transaction_structure["structure"]
+        )
+
         # Hash the dataframe`
         hashed_data = DataFrameHasher(
             clean_stmt_data, self.transaction_structure["cols_to_hash"], "id"
@@ -113,23 +126,22 @@ class FicohsaTransformer:
 
         # Get the file name and based on this assign a currency. The mapping is in configs.json
         currency = self.account_attributes[acc_name]["currency"]
+        decimal_sep = self.account_attributes[acc_name].get(
+            "decimal_separator", DECIMAL_SEPARATOR
+        )
 
         # Apply transformation functions
+        amounts_df, unparsed = pu.parse_amounts(
+            raw_df.pipe(pu.drop_null_or_empty_rows, col_index=0),
+            columns=["debits", "credits"],
+            decimal_sep=decimal_sep,
+        )
+        if unparsed:
+            print(f"{unparsed} unparsed amounts", end=" | ")
         clean_df: DataFrame = (
-            raw_df.pipe(pu.drop_null_or_empty_rows, col_index=0)
-            .pipe(pu.remove_unwanted_chars, columns=["debits", "credits"])
-            .pipe(pu.replace_empty_string_with_nan, columns=["debits", "credits"])
-            .pipe(pu.clean_column_values)
-            .assign(
-                date=lambda df: to_datetime(
-                    df["date"], format="%d/%m/%Y", errors="coerce"
-                )
-            )
+            amounts_df.pipe(pu.clean_column_values)
+            .pipe(pu.parse_dates, column="date", formats=DATE_FORMATS)
             .loc[lambda df: df["date"].notna()]
-            .assign(debits=lambda df: to_numeric(df["debits"], errors="coerce"))
-            .assign(credits=lambda df: to_numeric(df["credits"], errors="coerce"))
-            .assign(debits=lambda df: df["debits"].astype(float).round(2))
-            .assign(credits=lambda df: df["credits"].astype(float).round(2))
             .assign(debits=lambda df: df["debits"] * -1.0)
             .assign(
                 amount=lambda df: np.where(
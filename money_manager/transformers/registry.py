@@ -0,0 +1,57 @@
+import importlib
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, Protocol
+
+if TYPE_CHECKING:
+    from money_manager.models.statement import Statement
+
+# Transformers of the banks supported out of the box, by the bank name used in accounts.json.
+# Each module is only imported once a statement of its bank is identified.
+TRANSFORMERS: dict[str, tuple[str, str]] = {
+    "BAC": ("money_manager.transformers.bac", "BacTransformer"),
+    "SANTANDER": ("money_manager.transformers.santander", "SantanderTransformer"),
+    "REVOLUT": ("money_manager.transformers.revolut", "RevolutTransformer"),
+    "FICOHSA": ("money_manager.transformers.ficohsa", "FicohsaTransformer"),
+}
+
+# Other packages can add banks by declaring an entry point in this group, named after the bank
+# and pointing to the transformer class
+ENTRY_POINT_GROUP = "money_manager.transformers"
+
+
+# Transformers that can clean a statement a chunk at a time also set a stream_key class attribute,
+# see Inputs.prepare_chunks. Those that can clean typed exports set reads_typed to True
+class Transformer(Protocol):
+    def __init__(self, base_dir: str) -> None: ...
+
+    def clean(self, statement: "Statement") -> "Statement | None": ...
+
+
+class TransformerRegistry:
+    def __init__(self, base_dir: str) -> None:
+        """Find the transformer of a bank, importing and creating it on first use.
+
+        Args:
+            base_dir (str): Path to the project base directory, passed to the transformers.
+        """
+        self.base_dir: str = base_dir
+        self.transformers: dict[str, Transformer | None] = {}
+
+    def get(self, bank_name: str) -> Transformer | None:
+        """The transformer of the bank, or None if no transformer is registered for it."""
+        if bank_name not in self.transformers:
+            transformer_class = self.load_class(bank_name)
+            self.transformers[bank_name] = (
+                transformer_class(self.base_dir) if transformer_class else None
+            )
+        return self.transformers[bank_name]
+
+    def load_class(self, bank_name: str) -> type[Transformer] | None:
+        if bank_name in TRANSFORMERS:
+            module_name, class_name = TRANSFORMERS[bank_name]
+            return getattr(importlib.import_module(module_name), class_name)
+
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name == bank_name:
+                return entry_point.load()
+        return None
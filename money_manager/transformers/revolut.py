@@ -1,15 +1,23 @@
 import os
 
 import numpy as np
-from pandas import DataFrame, to_datetime, to_numeric
+from pandas import DataFrame
 
 from money_manager.models.statement import Statement
 from money_manager.utils import pandas_utils as pu
 from money_manager.utils import utils as ut
 from money_manager.utils.dataframe_hasher import DataFrameHasher
 
+# Default decimal separator of Revolut exports, overridable with "decimal_separator" in accounts.json
+DECIMAL_SEPARATOR = "."
+# Started Date is a full timestamp, only its date part (first 10 characters) is parsed
+DATE_FORMATS = ["%Y-%m-%d"]
+
 
 class RevolutTransformer:
+    # Statements can be cleaned in chunks, rows are cleaned independently of each other
+    stream_key: str | None = None
+
     def __init__(self, base_dir: str) -> None:
         """Initialize RevolutTransformer with account configurations and folder path.
 
@@ -48,6 +56,15 @@ class RevolutTransformer:
             print("account type not supported")
             return None
 
+        # Convert amounts to integer minor units and cast the output to the ledger column types
+        # once, so later stages don't convert them
+        clean_stmt_data = pu.to_minor_units(
+            clean_stmt_data, self.transaction_structure["minor_unit_cols"]
+        )
+        clean_stmt_data = ut.cast_dataframe_columns(
+            clean_stmt_data, self.transaction_structure["structure"]
+        )
+
         # Hash the dataframe
         hashed_data = DataFrameHasher(
             clean_stmt_data, self.transaction_structure["cols_to_hash"], "id"
@@ -118,18 +135,22 @@ class RevolutTransformer:
 
         # Get the file name and based on this assign a currency. The mapping is in configs.json
         currency = self.account_attributes[acc_name]["currency"]
+        decimal_sep = self.account_attributes[acc_name].get(
+            "decimal_separator", DECIMAL_SEPARATOR
+        )
 
         # Apply transformation functions
+        amounts_df, unparsed = pu.parse_amounts(
+            raw_df.pipe(pu.drop_null_or_empty_rows, col_index=0),
+            columns=["amount"],
+            decimal_sep=decimal_sep,
+        )
+        if unparsed:
+            print(f"{unparsed} unparsed amounts", end=" | ")
         clean_df: DataFrame = (
-            raw_df.pipe(pu.drop_null_or_empty_rows, col_index=0)
-            .pipe(pu.clean_column_values)
-            .assign(
-                date=lambda df: to_datetime(
-                    df["date"], format="%Y-%m-%d %H:%M:%S"
-                ).dt.normalize()
-            )
-            .assign(amount=lambda df: to_numeric(df["amount"], errors="coerce"))
-            .assign(amount=lambda df: df["amount"].astype(float).round(2))
+            amounts_df.pipe(pu.clean_column_values)
+            .assign(date=lambda df: df["date"].str.slice(0, 10))
+            .pipe(pu.parse_dates, column="date", formats=DATE_FORMATS)
             .assign(
                 tran_type=lambda df: np.where(df["amount"] < 0, "Expense", "Income")
             )
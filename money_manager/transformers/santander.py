@@ -1,7 +1,7 @@
 import os
 
 import numpy as np
-from pandas import DataFrame, to_datetime, to_numeric
+from pandas import DataFrame
 
 from money_manager.models.statement import Statement
 from money_manager.utils import utils as ut
@@ -9,10 +9,17 @@ from money_manager.utils.dataframe_hasher import DataFrameHasher
 from money_manager.utils.pandas_utils import (
     clean_column_values,
     drop_null_or_empty_rows,
-    remove_unwanted_chars,
-    replace_empty_string_with_nan,
+    keep_end_of_day_balances,
+    parse_amounts,
+    parse_dates,
+    to_minor_units,
 )
 
+# Santander exports European formatted amounts (1.234,56). Overridable with
+# "decimal_separator" in accounts.json
+DECIMAL_SEPARATOR = ","
+DATE_FORMATS = ["%d/%m/%Y"]
+
 
 class SantanderTransformer:
     def __init__(self, base_dir: str) -> None:
@@ -53,6 +60,16 @@ class SantanderTransformer:
             print("account type not supported")
             return None
 
+        # Convert amounts to integer minor units and cast the output to the ledger column types
+        # once, so later stages don't convert them
+        clean_stmt_data = to_minor_units(
+            clean_stmt_data, self.transaction_structure["minor_unit_cols"]
+        )
+        clean_stmt_data = keep_end_of_day_balances(clean_stmt_data)
+        clean_stmt_data = ut.cast_dataframe_columns(
+            clean_stmt_data, self.transaction_structure["structure"]
+        )
+
         # Hash the dataframe`
         hashed_data = DataFrameHasher(
             clean_stmt_data, self.transaction_structure["cols_to_hash"], "id"
@@ -98,21 +115,22 @@ class SantanderTransformer:
         )
         # Get the file name and based on this assign a currency. The mapping is in configs.json
         currency = self.account_attributes[acc_name]["currency"]
+        decimal_sep = self.account_attributes[acc_name].get(
+            "decimal_separator", DECIMAL_SEPARATOR
+        )
         # print(raw_df.iloc[6:].pipe(lambda d: d.rename(columns=d.iloc[0])))
         # Apply transformation functions
+        amounts_df, unparsed = parse_amounts(
+            raw_df.pipe(drop_null_or_empty_rows, col_index=0),
+            columns=["amount"],
+            decimal_sep=decimal_sep,
+        )
+        if unparsed:
+            print(f"{unparsed} unparsed amounts", end=" | ")
         clean_df: DataFrame = (
-            raw_df.pipe(drop_null_or_empty_rows, col_index=0)
-            .pipe(remove_unwanted_chars, columns=["amount"])
-            .pipe(replace_empty_string_with_nan, columns=["amount"])
-            .pipe(clean_column_values)
-            .assign(
-                date=lambda df: to_datetime(
-                    df["date"], format="%d/%m/%Y", errors="coerce"
-                )
-            )
+            amounts_df.pipe(clean_column_values)
+            .pipe(parse_dates, column="date", formats=DATE_FORMATS)
             .loc[lambda df: df["date"].notna()]
-            .assign(amount=lambda df: to_numeric(df["amount"], errors="coerce"))
-            .assign(amount=lambda df: df["amount"].astype(float).round(2))
             .assign(
                 tran_type=lambda df: np.where(df["amount"] < 0, "Expense", "Transfer")
             )
@@ -142,6 +160,7 @@ class SantanderTransformer:
             "FECHA OPERACIÓN": "date",
             "CONCEPTO": "description",
             "IMPORTE EUR": "amount",
+            "SALDO": "statement_balance",
         }
 
         # Intake the DataFrame from a path and rename columns
@@ -151,27 +170,28 @@ class SantanderTransformer:
         )
         # Get the file name and based on this assign a currency. The mapping is in configs.json
         currency = self.account_attributes[acc_name]["currency"]
+        decimal_sep = self.account_attributes[acc_name].get(
+            "decimal_separator", DECIMAL_SEPARATOR
+        )
         # print(raw_df.iloc[6:].pipe(lambda d: d.rename(columns=d.iloc[0])))
         # Apply transformation functions
+        amounts_df, unparsed = parse_amounts(
+            raw_df.pipe(drop_null_or_empty_rows, col_index=0),
+            columns=["amount", "statement_balance"],
+            decimal_sep=decimal_sep,
+        )
+        if unparsed:
+            print(f"{unparsed} unparsed amounts", end=" | ")
         clean_df: DataFrame = (
-            raw_df.pipe(drop_null_or_empty_rows, col_index=0)
-            .pipe(remove_unwanted_chars, columns=["amount"])
-            .pipe(replace_empty_string_with_nan, columns=["amount"])
-            .pipe(clean_column_values)
-            .assign(
-                date=lambda df: to_datetime(
-                    df["date"], format="%d/%m/%Y", errors="coerce"
-                )
-            )
+            amounts_df.pipe(clean_column_values)
+            .pipe(parse_dates, column="date", formats=DATE_FORMATS)
             .loc[lambda df: df["date"].notna()]
-            .assign(amount=lambda df: to_numeric(df["amount"], errors="coerce"))
-            .assign(amount=lambda df: df["amount"].astype(float).round(2))
             .assign(
                 tran_type=lambda df: np.where(df["amount"] < 0, "Expense", "Income")
             )
             .assign(currency=lambda df: currency)
             .assign(account_name=lambda df: acc_name)
-            .drop(["FECHA VALOR", "SALDO"], axis=1)
+            .drop(["FECHA VALOR"], axis=1)
         )
 
         return clean_df
@@ -0,0 +1,253 @@
+import json
+import os
+import re
+
+import numpy as np
+from pandas import DataFrame, Series, factorize
+
+from money_manager.utils.pandas_utils import to_minor_amount
+from money_manager.utils.utils import get_out_file_path, load_config
+
+# Text conditions are case-insensitive and . also matches line breaks
+FLAGS = re.IGNORECASE | re.DOTALL
+# Backreferences, conditionals and global inline flags that an unescaped part of a regex holds.
+# They refer to the groups or set the flags of the whole pattern, so such a regex can't share the
+# combined pattern of Categorizer.match_text
+NOT_COMBINABLE = re.compile(
+    r"(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\))"
+)
+
+
+class Categorizer:
+    def __init__(self, base_dir: str, ledger: DataFrame) -> None:
+        """Assign category and tag to ledger rows from the rules in configs/categories.json.
+
+        Each rule has a unique name, a category, an optional tag and any of these conditions:
+        keywords (case-insensitive substrings of the description), regex (matched anywhere in the
+        description, case-insensitive), account_name, min_amount and max_amount (decimal amounts,
+        inclusive). A row takes the first rule, in file order, whose conditions all hold.
+
+        Rows categorized by hand (category set and category_rule empty) are never modified. The
+        rules applied by the last run are kept in categorization.json beside the ledger, so when the
+        rules file changes only the rows affected by the changed rules are categorized again.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            ledger (DataFrame): The ledger to categorize.
+        """
+        configs_dir = os.path.join(base_dir, "configs")
+        configs = load_config(os.path.join(configs_dir, "configs.json"))
+        out_file_path = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.rules_path: str = os.path.join(configs_dir, "categories.json")
+        self.state_path: str = os.path.join(
+            os.path.dirname(out_file_path), "categorization.json"
+        )
+        self.ledger: DataFrame = ledger
+        self.rules: list[dict] = []
+        self.replaced_rows: DataFrame = DataFrame()
+
+    def get_categorized_ledger(self, added: DataFrame | None = None) -> DataFrame:
+        """Categorize the rows added in this run and the rows affected by changed rules.
+
+        Args:
+            added (DataFrame | None): Rows appended to the ledger during this run.
+
+        Returns:
+            DataFrame: The ledger with category, tag and category_rule updated.
+        """
+        if not os.path.exists(self.rules_path):
+            return self.ledger
+
+        self.rules = load_config(self.rules_path)["rules"]
+        previous_rules = self.load_applied_rules()
+
+        ledger = self.ledger
+        # Hand-categorized rows are left alone
+        eligible = ledger["category"].isna() | ledger["category_rule"].notna()
+
+        if previous_rules is None:
+            targets = eligible
+        else:
+            changed = self.changed_rule_names(previous_rules, self.rules)
+            targets = eligible & ledger["category_rule"].isin(changed)
+            if added is not None and not added.empty:
+                targets |= eligible & ledger["id"].isin(added["id"])
+            changed_rules = [rule for rule in self.rules if rule["name"] in changed]
+            if changed_rules:
+                matches = self.match(ledger.loc[eligible & ~targets], changed_rules)
+                targets |= (matches >= 0).reindex(ledger.index, fill_value=False)
+
+        if not targets.any():
+            return ledger
+
+        rows = ledger.loc[targets]
+        rule_index = self.match(rows, self.rules)
+        matched = rule_index >= 0
+
+        names = np.array([rule["name"] for rule in self.rules] + [None], dtype=object)
+        categories = np.array(
+            [rule["category"] for rule in self.rules] + [None], dtype=object
+        )
+        tags = np.array([rule.get("tag") for rule in self.rules] + [None], dtype=object)
+
+        # Rows that no longer match any rule lose the category a rule gave them
+        cols = ["category", "tag", "category_rule"]
+        new_values = DataFrame(
+            {
+                "category": categories[rule_index.to_numpy()],
+                "tag": tags[rule_index.to_numpy()],
+                "category_rule": names[rule_index.to_numpy()],
+            },
+            index=rows.index,
+        )
+        current_values = rows[cols].astype("string").fillna("")
+        changed_rows = (current_values != new_values.astype("string").fillna("")).any(
+            axis=1
+        )
+        updates = new_values.loc[changed_rows]
+
+        self.replaced_rows = ledger.loc[updates.index]
+        ledger = ledger.copy()
+        for col in cols:
+            column = ledger[col].astype(object)
+            column.loc[updates.index] = updates[col]
+            ledger[col] = column.astype("category")
+
+        print(
+            f"Categorized {int(matched.sum())} of {rows.shape[0]} rows, "
+            f"{updates.shape[0]} changed"
+        )
+
+        self.ledger = ledger
+        return ledger
+
+    def match(self, rows: DataFrame, rules: list[dict]) -> Series:
+        """Find the first rule matching each row.
+
+        The text conditions of all rules are compiled into one pattern made of optional lookaheads,
+        one named group per rule, so a single regex pass over each distinct description tells
+        which rules match it. The few regexes that can't share that pattern are matched on their
+        own, see match_text. Account and amount conditions are then applied as vectorized masks.
+
+        Args:
+            rows (DataFrame): Rows with description, account_name and amount (minor units).
+            rules (list[dict]): The rules, in priority order.
+
+        Returns:
+            Series: Position of the first matching rule in rules for every row, -1 if none matches.
+        """
+        first_match = np.full(rows.shape[0], -1, dtype=np.int64)
+        if rows.empty or not rules:
+            return Series(first_match, index=rows.index)
+
+        codes, descriptions = factorize(rows["description"].astype("string"))
+        text_matches = self.match_text(Series(descriptions, dtype="string"), rules)
+        # Code -1 marks missing descriptions, which only match rules without text conditions
+        text_matches = np.vstack([text_matches, [not self.has_text(r) for r in rules]])
+
+        accounts = rows["account_name"].astype("string").to_numpy(na_value="")
+        amounts = rows["amount"].astype("float64").to_numpy(na_value=np.nan)
+
+        # Walk the rules from last to first so earlier rules take precedence
+        for position in range(len(rules) - 1, -1, -1):
+            rule = rules[position]
+            mask = text_matches[codes, position]
+            if "account_name" in rule:
+                mask &= accounts == rule["account_name"]
+            if "min_amount" in rule:
+                mask &= amounts >= to_minor_amount(rule["min_amount"])
+            if "max_amount" in rule:
+                mask &= amounts <= to_minor_amount(rule["max_amount"])
+            first_match[mask] = position
+
+        return Series(first_match, index=rows.index)
+
+    def match_text(self, descriptions: Series, rules: list[dict]) -> np.ndarray:
+        """Evaluate the text conditions of every rule on every description.
+
+        Rules that can share one pattern are evaluated together in a single regex pass. A regex
+        with named groups, backreferences or global inline flags, e.g. '(?i)', would change meaning
+        or fail inside that pattern, so its rule is matched on its own.
+
+        Raises:
+            ValueError: If the regex of a rule is invalid.
+        """
+        lookaheads = []
+        separate: dict[int, list[re.Pattern]] = {}
+        for position, rule in enumerate(rules):
+            pattern = self.text_pattern(rule)
+            if pattern is None:
+                continue
+            regex = rule.get("regex")
+            try:
+                compiled = re.compile(regex, FLAGS) if regex is not None else None
+            except re.error as e:
+                raise ValueError(
+                    f"Invalid regex in category rule {rule['name']}: {e}"
+                ) from e
+            if compiled is not None and (
+                compiled.groupindex or NOT_COMBINABLE.search(regex)
+            ):
+                keywords = self.text_pattern({"keywords": rule.get("keywords", [])})
+                separate[position] = [compiled]
+                if keywords is not None:
+                    separate[position].append(re.compile(keywords, FLAGS))
+            else:
+                lookaheads.append(f"(?:(?=.*?(?P<rule{position}>{pattern})))?")
+
+        matches = np.ones((descriptions.shape[0], len(rules)), dtype=bool)
+        if lookaheads:
+            combined = re.compile("".join(lookaheads), FLAGS)
+            extracted = descriptions.str.extract(combined)
+            for position in range(len(rules)):
+                group = f"rule{position}"
+                if group in extracted.columns:
+                    matches[:, position] = extracted[group].notna().to_numpy()
+        for position, patterns in separate.items():
+            matches[:, position] = np.fromiter(
+                (any(c.search(text) for c in patterns) for text in descriptions),
+                dtype=bool,
+                count=descriptions.shape[0],
+            )
+
+        return matches
+
+    def text_pattern(self, rule: dict) -> str | None:
+        alternatives = [re.escape(keyword) for keyword in rule.get("keywords", [])]
+        if "regex" in rule:
+            alternatives.append(f"(?:{rule['regex']})")
+        return "|".join(alternatives) if alternatives else None
+
+    def has_text(self, rule: dict) -> bool:
+        return self.text_pattern(rule) is not None
+
+    def changed_rule_names(
+        self, previous_rules: list[dict], rules: list[dict]
+    ) -> set[str]:
+        """Names of the rules that were added, removed, edited or moved since the last run."""
+        previous = {rule["name"]: (i, rule) for i, rule in enumerate(previous_rules)}
+        current = {rule["name"]: (i, rule) for i, rule in enumerate(rules)}
+        return {
+            name
+            for name in previous.keys() | current.keys()
+            if previous.get(name) != current.get(name)
+        }
+
+    def load_applied_rules(self) -> list[dict] | None:
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, "r") as state_file:
+            return json.load(state_file)["rules"]
+
+    def save_applied_rules(self) -> None:
+        """Record the rules that the saved ledger was categorized with."""
+        if not self.rules:
+            return
+        with open(self.state_path, "w") as state_file:
+            json.dump({"rules": self.rules}, state_file, indent=2)
+
+    def get_replaced_rows(self) -> DataFrame:
+        """The rows as they were before this run changed their category or tag."""
+        return self.replaced_rows
@@ -0,0 +1,169 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pandas import DataFrame
+
+from money_manager.utils.merger import description_similarity
+from money_manager.utils.pandas_utils import from_minor_units
+from money_manager.utils.utils import get_out_file_path, load_config
+
+# Below this many description pairs scoring in the current process is faster than a pool
+MIN_PARALLEL_PAIRS = 20000
+
+
+def score_pairs(pairs: list[tuple[str, str]]) -> list[float]:
+    """Score a chunk of description pairs. Module level so worker processes can run it."""
+    return [description_similarity(a, b) for a, b in pairs]
+
+
+class DuplicateAuditor:
+    def __init__(
+        self,
+        base_dir: str,
+        ledger: DataFrame,
+        max_days: int = 3,
+        min_similarity: float = 0.80,
+        workers: int | None = None,
+    ) -> None:
+        """Find suspected duplicates already inside the ledger.
+
+        Rows are only compared within blocks of the same account_name and amount, at most max_days
+        apart, and the descriptions of the candidate pairs are scored with the same measure Merger
+        uses, spread over worker processes.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            ledger (DataFrame): The ledger to audit.
+            max_days (int, optional): Largest date difference between two duplicates.
+            min_similarity (float, optional): Lowest description similarity to report.
+            workers (int | None, optional): Worker processes, defaults to the number of CPUs.
+        """
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        configs = load_config(configs_path)
+        out_file_path = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.report_path: str = os.path.join(
+            os.path.dirname(out_file_path), "duplicate_audit.csv"
+        )
+        self.ledger: DataFrame = ledger
+        self.max_days: int = max_days
+        self.min_similarity: float = min_similarity
+        self.workers: int | None = workers
+        self.report: DataFrame = DataFrame()
+
+    def audit(self) -> DataFrame:
+        """Build the ranked report of suspected duplicate pairs.
+
+        Returns:
+            DataFrame: One row per pair with both dates, descriptions and ids, ranked by similarity
+                and then by how close the dates are.
+        """
+        ledger = self.ledger.loc[self.ledger["amount"].notna()].reset_index(drop=True)
+        first, second = self.candidate_pairs(ledger)
+        print(f"Scoring {first.shape[0]} candidate pairs", end=" | ")
+
+        descriptions = ledger["description"].astype("string").fillna("")
+        pairs = DataFrame(
+            {
+                "a": descriptions.to_numpy(dtype=str)[first],
+                "b": descriptions.to_numpy(dtype=str)[second],
+            }
+        )
+        # Every distinct pair of descriptions is scored once, identical ones are not scored
+        distinct = pairs.loc[pairs["a"] != pairs["b"]].drop_duplicates()
+        scores = self.score(list(zip(distinct["a"], distinct["b"])))
+        similarity = (
+            pairs.merge(distinct.assign(similarity=scores), on=["a", "b"], how="left")[
+                "similarity"
+            ]
+            .fillna(1.0)
+            .to_numpy()
+        )
+
+        dates = ledger["date"]
+        report = DataFrame(
+            {
+                "account_name": ledger["account_name"].to_numpy()[first],
+                "amount": ledger["amount"].to_numpy(dtype="int64")[first],
+                "date_a": dates.to_numpy()[first],
+                "date_b": dates.to_numpy()[second],
+                "description_a": pairs["a"],
+                "description_b": pairs["b"],
+                "similarity": similarity.round(4),
+                "id_a": ledger["id"].to_numpy()[first],
+                "id_b": ledger["id"].to_numpy()[second],
+            }
+        )
+        report["days_apart"] = (report["date_b"] - report["date_a"]).dt.days
+        self.report = (
+            report.loc[report["similarity"] >= self.min_similarity]
+            .sort_values(
+                ["similarity", "days_apart", "account_name", "date_a"],
+                ascending=[False, True, True, True],
+                kind="stable",
+            )
+            .reset_index(drop=True)
+        )
+        print(f"found {self.report.shape[0]} suspected duplicates")
+        return self.report
+
+    def candidate_pairs(self, ledger: DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Pairs of rows of the same account and amount at most max_days apart.
+
+        Rows are sorted on a key packing (account_name, amount) and day, so the rows following a
+        row within its window form a contiguous range found with one binary search.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Positions of the earlier and later row of every pair.
+        """
+        if ledger.empty:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        days = ledger["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+        blocks = (
+            ledger.groupby(
+                [ledger["account_name"].astype("string"), ledger["amount"]],
+                dropna=False,
+                sort=False,
+            )
+            .ngroup()
+            .to_numpy()
+        )
+        span = days.max() - days.min() + self.max_days + 1
+        keys = blocks * span + (days - days.min())
+
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        positions = np.arange(order.shape[0])
+        ends = np.searchsorted(sorted_keys, sorted_keys + self.max_days, "right")
+        lengths = ends - positions - 1
+
+        # Expand every (row, later row in its window) pair without a python loop
+        first = np.repeat(positions, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        second = first + 1 + offsets
+
+        return order[first], order[second]
+
+    def score(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Score description pairs, in parallel chunks when there are enough of them."""
+        workers = self.workers or os.cpu_count() or 1
+        if workers == 1 or len(pairs) < MIN_PARALLEL_PAIRS:
+            return score_pairs(pairs)
+
+        chunk_size = -(-len(pairs) // (workers * 4))
+        chunks = [pairs[i : i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return [
+                score
+                for scores in executor.map(score_pairs, chunks)
+                for score in scores
+            ]
+
+    def save_report(self) -> None:
+        from_minor_units(self.report, ["amount"]).to_csv(self.report_path, index=False)
+        print(f"Wrote duplicate audit to {self.report_path}")
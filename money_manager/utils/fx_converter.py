@@ -0,0 +1,138 @@
+import os
+
+from pandas import (
+    DataFrame,
+    Series,
+    concat,
+    merge_asof,
+    read_csv,
+    read_parquet,
+    to_datetime,
+)
+
+from money_manager.utils.utils import load_config
+
+
+class FxConverter:
+    def __init__(self, base_dir: str, ledger: DataFrame) -> None:
+        """Convert ledger amounts to a single reporting currency using a local rate table.
+
+        The rate table is a CSV or Parquet file with the columns date, from_currency, to_currency
+        and rate, where 1 from_currency = rate to_currency. Pairs can be given in either direction
+        relative to the reporting currency. Both are configured under fx_configs in configs.json.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            ledger (DataFrame): The ledger with amount and reporting_amount in minor units.
+        """
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        fx_configs = load_config(configs_path).get("fx_configs", {})
+        self.reporting_currency: str | None = fx_configs.get("reporting_currency")
+        rates_path = fx_configs.get("rates_file_path")
+        self.rates_path: str | None = (
+            os.path.join(base_dir, rates_path) if rates_path else None
+        )
+        self.ledger: DataFrame = ledger
+
+    def get_converted_ledger(self) -> DataFrame:
+        """Fill reporting_amount for the rows that don't have it yet.
+
+        On the first run this converts the whole ledger in one pass; afterwards only new rows and
+        rows whose rate was missing before are converted.
+        """
+        if self.reporting_currency is None or self.rates_path is None:
+            return self.ledger
+        if not os.path.exists(self.rates_path):
+            print(
+                f"FX rate table not found, skipping conversion. Path: {self.rates_path}"
+            )
+            return self.ledger
+
+        pending = self.ledger["reporting_amount"].isna() & self.ledger["amount"].notna()
+        if not pending.any():
+            return self.ledger
+
+        ledger = self.ledger.copy()
+        rates = self.load_rates(self.rates_path)
+        converted = self.convert(
+            ledger.loc[pending, ["date", "currency", "amount"]], rates
+        )
+        ledger.loc[pending, "reporting_amount"] = converted
+
+        missing = int(converted.isna().sum())
+        message = f"Converted {int(pending.sum()) - missing} rows to {self.reporting_currency}"
+        if missing:
+            message += f", {missing} rows without a rate"
+        print(message)
+
+        self.ledger = ledger
+        return ledger
+
+    def convert(self, rows: DataFrame, rates: DataFrame) -> Series:
+        """Convert the amounts of the rows with the latest rate on or before each row's date.
+
+        Args:
+            rows (DataFrame): Rows with date, currency and amount (minor units).
+            rates (DataFrame): Rates as returned by load_rates.
+
+        Returns:
+            Series: The amounts in the reporting currency (minor units), aligned with rows.
+                <NA> where no rate is available.
+        """
+        keyed = DataFrame(
+            {
+                "date": rows["date"].astype("datetime64[ns]"),
+                "currency": rows["currency"].astype("string"),
+                "amount": rows["amount"],
+                "row": rows.index,
+            }
+        ).sort_values("date", kind="stable")
+
+        joined = merge_asof(
+            keyed,
+            rates,
+            on="date",
+            by="currency",
+            direction="backward",
+        ).set_index("row")
+
+        same_currency = joined["currency"] == self.reporting_currency
+        rate = joined["rate"].mask(same_currency, 1.0)
+        converted = (joined["amount"].astype("float64") * rate).round().astype("Int64")
+
+        return converted.reindex(rows.index)
+
+    def load_rates(self, rates_path: str) -> DataFrame:
+        """Read the rate table and express every rate as reporting currency per unit of currency."""
+        if rates_path.endswith(".parquet"):
+            rates = read_parquet(rates_path)
+        else:
+            rates = read_csv(rates_path)
+
+        rates["date"] = to_datetime(rates["date"]).astype("datetime64[ns]")
+        direct = rates.loc[rates["to_currency"] == self.reporting_currency]
+        inverse = rates.loc[rates["from_currency"] == self.reporting_currency]
+
+        return (
+            concat(
+                [
+                    DataFrame(
+                        {
+                            "date": direct["date"],
+                            "currency": direct["from_currency"],
+                            "rate": direct["rate"],
+                        }
+                    ),
+                    DataFrame(
+                        {
+                            "date": inverse["date"],
+                            "currency": inverse["to_currency"],
+                            "rate": 1.0 / inverse["rate"],
+                        }
+                    ),
+                ]
+            )
+            .astype({"currency": "string", "rate": "float64"})
+            .drop_duplicates(subset=["date", "currency"], keep="first")
+            .sort_values("date", kind="stable")
+        )
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+
+import numpy as np
+from pandas import Index
+
+from money_manager.existing_transactions import Ledger
+from money_manager.utils.utils import get_out_file_path, load_config
+
+# Room left for the rows of future runs when the filter is sized, as a multiple of the ids in it
+GROWTH = 2
+MIN_CAPACITY = 1024
+
+
+class IdFilter:
+    """Bloom filter over the ids of the ledger, kept beside the ledger in id_filter/.
+
+    A negative answer is certain: the id is not in the ledger. A positive answer is right except
+    for a share of false positives bounded by false_positive_rate (id_filter_configs in
+    configs.json). Ids are SHA-256 digests already, so the bit positions come from the first 128
+    bits of each id instead of hashing it again.
+
+    Each run adds the ids it wrote. Ids replaced by merges can't be removed and only make false
+    positives likelier, so the filter is rebuilt from the ledger once it holds more ids than it
+    was sized for. Like the rollup, it records the ledger file it matches and is rebuilt when that
+    file was changed outside of a run. It also records the configs the run that wrote the ledger
+    used, so Processor.process can tell when a run would leave the ledger as it is.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        self.configs_dir: str = os.path.join(base_dir, "configs")
+        configs = load_config(os.path.join(self.configs_dir, "configs.json"))
+        self.base_dir: str = base_dir
+        self.ledger_path: str = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.filter_dir: str = os.path.join(
+            os.path.dirname(self.ledger_path), "id_filter"
+        )
+        self.bits_path: str = os.path.join(self.filter_dir, "bits.npy")
+        self.meta_path: str = os.path.join(self.filter_dir, "meta.json")
+        self.false_positive_rate: float = configs.get("id_filter_configs", {}).get(
+            "false_positive_rate", 0.01
+        )
+        rates_path = configs.get("fx_configs", {}).get("rates_file_path")
+        self.rates_path: str | None = (
+            os.path.join(base_dir, rates_path) if rates_path else None
+        )
+        self.bits: np.ndarray = np.zeros(0, dtype=bool)
+        self.meta: dict = {}
+
+    def is_current(self) -> bool:
+        """Check whether the filter was built from the ledger file as it is on disk right now,
+        with the configured false positive rate."""
+        if not (os.path.exists(self.bits_path) and os.path.exists(self.meta_path)):
+            return False
+        with open(self.meta_path, "r") as meta_file:
+            meta = json.load(meta_file)
+        return (
+            meta["ledger"] == self._ledger_fingerprint()
+            and meta["false_positive_rate"] == self.false_positive_rate
+        )
+
+    def load(self) -> bool:
+        """Load the filter if it is current, see is_current.
+
+        Returns:
+            bool: Whether the filter can be used.
+        """
+        if not self.is_current():
+            return False
+        with open(self.meta_path, "r") as meta_file:
+            self.meta = json.load(meta_file)
+        packed = np.load(self.bits_path)
+        self.bits = np.unpackbits(packed, count=self.meta["bits"]).astype(bool)
+        return True
+
+    def configs_unchanged(self) -> bool:
+        """Check whether the configs and the fx rate table are as the run that wrote the ledger
+        found them. Call after load."""
+        return self.meta.get("configs") == self._configs_fingerprint()
+
+    def might_contain(self, ids: Index) -> np.ndarray:
+        """Whether each id may be in the ledger. False is certain, True may be a false positive."""
+        if not self.meta or len(ids) == 0:
+            return np.ones(len(ids), dtype=bool)
+        return self.bits[self.positions(ids)].all(axis=0)
+
+    def sync(self, ledger_ids: Index, new_ids: Index) -> None:
+        """Bring the filter up to date with a run. Call before the ledger file is written.
+
+        Adds the ids the run wrote if the filter matches the ledger file, otherwise or once it
+        is full rebuilds it from all the ids of the ledger.
+
+        Args:
+            ledger_ids (Index): Every id of the ledger about to be written.
+            new_ids (Index): The ids of the rows the run added or merged.
+        """
+        if self.load() and self.meta["count"] + len(new_ids) <= self.meta["capacity"]:
+            self.add(new_ids)
+            print(f"Added {len(new_ids)} ids to the id filter", end=" | ")
+            return
+        self.build(ledger_ids)
+
+    def build(self, ids: Index) -> None:
+        """Size an empty filter for the ids with room to grow, and add them."""
+        capacity = max(len(ids) * GROWTH, MIN_CAPACITY)
+        bits = math.ceil(
+            -capacity * math.log(self.false_positive_rate) / math.log(2) ** 2
+        )
+        self.meta = {
+            "bits": bits,
+            "hashes": max(1, round(bits / capacity * math.log(2))),
+            "capacity": capacity,
+            "count": 0,
+            "false_positive_rate": self.false_positive_rate,
+        }
+        self.bits = np.zeros(bits, dtype=bool)
+        self.add(ids)
+        print(
+            f"Built id filter for {len(ids)} ids, {bits // 8 // 1024} KiB, "
+            f"{self.meta['hashes']} hashes",
+            end=" | ",
+        )
+
+    def add(self, ids: Index) -> None:
+        if len(ids) == 0:
+            return
+        self.bits[self.positions(ids).ravel()] = True
+        self.meta["count"] += len(ids)
+
+    def positions(self, ids: Index) -> np.ndarray:
+        """Bit positions of every id, one row per hash, by double hashing."""
+        digests = np.asarray(ids.astype("string").to_numpy(dtype=str), dtype="S64")
+        nibbles = digests.view(np.uint8).reshape(-1, 64)[:, :32]
+        # Hex digits to their values, a-f (lowercase, as hexdigest writes them) after 0-9
+        values = np.where(nibbles >= ord("a"), nibbles - 87, nibbles - 48).astype(
+            np.uint64
+        )
+        shifts = np.arange(60, -4, -4, dtype=np.uint64)
+        first = (values[:, :16] << shifts).sum(axis=1, dtype=np.uint64)
+        # Never zero, so the hashes of an id don't all land on the same position
+        second = (values[:, 16:] << shifts).sum(axis=1, dtype=np.uint64) | np.uint64(1)
+        steps = np.arange(self.meta["hashes"], dtype=np.uint64)[:, np.newaxis]
+        return ((first + steps * second) % np.uint64(self.meta["bits"])).astype(
+            np.int64
+        )
+
+    def save(self, ran: bool = True) -> None:
+        """Persist the filter. Call after the ledger file has been written.
+
+        Args:
+            ran (bool, optional): Whether a run with the current configs wrote the ledger file.
+                False when the filter is only rebuilt from the file.
+        """
+        os.makedirs(self.filter_dir, exist_ok=True)
+        np.save(self.bits_path, np.packbits(self.bits))
+        with open(self.meta_path, "w") as meta_file:
+            json.dump(
+                {
+                    **self.meta,
+                    "ledger": self._ledger_fingerprint(),
+                    "configs": self._configs_fingerprint() if ran else None,
+                },
+                meta_file,
+            )
+
+    def rebuild(self) -> None:
+        """Build the filter from the ledger file, e.g. after changing the false positive rate."""
+        ledger = Ledger(self.base_dir).get()
+        self.build(ledger.index)
+        self.save(ran=False)
+        print(f"Saved id filter to {self.filter_dir}")
+
+    def _configs_fingerprint(self) -> dict[str, dict[str, int]]:
+        """Size and modification time of the files the stages after the merge read."""
+        paths = [
+            os.path.join(self.configs_dir, name)
+            for name in sorted(os.listdir(self.configs_dir))
+        ]
+        if self.rates_path is not None:
+            paths.append(self.rates_path)
+        fingerprint = {}
+        for path in paths:
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                fingerprint[os.path.relpath(path, self.base_dir)] = {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                }
+        return fingerprint
+
+    def _ledger_fingerprint(self) -> dict[str, int] | None:
+        if not os.path.exists(self.ledger_path):
+            return None
+        stat = os.stat(self.ledger_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
@@ -1,12 +1,17 @@
 import os
 from difflib import SequenceMatcher
 
-from pandas import DataFrame
+import numpy as np
+from pandas import DataFrame, Index
 
 from money_manager.utils.dataframe_hasher import DataFrameHasher
 from money_manager.utils.utils import load_config
 
 
+def description_similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
 class Merger:
     def __init__(
         self,
@@ -19,6 +24,8 @@ class Merger:
         self.new_transactions: DataFrame = new_transactions
         self.match_threshold: float = match_threshold
         self.updated_existing_transactions: DataFrame = DataFrame()
+        self.merged_positions: list[int] = []
+        self.merges: DataFrame = DataFrame(columns=["old_id", "id", "description"])
 
         # Required to hash rows consistently
         configs_dir = os.path.join(base_dir, "configs")
@@ -30,18 +37,40 @@ class Merger:
     def get_clean_ledger(self):
         self.remove_duplicates()
         self.hash_rows()
+
+        # Rows keep their position through hashing, so the merged rows' old and new ids line up
+        positions = np.array(self.merged_positions, dtype=np.int64)
+        self.merges = DataFrame(
+            {
+                "old_id": self.ledger.index.to_numpy()[positions],
+                "id": self.updated_existing_transactions.index.to_numpy()[positions],
+                "description": self.updated_existing_transactions[
+                    "description"
+                ].to_numpy()[positions],
+            }
+        ).drop_duplicates()
         return self.updated_existing_transactions
 
+    def get_merges(self) -> DataFrame:
+        """The old and new id and the new description of every ledger row merged."""
+        return self.merges
+
     def hash_rows(self):
-        dataframe_hasher = DataFrameHasher(
-            self.updated_existing_transactions,
+        # Only the merged rows changed, every other row keeps the id it was hashed with
+        positions = np.unique(np.array(self.merged_positions, dtype=np.int64))
+        if positions.size == 0:
+            return
+        rehashed = DataFrameHasher(
+            self.updated_existing_transactions.iloc[positions],
             self.transaction_structure["cols_to_hash"],
             "id",
-        )
-        self.updated_existing_transactions = dataframe_hasher.get_hashed_df()
+        ).get_hashed_df()
+        ids = self.updated_existing_transactions.index.to_numpy(dtype=object).copy()
+        ids[positions] = rehashed.index.to_numpy()
+        self.updated_existing_transactions.index = Index(ids, name="id")
 
     def calculate_similarity(self, a: str, b: str):
-        return SequenceMatcher(None, a, b).ratio()
+        return description_similarity(a, b)
 
     def remove_duplicates(self):
         # Make a copy to avoid modifying the original dataframe
@@ -52,12 +81,13 @@ class Merger:
         merged_rows = 0
         for _, new_row in self.new_transactions.iterrows():
             # Step 1: Filter existing_transactions by date, amount, and account_name
-            subset_df: DataFrame = self.ledger[
+            candidates = (
                 (self.ledger["date"] == new_row["date"])
                 & (self.ledger["amount"] == new_row["amount"])
                 & (self.ledger["account_name"] == new_row["account_name"])
                 & (self.ledger["description"] != new_row["description"])
-            ]
+            )
+            subset_df: DataFrame = self.ledger[candidates]
 
             # Step 2: If no matching rows, go to the next iteration
             if subset_df.empty:
@@ -76,6 +106,14 @@ class Merger:
                 continue
 
             merged_rows += filtered_df.shape[0]
+            candidate_positions = np.flatnonzero(
+                candidates.to_numpy(dtype=bool, na_value=False)
+            )
+            self.merged_positions.extend(
+                candidate_positions[
+                    (subset_df["similarity_percentage"] >= threshold).to_numpy()
+                ]
+            )
 
             # Update the existing_transaction dataframe
             ledger_c.loc[filtered_df.index, "description"] = new_row["description"]
@@ -1,5 +1,32 @@
+import re
+from collections.abc import Iterable, Iterator
+
 import numpy as np
-from pandas import DataFrame
+from pandas import (
+    CategoricalDtype,
+    DataFrame,
+    Series,
+    concat,
+    factorize,
+    to_datetime,
+    to_numeric,
+)
+from pandas.api.types import infer_dtype, is_integer_dtype
+
+# Values inferred as these kinds hold no text to parse. Any other column, e.g. integers mixed with
+# formatted amounts, is parsed as text so the cells that fail are counted
+NUMERIC_KINDS = (
+    "integer",
+    "floating",
+    "mixed-integer-float",
+    "decimal",
+    "boolean",
+    "empty",
+)
+# Currency code or symbol written next to an amount, e.g. 'L', 'USD', 'L.', '$' or 'US$'
+CURRENCY = r"(?:[^\W\d_]{1,3}\.?)?[$€£¥₡]?"
+# Minor units in one unit of every currency in the ledger, e.g. cents in a dollar
+MINOR_UNITS_PER_UNIT = 100
 
 
 def drop_null_or_empty_rows(df: DataFrame, col_index: int) -> DataFrame:
@@ -22,31 +49,247 @@ def drop_null_or_empty_rows(df: DataFrame, col_index: int) -> DataFrame:
     ]
 
 
-def remove_unwanted_chars(
-    df: DataFrame, columns: list[str], pattern: str = r"[^\d.\-]"
-) -> DataFrame:
+def amount_pattern(decimal_sep: str) -> str:
+    """The grammar of a formatted amount written with the decimal separator, '.' or ','.
+
+    An amount is digits, optionally grouped by the other separator and with one decimal separator,
+    a currency code or symbol before or after them, e.g. 'L 1,234.50' or '12,30 €', and at most one
+    of a leading sign, a sign after the currency, a trailing minus or enclosing parentheses.
+    """
+    dec = re.escape(decimal_sep)
+    thousands = re.escape("," if decimal_sep == "." else ".")
+    return (
+        rf"^(?P<open>\()?\s*(?P<lead>[-+])?\s*{CURRENCY}\s*(?P<inner>[-+])?\s*"
+        rf"(?P<number>\d+(?:{thousands}\d+)*(?:{dec}\d*)?|{dec}\d+)"
+        rf"\s*{CURRENCY}\s*(?P<trail>-)?\s*(?(open)\))$"
+    )
+
+
+def parse_amounts(
+    df: DataFrame, columns: list[str], decimal_sep: str = "."
+) -> tuple[DataFrame, int]:
     """
-    Clean specified columns in the DataFrame by removing unwanted characters.
+    Parse formatted amount columns into floats in a single vectorized pass per column.
+
+    Text cells must match amount_pattern: thousands separators and currency symbols are
+    discarded, the decimal separator is normalized to '.', and minus signs and parenthesized
+    amounts are treated as negatives. Cells that are already numeric are kept as they are.
+    Empty cells become NaN; non-empty cells that don't match, e.g. '1e5' or '1.2.3', also
+    become NaN and are counted so the caller can report them.
 
     Args:
-        df (DataFrame): The pandas DataFrame to clean.
-        columns (list or str): List of column names to clean.
-        pattern (str, optional): Regular expression pattern to match unwanted characters.
+        df (DataFrame): The pandas DataFrame to parse.
+        columns (list[str]): List of column names containing amounts.
+        decimal_sep (str, optional): The decimal separator used by the statement, '.' or ','.
 
     Returns:
-        DataFrame: A new pandas DataFrame with specified columns converted to numeric.
+        tuple[DataFrame, int]: A new pandas DataFrame with the specified columns converted to
+            float64, and the number of non-empty cells that couldn't be parsed.
     """
+    parsed_df = df.copy()
+    pattern = amount_pattern(decimal_sep)
+    thousands = "," if decimal_sep == "." else "."
+
+    unparsed = 0
+    for column in columns:
+        values = parsed_df[column]
+        if infer_dtype(values, skipna=True) in NUMERIC_KINDS:
+            # Nothing to parse, e.g. numeric cells read from Excel or an all-empty column
+            parsed_df[column] = to_numeric(values, errors="coerce").astype("float64")
+            continue
+
+        # .str yields NaN for cells that are not strings (e.g. floats read from Excel)
+        text = values.str.strip()
+        numeric_cells = to_numeric(values.where(text.isna()), errors="coerce")
+
+        parts = text.str.extract(pattern)
+        signs = parts[["open", "lead", "inner", "trail"]]
+        # One sign at most, e.g. '-(5)' or '-5-' are not amounts
+        valid = parts["number"].notna() & (signs.notna().sum(axis=1) <= 1)
+        negative = parts["open"].notna() | signs.isin(["-"]).any(axis=1)
 
-    # Create a copy of the DataFrame to avoid modifying the original (immutability principle)
-    cleaned_df = df.copy()
+        digits = parts["number"].where(valid).str.replace(thousands, "", regex=False)
+        if decimal_sep != ".":
+            digits = digits.str.replace(decimal_sep, ".", regex=False)
+        amounts = to_numeric(digits, errors="coerce").astype("float64")
+        amounts = amounts.where(~negative, -amounts)
 
-    # Loop through each column and clean it
+        is_filled = text.notna() & (text != "")
+        unparsed += int((is_filled & amounts.isna()).sum())
+
+        parsed_df[column] = amounts.where(text.notna(), numeric_cells).astype("float64")
+
+    return parsed_df, unparsed
+
+
+def parse_dates(df: DataFrame, column: str, formats: list[str]) -> DataFrame:
+    """
+    Parse a date column by converting each distinct value only once.
+
+    Statements repeat the same few dates across many rows, so the column is factorized,
+    the unique values are parsed and the results are mapped back to every row by their
+    codes. The first format (in order) that parses every unique value is used; if none
+    does, the format that parses the most values wins.
+
+    Args:
+        df (DataFrame): The pandas DataFrame to parse.
+        column (str): Name of the column containing dates.
+        formats (list[str]): Candidate strftime formats, in order of preference.
+
+    Returns:
+        DataFrame: A copy of the DataFrame with the column parsed. Unparseable values become NaT.
+    """
+    parsed_df = df.copy()
+    codes, uniques = factorize(parsed_df[column])
+
+    best_dates = Series(dtype="datetime64[ns]")
+    for date_format in formats:
+        dates = to_datetime(Series(uniques), format=date_format, errors="coerce")
+        if best_dates.empty or dates.notna().sum() > best_dates.notna().sum():
+            best_dates = dates
+        if dates.notna().all():
+            break
+
+    # Code -1 marks missing values, point them at an appended NaT of the same unit
+    lookup = best_dates.to_numpy()
+    lookup = np.append(lookup, np.array("NaT", dtype=lookup.dtype))
+    parsed_df[column] = Series(lookup[codes], index=parsed_df.index)
+
+    return parsed_df
+
+
+def to_minor_units(df: DataFrame, columns: list[str]) -> DataFrame:
+    """
+    Convert decimal amount columns to integer minor units (cents), e.g. -12.30 -> -1230.
+
+    Amounts are rounded to the nearest cent once here, so matching, hashing and aggregations
+    work on exact integers instead of floats. Missing amounts become <NA>. Columns that are not
+    in the DataFrame are skipped, since not every statement carries every amount column.
+
+    Args:
+        df (DataFrame): The DataFrame to convert.
+        columns (list[str]): The list of amount columns to convert.
+
+    Returns:
+        DataFrame: A copy of the DataFrame with the columns as nullable Int64 minor units.
+    """
+    converted_df = df.copy()
     for column in columns:
-        cleaned_df[column] = (
-            cleaned_df[column].astype(str).str.replace(pattern, "", regex=True)
+        if column not in converted_df.columns:
+            continue
+        values = converted_df[column]
+        if is_integer_dtype(values):
+            continue
+        converted_df[column] = (
+            (values.astype("float64") * MINOR_UNITS_PER_UNIT).round().astype("Int64")
         )
 
-    return cleaned_df
+    return converted_df
+
+
+def to_minor_amount(amount: float | None) -> int | None:
+    """
+    Convert one decimal amount to integer minor units like to_minor_units, e.g. -12.30 -> -1230.
+
+    Args:
+        amount (float | None): The amount, e.g. a filter given by the user.
+
+    Returns:
+        int | None: The amount in minor units, None if the amount is None.
+    """
+    if amount is None:
+        return None
+    return round(amount * MINOR_UNITS_PER_UNIT)
+
+
+def from_minor_units(df: DataFrame, columns: list[str]) -> DataFrame:
+    """
+    Render integer minor unit columns back to decimal amounts, e.g. -1230 -> -12.3.
+
+    Args:
+        df (DataFrame): The DataFrame to convert.
+        columns (list[str]): The list of minor unit columns to render.
+
+    Returns:
+        DataFrame: A copy of the DataFrame with the columns as float64 amounts.
+    """
+    rendered_df = df.copy()
+    for column in columns:
+        if column in rendered_df.columns:
+            rendered_df[column] = (
+                rendered_df[column].astype("float64") / MINOR_UNITS_PER_UNIT
+            )
+
+    return rendered_df
+
+
+def keep_end_of_day_balances(
+    df: DataFrame, balance_col: str = "statement_balance"
+) -> DataFrame:
+    """
+    Keep the reported balance only on the last transaction of each day.
+
+    Statement rows within a day end up in no particular order once they are in the ledger, so
+    only the end-of-day balance can be reconciled. The export order (oldest or newest first) is
+    detected from which direction the balances chain with the amounts, and every balance that is
+    not the chronologically last of its day is set to <NA>. DataFrames without the balance column
+    are returned unchanged.
+
+    Args:
+        df (DataFrame): A cleaned statement in export order with date, amount and balance columns.
+        balance_col (str, optional): Name of the balance column.
+
+    Returns:
+        DataFrame: A copy of the DataFrame with only end-of-day balances.
+    """
+    if balance_col not in df.columns:
+        return df
+
+    amounts = df["amount"]
+    balances = df[balance_col]
+    oldest_first = (balances == balances.shift(1) + amounts).sum()
+    newest_first = (balances.shift(1) == balances + amounts.shift(1)).sum()
+    keep = "last" if oldest_first >= newest_first else "first"
+
+    marked_df = df.copy()
+    marked_df[balance_col] = balances.where(~df["date"].duplicated(keep=keep))
+
+    return marked_df
+
+
+def keep_runs_together(chunks: Iterable[DataFrame], column: str) -> Iterator[DataFrame]:
+    """
+    Re-split a stream of chunks so consecutive rows with the same value in a column share a chunk.
+
+    The rows at the end of each chunk with the same value as its last row are moved to the start
+    of the next chunk, e.g. so the rows of a day are cleaned together. Chunks without the column
+    are passed through unchanged.
+
+    Args:
+        chunks (Iterable[DataFrame]): The chunks, in file order.
+        column (str): Name of the column whose runs must not be split.
+
+    Returns:
+        Iterator[DataFrame]: The re-split chunks.
+    """
+    carried: DataFrame | None = None
+    for chunk in chunks:
+        if carried is not None:
+            chunk = concat([carried, chunk])
+            carried = None
+        if chunk.empty or column not in chunk.columns:
+            yield chunk
+            continue
+
+        values = chunk[column]
+        differs = (values != values.iloc[-1]).to_numpy(dtype=bool, na_value=True)
+        run_start = int(np.flatnonzero(differs)[-1]) + 1 if differs.any() else 0
+        carried = chunk.iloc[run_start:]
+        if run_start > 0:
+            yield chunk.iloc[:run_start]
+
+    if carried is not None and not carried.empty:
+        yield carried
 
 
 def replace_empty_string_with_nan(df: DataFrame, columns: list[str]) -> DataFrame:
@@ -77,3 +320,39 @@ def clean_column_values(df):
 
     # Apply this function to every element of the DataFrame (assuming it's a string)
     return df.map(clean_str)
+
+
+def concat_keeping_categories(frames: list[DataFrame]) -> DataFrame:
+    """
+    Concatenate DataFrames without losing categorical columns.
+
+    pandas falls back to plain strings when the categoricals being concatenated have different
+    categories. The categories of every categorical column are unioned first so all frames share
+    the same CategoricalDtype and the result stays categorical.
+
+    Args:
+        frames (list[DataFrame]): The DataFrames to concatenate.
+
+    Returns:
+        DataFrame: The concatenated DataFrame.
+    """
+    categorical_cols = {
+        col
+        for frame in frames
+        for col, dtype in frame.dtypes.items()
+        if isinstance(dtype, CategoricalDtype)
+    }
+
+    aligned = [frame.copy(deep=False) for frame in frames]
+    for col in categorical_cols:
+        columns = [frame[col].astype("category") for frame in aligned if col in frame]
+        categories = columns[0].cat.categories
+        for column in columns[1:]:
+            categories = categories.union(column.cat.categories)
+
+        dtype = CategoricalDtype(categories)
+        for frame in aligned:
+            if col in frame:
+                frame[col] = frame[col].astype(dtype)
+
+    return concat(aligned)
@@ -0,0 +1,176 @@
+import os
+
+from pandas import DataFrame, Series
+
+from money_manager.utils.pandas_utils import from_minor_units
+from money_manager.utils.utils import get_out_file_path, load_config
+
+
+class Reconciler:
+    def __init__(self, base_dir: str, ledger: DataFrame) -> None:
+        """Compute per-account running balances and check them against statement balances.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            ledger (DataFrame): The ledger with amount and statement_balance in minor units.
+        """
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        configs = load_config(configs_path)
+        out_file_path = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.discrepancies_path: str = os.path.join(
+            os.path.dirname(out_file_path), "reconciliation.csv"
+        )
+        self.ledger: DataFrame = ledger
+        self.discrepancies: DataFrame = DataFrame()
+
+    def get_reconciled_ledger(self, added: DataFrame | None = None) -> DataFrame:
+        """Fill in the running balances and find where they diverge from the statement balances.
+
+        Rows without a running balance and rows in added are pending. An account whose pending
+        rows all come after its already balanced rows is extended from its last running balance;
+        any other account with pending rows is recomputed in full.
+
+        Args:
+            added (DataFrame | None): Rows appended to the ledger during this run.
+
+        Returns:
+            DataFrame: The ledger with the running_balance column filled in.
+        """
+        ledger = self.ledger.copy()
+        ordered = ledger.sort_values(["account_name", "date"], kind="stable")
+        accounts = ordered["account_name"]
+
+        pending = ordered["running_balance"].isna()
+        if added is not None and not added.empty:
+            pending |= ordered["id"].isin(added["id"])
+
+        settled = ~pending
+        by_account = lambda values: values.groupby(accounts, observed=True)
+        last_settled_date = by_account(ordered["date"].where(settled)).transform("max")
+        first_pending_date = by_account(ordered["date"].where(pending)).transform("min")
+        settled_has_balance = by_account(
+            ordered["statement_balance"].notna() & settled
+        ).transform("any")
+        pending_has_balance = by_account(
+            ordered["statement_balance"].notna() & pending
+        ).transform("any")
+        has_pending = by_account(pending).transform("any")
+
+        # Pending rows that can be chained onto the last running balance of their account. When
+        # the first reported balance of the account is among them the anchor changes, so the
+        # account is recomputed instead.
+        appendable = (
+            has_pending
+            & last_settled_date.notna()
+            & (first_pending_date >= last_settled_date)
+            & (settled_has_balance | ~pending_has_balance)
+        )
+        recompute = has_pending & ~appendable
+
+        running = ordered["running_balance"].astype("Int64").copy()
+
+        if recompute.any():
+            running[recompute] = self.running_balances(ordered[recompute])
+
+        append_rows = appendable & pending
+        if append_rows.any():
+            last_balance = by_account(running.where(appendable & settled)).transform(
+                "last"
+            )
+            pending_amounts = ordered["amount"].where(append_rows, 0).fillna(0)
+            chained = last_balance + by_account(pending_amounts).cumsum()
+            running[append_rows] = chained[append_rows]
+
+        ordered["running_balance"] = running
+        ledger["running_balance"] = running.reindex(ledger.index)
+
+        self.discrepancies = self.find_discrepancies(ordered)
+        print(
+            f"Reconciled {int(pending.sum())} rows, "
+            f"{self.discrepancies.shape[0]} balance discrepancies"
+        )
+
+        self.ledger = ledger
+        return ledger
+
+    def running_balances(self, ordered: DataFrame) -> Series:
+        """Running balances of whole accounts with a grouped cumulative sum.
+
+        The balances are anchored on the first reported statement balance of each account.
+        Accounts without any reported balance start at zero.
+
+        Args:
+            ordered (DataFrame): Rows of complete accounts, sorted by account_name and date.
+
+        Returns:
+            Series: The running balance of every row, in minor units.
+        """
+        accounts = ordered["account_name"]
+        days = [accounts, ordered["date"]]
+
+        cumulative = (
+            ordered["amount"].fillna(0).groupby(accounts, observed=True).cumsum()
+        )
+        end_of_day = cumulative.groupby(days, observed=True).transform("last")
+        reported = (
+            ordered["statement_balance"].groupby(days, observed=True).transform("max")
+        )
+        opening = (
+            (reported - end_of_day)
+            .groupby(accounts, observed=True)
+            .transform("first")
+            .fillna(0)
+        )
+
+        return (cumulative + opening).astype("Int64")
+
+    def find_discrepancies(self, ordered: DataFrame) -> DataFrame:
+        """Find the date ranges where the running balance stops matching the statements.
+
+        Each statement balance is compared with the running balance at the end of its day. A change
+        in that difference between two consecutive reported days means transactions in between are
+        missing or counted twice.
+
+        Args:
+            ordered (DataFrame): The ledger sorted by account_name and date, with running balances.
+
+        Returns:
+            DataFrame: One row per diverging range with account_name, from_date, to_date and
+                difference (reported minus computed change, in minor units).
+        """
+        daily = (
+            ordered.groupby(["account_name", "date"], observed=True, sort=True)
+            .agg(
+                running_balance=("running_balance", "last"),
+                statement_balance=("statement_balance", "max"),
+            )
+            .reset_index()
+            .loc[lambda df: df["statement_balance"].notna()]
+        )
+        gap = daily["statement_balance"] - daily["running_balance"]
+        by_account = gap.groupby(daily["account_name"], observed=True)
+
+        # The first reported day of an account has no previous day to compare with
+        daily["difference"] = by_account.diff()
+        daily["from_date"] = daily.groupby("account_name", observed=True)["date"].shift(
+            1
+        )
+        daily.loc[by_account.cumcount() == 0, "difference"] = gap
+
+        return (
+            daily.loc[daily["difference"].fillna(0) != 0]
+            .rename(columns={"date": "to_date"})[
+                ["account_name", "from_date", "to_date", "difference"]
+            ]
+            .reset_index(drop=True)
+        )
+
+    def get_discrepancies(self) -> DataFrame:
+        return self.discrepancies
+
+    def save_discrepancies(self) -> None:
+        from_minor_units(self.discrepancies, ["difference"]).to_csv(
+            self.discrepancies_path, index=False
+        )
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+
+from pandas import DataFrame, Index
+
+from money_manager.models.statement import Statement
+from money_manager.utils.pandas_utils import concat_keeping_categories
+from money_manager.utils.utils import (
+    cast_dataframe_columns,
+    get_out_file_path,
+    load_config,
+)
+
+MERGE_COLUMNS = ["old_id", "id", "description"]
+
+
+def file_sha256(file_path: str) -> str:
+    hash_object = hashlib.sha256()
+    with open(file_path, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            hash_object.update(block)
+    return hash_object.hexdigest()
+
+
+class RunJournal:
+    """Append-only log of the statements a run merged, kept beside the ledger as run_journal.jsonl.
+
+    Every line is one event, flushed to disk before the run goes on:
+
+    - start: the size and modification time of the ledger file the run read.
+    - merged: one statement merged into the ledger in memory, with the name and SHA-256 of its
+      file, the rows it added and the ledger rows whose description it replaced.
+    - saved: the ledger file was written, with its new size and modification time.
+
+    A finished run deletes the journal. A run that finds one left behind resumes it: if the ledger
+    file is still the one the journal started from, the statements it merged are replayed from
+    the journal instead of being read, cleaned and merged again. If the ledger file is the one the
+    journal saved, only deleting the inputs was left to do.
+    """
+
+    def __init__(self, base_dir: str) -> None:
+        configs_dir = os.path.join(base_dir, "configs")
+        configs = load_config(os.path.join(configs_dir, "configs.json"))
+        self.ledger_path: str = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.journal_path: str = os.path.join(
+            os.path.dirname(self.ledger_path), "run_journal.jsonl"
+        )
+        self.structure: dict[str, str] = load_config(
+            os.path.join(configs_dir, "transaction_structure.json")
+        )["structure"]
+        self.entries: list[dict] = []
+        self.saved: bool = False
+
+    def open(self) -> None:
+        """Resume the journal left by an unfinished run on this ledger file, or start a new one."""
+        events = self.read()
+        fingerprint = self._ledger_fingerprint()
+        started = [event for event in events if event["event"] == "start"]
+        saved = [event for event in events if event["event"] == "saved"]
+
+        self.saved = bool(saved) and saved[-1]["ledger"] == fingerprint
+        if self.saved or (started and started[0]["ledger"] == fingerprint):
+            self.entries = [event for event in events if event["event"] == "merged"]
+            state = "saved" if self.saved else "not saved"
+            print(
+                f"Resuming an unfinished run, {len(self.entries)} statements merged, ledger {state}"
+            )
+            return
+
+        if events:
+            print("Discarding the journal of a run on a different ledger file")
+        self.reset()
+
+    def reset(self) -> None:
+        """Start the journal of a new run on the current ledger file."""
+        self.entries = []
+        self.saved = False
+        os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+        with open(self.journal_path, "w", encoding="utf-8") as journal_file:
+            journal_file.write(
+                json.dumps({"event": "start", "ledger": self._ledger_fingerprint()})
+                + "\n"
+            )
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def clear(self) -> None:
+        """Remove the journal once the run is finished."""
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def files(self) -> dict[str, str]:
+        """The SHA-256 of every file the journal merged, by file name."""
+        return {entry["file"]: entry["sha256"] for entry in self.entries}
+
+    def record(self, statement: Statement, added: DataFrame, merges: DataFrame) -> None:
+        """Log a statement merged into the ledger in memory.
+
+        Args:
+            statement (Statement): The statement, its file still in the input folder.
+            added (DataFrame): The rows the statement added, indexed by id.
+            merges (DataFrame): The old_id, id and new description of the ledger rows it merged.
+        """
+        entry = {
+            "event": "merged",
+            "file": statement.filename,
+            "sha256": file_sha256(statement.filepath),
+            "filepath": statement.filepath,
+            "account_name": statement.account_name,
+            "bank_name": statement.bank_name,
+            "currency": statement.currency,
+            "account_type": statement.account_type,
+            "merges": merges.reindex(columns=MERGE_COLUMNS).astype(str).to_dict("list"),
+        }
+        rows = added.reset_index().to_json(
+            orient="split", index=False, date_format="iso", date_unit="ns"
+        )
+        # The rows are already JSON, so they are spliced in rather than parsed and dumped again
+        self.append(f'{json.dumps(entry)[:-1]}, "added": {rows}}}')
+        self.entries.append(entry)
+
+    def mark_saved(self) -> None:
+        """Log that the ledger file was written with every merged statement."""
+        self.append(
+            json.dumps({"event": "saved", "ledger": self._ledger_fingerprint()})
+        )
+        self.saved = True
+
+    def replay(
+        self, ledger: DataFrame, files: list[str]
+    ) -> tuple[DataFrame, list[Statement], list[DataFrame], list[DataFrame]]:
+        """Apply the merges of the given journaled files to the ledger, in the order they were logged.
+
+        Args:
+            ledger (DataFrame): The ledger read from the file the journal started from, indexed by id.
+            files (list[str]): Names of the journaled files still in the input folder unchanged.
+
+        Returns:
+            tuple: The ledger with the statements merged, the statements, the rows each added and
+                the old_id and id of the rows each merged.
+        """
+        statements: list[Statement] = []
+        added: list[DataFrame] = []
+        merges: list[DataFrame] = []
+        for entry in self.entries:
+            if entry["file"] not in files:
+                continue
+            merged = DataFrame(entry["merges"], columns=MERGE_COLUMNS)
+            if not merged.empty:
+                ledger = self.apply_merges(ledger, merged)
+            rows = DataFrame(entry["added"]["data"], columns=entry["added"]["columns"])
+            rows = cast_dataframe_columns(rows, self.structure).set_index("id")
+            ledger = concat_keeping_categories([ledger, rows])
+            statements.append(self.statement(entry))
+            added.append(rows)
+            merges.append(merged[["old_id", "id"]])
+        if statements:
+            print(f"Replayed {len(statements)} statements from the run journal")
+        return ledger, statements, added, merges
+
+    def statements(self) -> list[Statement]:
+        """The merged statements of the journal, without their data, e.g. to delete their files."""
+        return [self.statement(entry) for entry in self.entries]
+
+    def statement(self, entry: dict) -> Statement:
+        return Statement(
+            DataFrame(),
+            entry["filepath"],
+            entry["file"],
+            entry["account_name"],
+            entry["bank_name"],
+            entry["currency"],
+            entry["account_type"],
+            True,
+        )
+
+    def apply_merges(self, ledger: DataFrame, merged: DataFrame) -> DataFrame:
+        """Give the merged rows the description and id the merge gave them."""
+        targets = merged.drop_duplicates("old_id", keep="last").set_index("old_id")
+        hit = ledger.index.isin(targets.index)
+        ledger = ledger.copy()
+        matched = targets.reindex(ledger.index[hit])
+        ledger.loc[hit, "description"] = matched["description"].to_numpy()
+        ids = ledger.index.to_numpy(dtype=object).copy()
+        ids[hit] = matched["id"].to_numpy()
+        ledger.index = Index(ids, name=ledger.index.name, dtype=ledger.index.dtype)
+        return ledger
+
+    def read(self) -> list[dict]:
+        """Events of the journal, up to a last line cut short by a crash."""
+        if not os.path.exists(self.journal_path):
+            return []
+        events = []
+        with open(self.journal_path, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return events
+
+    def append(self, line: str) -> None:
+        with open(self.journal_path, "a", encoding="utf-8") as journal_file:
+            journal_file.write(line + "\n")
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+    def _ledger_fingerprint(self) -> dict[str, int] | None:
+        if not os.path.exists(self.ledger_path):
+            return None
+        stat = os.stat(self.ledger_path)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
@@ -0,0 +1,239 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Self
+
+from money_manager.utils.utils import get_out_file_path, load_config
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes.
+
+    Read from /proc where available. Elsewhere the peak resident memory is the closest measure the
+    standard library offers.
+    """
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Stage:
+    """A stage being measured. Callers set rows_out before the stage ends."""
+
+    def __init__(
+        self, metrics: "RunMetrics", name: str, file: str | None, rows_in: int | None
+    ) -> None:
+        self.metrics: RunMetrics = metrics
+        self.name: str = name
+        self.file: str | None = file
+        self.rows_in: int | None = rows_in
+        self.rows_out: int | None = None
+
+    def __enter__(self) -> Self:
+        self.metrics.current_stage = self.name
+        self.rss = current_rss()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.metrics.current_stage = None
+        self.metrics.records.append(
+            {
+                "stage": self.name,
+                "file": self.file,
+                "started_seconds": round(self.wall - self.metrics.started, 6),
+                "wall_seconds": round(wall, 6),
+                "cpu_seconds": round(cpu, 6),
+                "rows_in": self.rows_in,
+                "rows_out": self.rows_out,
+                "memory_delta_bytes": current_rss() - self.rss,
+                "failed": exc_type is not None,
+            }
+        )
+
+
+class _DisabledStage:
+    """Stands in for Stage when metrics are off, so measured code runs unchanged."""
+
+    rows_out: int | None = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        return None
+
+
+DISABLED_STAGE = _DisabledStage()
+
+
+class RunMetrics:
+    def __init__(self, base_dir: str, enabled: bool = True) -> None:
+        """Collect the wall time, CPU time, rows and memory of every stage of a run.
+
+        Stages are measured with `with metrics.stage(...)` blocks. When disabled, stage() hands
+        back a shared object whose enter and exit do nothing, so instrumented code costs one method
+        call per stage. The report of an enabled run is written to run_reports/ beside the ledger.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            enabled (bool, optional): Whether to collect anything at all.
+        """
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        configs = load_config(configs_path)
+        out_file_path = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.reports_dir: str = os.path.join(
+            os.path.dirname(out_file_path), "run_reports"
+        )
+        self.enabled: bool = enabled
+        self.run_id: str = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        self.started: float = time.perf_counter()
+        self.started_cpu: float = time.process_time()
+        self.records: list[dict] = []
+        self.current_stage: str | None = None
+
+    def stage(
+        self, name: str, file: str | None = None, rows_in: int | None = None
+    ) -> Stage | _DisabledStage:
+        """Measure the block run under this stage.
+
+        Args:
+            name (str): Name of the stage, e.g. read or merge.
+            file (str | None, optional): Input file the stage works on, if any.
+            rows_in (int | None, optional): Rows the stage receives.
+        """
+        if not self.enabled:
+            return DISABLED_STAGE
+        return Stage(self, name, file, rows_in)
+
+    def summary(self) -> dict[str, dict]:
+        """Totals of every stage over all the files it ran for, in order of first run."""
+        totals: dict[str, dict] = {}
+        for record in self.records:
+            stage = totals.setdefault(
+                record["stage"],
+                {
+                    "calls": 0,
+                    "wall_seconds": 0.0,
+                    "cpu_seconds": 0.0,
+                    "memory_delta_bytes": 0,
+                },
+            )
+            stage["calls"] += 1
+            stage["wall_seconds"] = round(
+                stage["wall_seconds"] + record["wall_seconds"], 6
+            )
+            stage["cpu_seconds"] = round(
+                stage["cpu_seconds"] + record["cpu_seconds"], 6
+            )
+            stage["memory_delta_bytes"] += record["memory_delta_bytes"]
+        return totals
+
+    def report_path(self, suffix: str = ".json") -> str:
+        return os.path.join(self.reports_dir, f"run-{self.run_id}{suffix}")
+
+    def save(self) -> None:
+        """Write the run report. Does nothing when collection is disabled."""
+        if not self.enabled:
+            return
+
+        os.makedirs(self.reports_dir, exist_ok=True)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open(self.report_path(), "w") as report_file:
+            json.dump(
+                {
+                    "run_id": self.run_id,
+                    "wall_seconds": round(time.perf_counter() - self.started, 6),
+                    "cpu_seconds": round(time.process_time() - self.started_cpu, 6),
+                    "peak_rss_bytes": peak if sys.platform == "darwin" else peak * 1024,
+                    "summary": self.summary(),
+                    "stages": self.records,
+                },
+                report_file,
+                indent=2,
+            )
+        print(f"Wrote run report to {self.report_path()}")
+
+
+class MemorySampler(threading.Thread):
+    def __init__(self, metrics: RunMetrics, interval: float = 0.05) -> None:
+        """Sample the resident memory of the process, with the stage running at the time.
+
+        Args:
+            metrics (RunMetrics): Metrics of the run, to label samples with the current stage.
+            interval (float, optional): Seconds between samples.
+        """
+        super().__init__(daemon=True)
+        self.metrics: RunMetrics = metrics
+        self.interval: float = interval
+        self.samples: list[dict] = []
+        self.stopped: threading.Event = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            self.samples.append(
+                {
+                    "seconds": round(time.perf_counter() - self.metrics.started, 3),
+                    "rss_bytes": current_rss(),
+                    "stage": self.metrics.current_stage,
+                }
+            )
+            self.stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+class Profiler:
+    def __init__(self, metrics: RunMetrics, top: int = 25) -> None:
+        """Run a block under cProfile and a memory sampler, saving both next to the run report.
+
+        The profile is written as run-<id>.prof for pstats or snakeviz, and the memory samples as
+        run-<id>-memory.json.
+
+        Args:
+            metrics (RunMetrics): Metrics of the profiled run.
+            top (int, optional): Functions to print, by cumulative time.
+        """
+        self.metrics: RunMetrics = metrics
+        self.top: int = top
+        self.profile: cProfile.Profile = cProfile.Profile()
+        self.sampler: MemorySampler = MemorySampler(metrics)
+
+    def __enter__(self) -> Self:
+        self.sampler.start()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.profile.disable()
+        self.sampler.stop()
+
+        os.makedirs(self.metrics.reports_dir, exist_ok=True)
+        self.profile.dump_stats(self.metrics.report_path(".prof"))
+        with open(self.metrics.report_path("-memory.json"), "w") as memory_file:
+            json.dump({"samples": self.sampler.samples}, memory_file)
+
+        stats_text = io.StringIO()
+        pstats.Stats(self.profile, stream=stats_text).sort_stats(
+            "cumulative"
+        ).print_stats(self.top)
+        print(stats_text.getvalue())
+        print(f"Wrote profile to {self.metrics.report_path('.prof')}")
@@ -0,0 +1,141 @@
+import types
+import typing
+from datetime import datetime
+
+import numpy as np
+from pandas import DataFrame, Series, concat, factorize, to_datetime, to_numeric
+from pandas.api.types import is_datetime64_dtype, is_integer_dtype, is_numeric_dtype
+from pydantic import BaseModel
+
+from money_manager.settings.transactions import Transaction
+from money_manager.utils.utils import cast_dataframe_columns
+
+ERROR_COLUMNS = ["row", "column", "value", "error"]
+
+
+def field_type(annotation) -> type:
+    """The type a field holds when set, e.g. int for `int | None`."""
+    is_union = typing.get_origin(annotation) is typing.Union
+    if is_union or isinstance(annotation, types.UnionType):
+        return next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    return annotation
+
+
+class SchemaValidator:
+    def __init__(
+        self, structure: dict[str, str], model: type[BaseModel] = Transaction
+    ) -> None:
+        """Cast and validate whole frames against a row model in one pass per column.
+
+        The model says what each field holds (datetime, int minor units or str) and whether it is
+        required. The structure from transaction_structure.json says how each column is stored in
+        memory. Values that can't be converted become missing and, like missing required values,
+        are reported as one row of the error frame each instead of stopping the validation.
+
+        Args:
+            structure (dict[str, str]): Column names mapped to their pandas dtype.
+            model (type[BaseModel], optional): Model of one row.
+        """
+        self.structure: dict[str, str] = structure
+        self.fields: dict[str, type] = {
+            name: field_type(field.annotation)
+            for name, field in model.model_fields.items()
+        }
+        self.required: list[str] = [
+            name for name, field in model.model_fields.items() if field.is_required()
+        ]
+
+    def validate(self, df: DataFrame) -> tuple[DataFrame, DataFrame]:
+        """Cast every column to its schema type and collect the values that break the model.
+
+        Args:
+            df (DataFrame): Frame with exactly the columns of the structure.
+
+        Raises:
+            ValueError: If columns are missing or not part of the structure.
+
+        Returns:
+            tuple[DataFrame, DataFrame]: The cast frame, and the error frame with the position of
+                the row, the column, the original value and what is wrong with it.
+        """
+        missing_columns = [col for col in self.structure if col not in df.columns]
+        if missing_columns:
+            raise ValueError(
+                f"Transactions dataframe has missing columns. Missing columns: {missing_columns}"
+            )
+        extra_columns = [col for col in df.columns if col not in self.structure]
+        if extra_columns:
+            raise ValueError(
+                f"Transactions dataframe has extra columns. Extra columns: {extra_columns}"
+            )
+
+        errors = []
+        was_missing = df.isna()
+        df = df.copy()
+        for column in self.structure:
+            values = df[column]
+            kind = self.fields.get(column, str)
+            if kind is datetime:
+                converted = self.to_datetime(values)
+                invalid = converted.isna() & values.notna()
+                errors.append(self.errors(values, invalid, column, "not a date"))
+            elif kind is int:
+                converted = self.to_integer(values)
+                invalid = converted.isna() & values.notna()
+                errors.append(
+                    self.errors(values, invalid, column, "not a whole number")
+                )
+            else:
+                converted = values
+            df[column] = converted
+
+        df = cast_dataframe_columns(df, self.structure)
+        # Values that failed to convert were reported above, only report the ones never given
+        for column in self.required:
+            errors.append(
+                self.errors(df[column], was_missing[column], column, "missing")
+            )
+
+        errors = [error for error in errors if not error.empty]
+        if not errors:
+            return df, DataFrame(columns=ERROR_COLUMNS)
+        error_frame = (
+            concat(errors, ignore_index=True)
+            .sort_values(["row", "column"], kind="stable")
+            .reset_index(drop=True)
+        )
+        return df, error_frame
+
+    def to_datetime(self, values: Series) -> Series:
+        if is_datetime64_dtype(values):
+            return values
+        # Ledgers repeat the same dates many times, so each distinct value is parsed only once
+        codes, uniques = factorize(values)
+        parsed = to_datetime(Series(uniques), errors="coerce").to_numpy()
+        # Code -1 marks missing values, point them at an appended NaT of the same unit
+        lookup = np.append(parsed, np.array("NaT", dtype=parsed.dtype))
+        return Series(lookup[codes], index=values.index)
+
+    def to_integer(self, values: Series) -> Series:
+        if is_integer_dtype(values):
+            return values.astype("Int64")
+        numbers = (
+            values if is_numeric_dtype(values) else to_numeric(values, errors="coerce")
+        )
+        numbers = numbers.astype("float64")
+        # Amounts are already in minor units, a fraction left means the value is not an amount
+        whole = numbers.where(numbers == np.round(numbers))
+        return whole.astype("Int64")
+
+    def errors(
+        self, values: Series, invalid: Series, column: str, error: str
+    ) -> DataFrame:
+        rows = np.flatnonzero(invalid.to_numpy(dtype=bool, na_value=False))
+        return DataFrame(
+            {
+                "row": rows,
+                "column": column,
+                "value": values.iloc[rows].astype("string").to_numpy(),
+                "error": error,
+            }
+        )
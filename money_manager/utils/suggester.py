@@ -0,0 +1,334 @@
+import os
+
+import numpy as np
+from pandas import DataFrame, Series
+
+from money_manager.utils.utils import get_out_file_path, load_config
+
+# Value of category_rule for categories set by the suggester
+SUGGESTED_RULE = "nearest_neighbour"
+
+# Descriptions are truncated to this many characters before extracting n-grams
+DESCRIPTION_WIDTH = 64
+NGRAM_SIZE = 3
+BUCKET_BITS = 20
+# Trigrams found in more entries than this share of the index (and at least
+# MIN_STOP_FREQUENCY entries) are ignored, they say little about the merchant and
+# would make every description a candidate for every other
+MAX_DOCUMENT_SHARE = 0.01
+MIN_STOP_FREQUENCY = 100
+# Size of the block of similarities computed at once when scoring
+BATCH_CELLS = 1 << 22
+
+
+def normalize_descriptions(descriptions: Series) -> Series:
+    """Reduce descriptions to their words, dropping digits and punctuation.
+
+    Bank descriptions carry references, dates and card numbers that differ on every row of the
+    same merchant, so only the words are compared.
+    """
+    return (
+        descriptions.astype("string")
+        .fillna("")
+        .str.upper()
+        .str.replace(r"[\d\W_]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def ngram_buckets(descriptions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Hash the character trigrams of every description into buckets, fully vectorized.
+
+    Descriptions are padded with a space on each side and laid out as a fixed-width matrix of code
+    points, so every trigram is a combination of three shifted columns.
+
+    Args:
+        descriptions (np.ndarray): Array of normalized description strings.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Row numbers and bucket numbers of the distinct
+            (description, trigram) pairs.
+    """
+    if descriptions.shape[0] == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    text = descriptions.astype(f"U{DESCRIPTION_WIDTH - 2}")
+    padded = np.char.add(np.char.add(" ", text), " ").astype(f"U{DESCRIPTION_WIDTH}")
+    lengths = np.char.str_len(padded)
+    codes = (
+        padded.view(np.uint32)
+        .reshape(padded.shape[0], DESCRIPTION_WIDTH)
+        .astype(np.uint64)
+    )
+
+    # Unicode code points fit in 21 bits, so three of them pack into one 64 bit key
+    keys = (
+        (codes[:, :-2] << np.uint64(42))
+        | (codes[:, 1:-1] << np.uint64(21))
+        | codes[:, 2:]
+    )
+    hashed = (keys * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(64 - BUCKET_BITS)
+
+    positions = np.arange(DESCRIPTION_WIDTH - NGRAM_SIZE + 1)
+    rows, cols = np.nonzero(positions[None, :] < (lengths - NGRAM_SIZE + 1)[:, None])
+    pairs = np.unique(rows * (1 << BUCKET_BITS) + hashed[rows, cols].astype(np.int64))
+
+    return pairs >> BUCKET_BITS, pairs & ((1 << BUCKET_BITS) - 1)
+
+
+class CategorySuggester:
+    def __init__(
+        self, base_dir: str, ledger: DataFrame, min_similarity: float = 0.5
+    ) -> None:
+        """Suggest categories for uncategorized rows from the most similar hand-categorized rows.
+
+        Hand-categorized descriptions (category set, category_rule empty) are indexed as binary
+        character trigram vectors held in numpy arrays, scored with IDF-weighted cosine similarity.
+        The index is persisted as suggester_index.npz beside the ledger and only the newly labelled
+        rows are added to it on each run.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            ledger (DataFrame): The ledger to suggest categories for.
+            min_similarity (float, optional): Lowest similarity at which a suggestion is applied.
+        """
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        configs = load_config(configs_path)
+        out_file_path = get_out_file_path(
+            base_dir, configs["path_configs"]["out_file_path"]
+        )
+        self.index_path: str = os.path.join(
+            os.path.dirname(out_file_path), "suggester_index.npz"
+        )
+        self.ledger: DataFrame = ledger
+        self.min_similarity: float = min_similarity
+        self.index: dict[str, np.ndarray] = {}
+        self.replaced_rows: DataFrame = DataFrame()
+
+    def get_suggested_ledger(self) -> DataFrame:
+        """Fill category and tag of uncategorized rows whose best match is similar enough."""
+        self.update_index()
+        if self.index["entry_description"].shape[0] == 0:
+            return self.ledger
+
+        ledger = self.ledger
+        unlabelled = ledger["category"].isna()
+        if not unlabelled.any():
+            return ledger
+
+        descriptions = normalize_descriptions(ledger.loc[unlabelled, "description"])
+        unique_descriptions, codes = np.unique(
+            descriptions.to_numpy(dtype=str), return_inverse=True
+        )
+
+        row_entry = self.score(unique_descriptions)[codes]
+        suggested = row_entry >= 0
+        if not suggested.any():
+            return ledger
+
+        rows = ledger.index[unlabelled][suggested]
+        entries = row_entry[suggested]
+        self.replaced_rows = ledger.loc[rows]
+
+        ledger = ledger.copy()
+        values = {
+            "category": self.index["entry_category"][entries],
+            "tag": self.index["entry_tag"][entries],
+            "category_rule": np.full(entries.shape[0], SUGGESTED_RULE, dtype=object),
+        }
+        for col, col_values in values.items():
+            column = ledger[col].astype(object)
+            column.loc[rows] = [value if value != "" else None for value in col_values]
+            ledger[col] = column.astype("category")
+
+        print(f"Suggested categories for {rows.shape[0]} rows")
+
+        self.ledger = ledger
+        return ledger
+
+    def score(self, descriptions: np.ndarray) -> np.ndarray:
+        """Find the most similar indexed entry for each description.
+
+        The index is inverted by bucket, so only entries sharing at least one trigram with a
+        description are visited. Dot products are accumulated in dense blocks of BATCH_CELLS
+        (description, entry) cells, which bounds memory whatever the number of descriptions.
+
+        Args:
+            descriptions (np.ndarray): Distinct normalized descriptions.
+
+        Returns:
+            np.ndarray: Position of the best entry for each description, -1 below min_similarity.
+        """
+        index = self.index
+        n_entries = index["entry_description"].shape[0]
+        gram_entry, gram_bucket = index["gram_entry"], index["gram_bucket"]
+
+        # IDF weights and entry norms depend on the whole index, so they're computed here
+        document_frequency = np.bincount(gram_bucket, minlength=1 << BUCKET_BITS)
+        idf = np.log((1 + n_entries) / (1 + document_frequency)) + 1
+        stop_frequency = max(MAX_DOCUMENT_SHARE * n_entries, MIN_STOP_FREQUENCY)
+        idf[document_frequency > stop_frequency] = 0
+        entry_norm = np.sqrt(np.bincount(gram_entry, idf[gram_bucket] ** 2, n_entries))
+
+        # Entries are ranked by how often they were labelled so ties go to the most common one
+        by_count = np.argsort(-index["entry_count"], kind="stable")
+        rank = np.empty(n_entries, dtype=np.int64)
+        rank[by_count] = np.arange(n_entries)
+
+        # Postings: entries of the index grouped by bucket, without the stop trigrams
+        order = np.argsort(gram_bucket, kind="stable")
+        order = order[idf[gram_bucket[order]] > 0]
+        posting_rank, posting_bucket = rank[gram_entry[order]], gram_bucket[order]
+
+        query_rows, query_buckets = ngram_buckets(descriptions)
+        useful = idf[query_buckets] > 0
+        query_rows, query_buckets = query_rows[useful], query_buckets[useful]
+        query_norm = np.sqrt(
+            np.bincount(query_rows, idf[query_buckets] ** 2, descriptions.shape[0])
+        )
+
+        best = np.full(descriptions.shape[0], -1, dtype=np.int64)
+        batch_size = max(1, BATCH_CELLS // n_entries)
+        for first in range(0, descriptions.shape[0], batch_size):
+            last = min(first + batch_size, descriptions.shape[0])
+            lo, hi = np.searchsorted(query_rows, [first, last])
+            rows, buckets = query_rows[lo:hi] - first, query_buckets[lo:hi]
+
+            starts = np.searchsorted(posting_bucket, buckets, side="left")
+            lengths = np.searchsorted(posting_bucket, buckets, side="right") - starts
+
+            # Expand every (query trigram, posting) pair without a python loop
+            offsets = np.arange(lengths.sum()) - np.repeat(
+                np.cumsum(lengths) - lengths, lengths
+            )
+            pair_cell = (
+                np.repeat(rows, lengths) * n_entries
+                + posting_rank[np.repeat(starts, lengths) + offsets]
+            )
+            pair_weight = np.repeat(idf[buckets] ** 2, lengths)
+
+            dot = np.bincount(
+                pair_cell, pair_weight, minlength=(last - first) * n_entries
+            ).reshape(last - first, n_entries)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                similarity = dot / np.outer(
+                    query_norm[first:last], entry_norm[by_count]
+                )
+
+            top = np.argmax(np.nan_to_num(similarity), axis=1)
+            accepted = similarity[np.arange(last - first), top] >= self.min_similarity
+            best[first:last][accepted] = by_count[top[accepted]]
+
+        return best
+
+    def update_index(self) -> None:
+        """Load the persisted index and add the rows labelled since it was built.
+
+        The index is rebuilt from scratch when rows it contains are no longer labelled the same
+        way, e.g. their category was edited or their description was merged.
+        """
+        ledger = self.ledger
+        labelled = ledger.loc[
+            ledger["category"].notna() & ledger["category_rule"].isna(),
+            ["id", "description", "category", "tag"],
+        ]
+        labelled_ids = labelled["id"].astype("string").to_numpy(dtype=str)
+
+        self.index = self.load_index()
+        indexed_ids = self.index["indexed_ids"]
+        if not np.isin(indexed_ids, labelled_ids).all():
+            print("Rebuilding suggester index")
+            self.index = self.empty_index()
+            indexed_ids = self.index["indexed_ids"]
+
+        new_rows = labelled[~np.isin(labelled_ids, indexed_ids)]
+        if not new_rows.empty:
+            self.add_to_index(new_rows)
+
+    def add_to_index(self, rows: DataFrame) -> None:
+        """Add labelled rows, merging them into existing entries with the same description and labels."""
+        index = self.index
+        new_entries = (
+            DataFrame(
+                {
+                    "description": normalize_descriptions(rows["description"]),
+                    "category": rows["category"].astype("string").fillna(""),
+                    "tag": rows["tag"].astype("string").fillna(""),
+                }
+            )
+            .groupby(["description", "category", "tag"], sort=False)
+            .size()
+            .rename("count")
+            .reset_index()
+        )
+        existing = DataFrame(
+            {
+                "description": index["entry_description"],
+                "category": index["entry_category"],
+                "tag": index["entry_tag"],
+                "position": np.arange(index["entry_description"].shape[0]),
+            }
+        )
+        joined = new_entries.merge(
+            existing, on=["description", "category", "tag"], how="left"
+        )
+
+        known = joined["position"].notna()
+        counts = index["entry_count"].copy()
+        np.add.at(
+            counts,
+            joined.loc[known, "position"].to_numpy(dtype=np.int64),
+            joined.loc[known, "count"].to_numpy(dtype=np.int64),
+        )
+
+        added = joined.loc[~known]
+        descriptions = added["description"].to_numpy(dtype=str)
+        gram_rows, gram_buckets = ngram_buckets(descriptions)
+
+        self.index = {
+            "entry_description": np.concatenate(
+                [index["entry_description"], descriptions]
+            ),
+            "entry_category": np.concatenate(
+                [index["entry_category"], added["category"].to_numpy(dtype=str)]
+            ),
+            "entry_tag": np.concatenate(
+                [index["entry_tag"], added["tag"].to_numpy(dtype=str)]
+            ),
+            "entry_count": np.concatenate(
+                [counts, added["count"].to_numpy(dtype=np.int64)]
+            ),
+            "gram_entry": np.concatenate(
+                [index["gram_entry"], gram_rows + index["entry_description"].shape[0]]
+            ),
+            "gram_bucket": np.concatenate([index["gram_bucket"], gram_buckets]),
+            "indexed_ids": np.concatenate(
+                [index["indexed_ids"], rows["id"].astype("string").to_numpy(dtype=str)]
+            ),
+        }
+        print(f"Added {rows.shape[0]} labelled rows to the suggester index")
+
+    def load_index(self) -> dict[str, np.ndarray]:
+        if not os.path.exists(self.index_path):
+            return self.empty_index()
+        with np.load(self.index_path, allow_pickle=False) as saved:
+            return {name: saved[name] for name in saved.files}
+
+    def empty_index(self) -> dict[str, np.ndarray]:
+        return {
+            "entry_description": np.empty(0, dtype=str),
+            "entry_category": np.empty(0, dtype=str),
+            "entry_tag": np.empty(0, dtype=str),
+            "entry_count": np.empty(0, dtype=np.int64),
+            "gram_entry": np.empty(0, dtype=np.int64),
+            "gram_bucket": np.empty(0, dtype=np.int64),
+            "indexed_ids": np.empty(0, dtype=str),
+        }
+
+    def save_index(self) -> None:
+        if self.index:
+            np.savez(self.index_path, **self.index)
+
+    def get_replaced_rows(self) -> DataFrame:
+        """The rows as they were before this run suggested a category for them."""
+        return self.replaced_rows
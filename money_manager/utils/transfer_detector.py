@@ -0,0 +1,145 @@
+import hashlib
+import os
+
+import numpy as np
+from pandas import DataFrame, factorize
+
+from money_manager.utils.utils import load_config
+
+TRANSFER_TRAN_TYPE = "Transfer"
+
+
+class TransferDetector:
+    def __init__(self, base_dir: str, ledger: DataFrame) -> None:
+        """Pair the two sides of transfers between accounts and label them as such.
+
+        An outflow and an inflow of the same currency and absolute amount, on different accounts
+        and at most max_days apart (transfer_configs in configs.json), are the two sides of one
+        transfer. Both get tran_type Transfer and the same transfer_id. Transfers converted between
+        currencies don't have equal amounts and are not detected.
+
+        Args:
+            base_dir (str): Path to the project base directory.
+            ledger (DataFrame): The ledger with amount in minor units.
+        """
+        configs_path = os.path.join(base_dir, "configs", "configs.json")
+        transfer_configs = load_config(configs_path).get("transfer_configs", {})
+        self.max_days: int = transfer_configs.get("max_days", 3)
+        self.ledger: DataFrame = ledger
+        self.replaced_rows: DataFrame = DataFrame()
+
+    def get_transfer_ledger(self) -> DataFrame:
+        """Link the unpaired rows of the ledger that are two sides of a transfer."""
+        ledger = self.ledger
+        candidates = (
+            ledger["transfer_id"].isna()
+            & ledger["amount"].notna()
+            & (ledger["amount"] != 0)
+        )
+        if not candidates.any():
+            return ledger
+
+        outflow_rows, inflow_rows = self.pair(ledger.loc[candidates])
+        if outflow_rows.shape[0] == 0:
+            return ledger
+
+        outflow_ids = ledger.loc[outflow_rows, "id"].astype("string").to_numpy()
+        inflow_ids = ledger.loc[inflow_rows, "id"].astype("string").to_numpy()
+        transfer_ids = [
+            hashlib.sha256(f"{outflow_id}{inflow_id}".encode()).hexdigest()
+            for outflow_id, inflow_id in zip(outflow_ids, inflow_ids)
+        ]
+
+        rows = np.concatenate([outflow_rows, inflow_rows])
+        self.replaced_rows = ledger.loc[rows]
+
+        ledger = ledger.copy()
+        ledger.loc[rows, "transfer_id"] = transfer_ids + transfer_ids
+        tran_type = ledger["tran_type"].astype(object)
+        tran_type.loc[rows] = TRANSFER_TRAN_TYPE
+        ledger["tran_type"] = tran_type.astype("category")
+
+        print(f"Linked {outflow_rows.shape[0]} transfers between accounts")
+
+        self.ledger = ledger
+        return ledger
+
+    def pair(self, rows: DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """Match outflows with inflows of the same magnitude on other accounts.
+
+        Inflows are sorted on one key packing (currency, absolute amount) and day, so the inflows
+        within max_days of an outflow are a contiguous range found with two binary searches. Each
+        row is used once: pairs closest in time are taken first, and outflows whose closest inflow
+        went to another outflow try their next one.
+
+        Args:
+            rows (DataFrame): Candidate rows with date, account_name, currency and amount.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Index labels of the outflow and inflow of every pair.
+        """
+        amounts = rows["amount"].astype("int64").to_numpy()
+        days = rows["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+        accounts, _ = factorize(rows["account_name"].astype("string"))
+        groups = (
+            rows.groupby(
+                [rows["currency"].astype("string"), np.abs(amounts)],
+                dropna=False,
+                sort=False,
+            )
+            .ngroup()
+            .to_numpy()
+        )
+
+        # Pack (group, day) so sorting and searching happen on a single integer key
+        first_day = days.min() - self.max_days
+        span = days.max() + self.max_days - first_day + 1
+        keys = groups * span + (days - first_day)
+
+        outflows = np.flatnonzero(amounts < 0)
+        inflows = np.flatnonzero(amounts > 0)
+        inflows = inflows[np.argsort(keys[inflows], kind="stable")]
+        inflow_keys = keys[inflows]
+
+        starts = np.searchsorted(inflow_keys, keys[outflows] - self.max_days, "left")
+        ends = np.searchsorted(inflow_keys, keys[outflows] + self.max_days, "right")
+        lengths = ends - starts
+
+        # Expand every (outflow, inflow in its window) pair without a python loop
+        pair_out = np.repeat(outflows, lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(
+            np.cumsum(lengths) - lengths, lengths
+        )
+        pair_in = inflows[np.repeat(starts, lengths) + offsets]
+
+        other_account = accounts[pair_out] != accounts[pair_in]
+        pair_out, pair_in = pair_out[other_account], pair_in[other_account]
+        gaps = np.abs(days[pair_out] - days[pair_in])
+
+        order = np.lexsort((days[pair_out], gaps))
+        pair_out, pair_in = pair_out[order], pair_in[order]
+
+        matched_out = [np.empty(0, dtype=np.int64)]
+        matched_in = [np.empty(0, dtype=np.int64)]
+        while pair_out.shape[0] > 0:
+            # The closest inflow of each outflow, kept when no closer outflow claims it
+            _, best = np.unique(pair_out, return_index=True)
+            best = np.sort(best)
+            _, claimed = np.unique(pair_in[best], return_index=True)
+            accepted = best[claimed]
+            matched_out.append(pair_out[accepted])
+            matched_in.append(pair_in[accepted])
+
+            remaining = ~np.isin(pair_out, pair_out[accepted]) & ~np.isin(
+                pair_in, pair_in[accepted]
+            )
+            pair_out, pair_in = pair_out[remaining], pair_in[remaining]
+
+        return (
+            rows.index.to_numpy()[np.concatenate(matched_out)],
+            rows.index.to_numpy()[np.concatenate(matched_in)],
+        )
+
+    def get_replaced_rows(self) -> DataFrame:
+        """The rows as they were before this run linked them as transfers."""
+        return self.replaced_rows
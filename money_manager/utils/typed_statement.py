@@ -0,0 +1,82 @@
+import json
+from collections.abc import Iterator
+
+from pandas import DataFrame, read_csv, read_json, to_datetime
+
+# Typed statements are exported by the Tampermonkey scraper with its EXPORT_FORMAT set to "jsonl"
+# or "typed_csv". Their first line is the schema:
+#
+#   {"schema": "money_manager.typed_statement", "version": 1, "account": "...",
+#    "columns": [{"name": "Fecha", "type": "date"}, {"name": "Débitos", "type": "number"}, ...]}
+#
+# In CSV files it follows a "#" and the header and rows come next. In JSON Lines files every other
+# line is one row. Dates are ISO (YYYY-MM-DD), numbers are plain JSON or CSV numbers, empty cells
+# are null or empty, and text has its whitespace already collapsed.
+SCHEMA_NAME = "money_manager.typed_statement"
+SCHEMA_VERSION = 1
+EXTENSIONS = (".csv", ".jsonl")
+# Dtype each column type is read with, dates are read as text and parsed with DATE_FORMAT
+DTYPES = {"string": "str", "number": "float64", "date": "str"}
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def read_schema(file_path: str) -> dict | None:
+    """The schema of a typed statement file, None if the file is not one."""
+    if not file_path.endswith(EXTENSIONS):
+        return None
+    try:
+        with open(file_path, "r", encoding="utf-8-sig") as input_file:
+            first_line = input_file.readline().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if file_path.endswith(".csv"):
+        if not first_line.startswith("#"):
+            return None
+        first_line = first_line[1:]
+    try:
+        schema = json.loads(first_line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(schema, dict) or schema.get("schema") != SCHEMA_NAME:
+        return None
+    if schema.get("version") != SCHEMA_VERSION:
+        print(f"unsupported typed statement version {schema.get('version')}", end=" | ")
+        return None
+    return schema
+
+
+def read_typed_statement(
+    file_path: str, schema: dict, chunk_size: int | None = None
+) -> Iterator[DataFrame]:
+    """Read a typed statement file with the dtypes of its schema.
+
+    Args:
+        file_path (str): Path to the file, see read_schema.
+        schema (dict): Its schema.
+        chunk_size (int | None, optional): Rows per chunk, the whole file in one if None.
+
+    Yields:
+        DataFrame: The rows of the file, one chunk at a time.
+    """
+    columns = [column["name"] for column in schema["columns"]]
+    dtypes = {column["name"]: DTYPES[column["type"]] for column in schema["columns"]}
+    dates = [column["name"] for column in schema["columns"] if column["type"] == "date"]
+
+    with open(file_path, "r", encoding="utf-8-sig") as input_file:
+        input_file.readline()
+        if file_path.endswith(".jsonl"):
+            reader = read_json(
+                input_file,
+                lines=True,
+                dtype=False,
+                convert_dates=False,
+                chunksize=chunk_size or 1 << 62,
+            )
+        else:
+            reader = read_csv(input_file, dtype=dtypes, chunksize=chunk_size or 1 << 62)
+        for chunk in reader:
+            # Columns the rows leave out, e.g. all empty in JSON Lines, are still there
+            chunk = chunk.reindex(columns=columns).astype(dtypes)
+            for column in dates:
+                chunk[column] = to_datetime(chunk[column], format=DATE_FORMAT)
+            yield chunk
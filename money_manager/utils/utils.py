@@ -81,43 +81,35 @@ def is_valid_csv_file_path(file_path: str) -> bool:
     return os.path.exists(directory)
 
 
-def enforce_dataframe_schema(df, schema):
+def cast_dataframe_columns(df, schema):
     """
-    Enforce the given schema on the DataFrame by checking and casting the column types.
+    Cast the columns of the DataFrame that appear in the schema to their expected data types.
+    Columns that are missing from the DataFrame are skipped, which allows casting partial frames
+    such as cleaned statements. Casting a column that already has the expected type is a no-op.
 
     Parameters:
-    - df (pd.DataFrame): The DataFrame to enforce the schema on.
+    - df (pd.DataFrame): The DataFrame to cast.
     - schema (dict): A dictionary where keys are column names and values are the expected data types.
 
     Returns:
-    - pd.DataFrame: The DataFrame with enforced schema.
+    - pd.DataFrame: The DataFrame with its columns cast.
     """
-    # Check for missing columns
-    missing_columns = [col for col in schema.keys() if col not in df.columns]
-    if missing_columns:
-        raise ValueError(
-            f"Transactions dataframe has missing columns. Missing columns: {missing_columns}"
-        )
-
-    # Check for extra columns
-    extra_columns = [col for col in df.columns if col not in schema.keys()]
-    if extra_columns:
-        raise ValueError(
-            f"Transactions dataframe has extra columns. Extra columns: {extra_columns}"
-        )
-
-    # Check for correct data types
     for col, dtype in schema.items():
         if col in df.columns:
-            current_dtype = str(df[col].dtype)
             if dtype == "datetime64[ns]":
                 df[col] = pd.to_datetime(df[col], errors="coerce")
             elif dtype == "float64":
                 df[col] = df[col].astype("float64")
             elif dtype == "int64":
                 df[col] = df[col].astype("int64")
+            elif dtype == "Int64":
+                df[col] = df[col].astype("Int64")
             elif dtype == "string":
                 df[col] = df[col].astype("string")
+            elif dtype == "string[pyarrow]":
+                df[col] = df[col].astype("string[pyarrow]")
+            elif dtype == "category":
+                df[col] = df[col].astype("category")
             elif dtype == "object":
                 df[col] = df[col].astype("object")
             else:
@@ -127,7 +119,7 @@ def enforce_dataframe_schema(df, schema):
             current_dtype_str = str(df[col].dtype)
             if dtype == "datetime64[ns]" and current_dtype_str.startswith("datetime64"):
                 pass
-            elif current_dtype_str != dtype:
+            elif df[col].dtype != dtype:
                 raise ValueError(
                     f"Column {col} has incorrect data type. Expected {dtype}, got {df[col].dtype}."
                 )
@@ -135,6 +127,26 @@ def enforce_dataframe_schema(df, schema):
     return df
 
 
+def get_csv_dtypes(schema, minor_unit_cols: list[str]) -> dict[str, str]:
+    """
+    Build the dtype mapping used to read a CSV that follows the schema, so columns are created
+    with their final types and don't need to be converted after reading. Datetime columns are
+    left out because they are parsed by the schema enforcement. Minor unit columns are stored
+    as decimal amounts in the CSV so they are read as floats.
+
+    Parameters:
+    - schema (dict): A dictionary where keys are column names and values are the expected data types.
+    - minor_unit_cols (list[str]): Columns held in minor units (cents) in memory.
+
+    Returns:
+    - dict: Column names mapped to the dtype read_csv should use.
+    """
+    dtypes = {col: dtype for col, dtype in schema.items() if dtype != "datetime64[ns]"}
+    for col in minor_unit_cols:
+        dtypes[col] = "float64"
+    return dtypes
+
+
 def delete_inputs(statements: list[Statement]) -> None:
     for statement in statements:
         if statement.merged:
@@ -151,9 +163,14 @@ def get_tran_cols() -> list[str]:
         "tran_type",
         "category",
         "tag",
+        "category_rule",
         "description",
         "notes",
         "currency",
         "amount",
+        "statement_balance",
+        "running_balance",
+        "reporting_amount",
+        "transfer_id",
         "id",
     ]
@@ -0,0 +1,59 @@
+import tempfile
+import unittest
+
+from pandas import DataFrame
+
+from benchmarks.generator import build_workspace
+from money_manager.utils.categorizer import Categorizer
+
+
+class MatchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.base_dir = tempfile.TemporaryDirectory()
+        build_workspace(self.base_dir.name, 40, 8)
+        self.rows = DataFrame(
+            {
+                "description": [
+                    "Uber Trip 12345",
+                    "FARMACIA 1123",
+                    "LIDL 48210",
+                    "SHELL 9876",
+                    None,
+                ],
+                "account_name": "BENCH BAC SAVINGS",
+                "amount": [-1200, -350, -4210, -6000, -100],
+            }
+        )
+
+    def tearDown(self) -> None:
+        self.base_dir.cleanup()
+
+    def match(self, rules: list[dict]) -> list[int]:
+        categorizer = Categorizer(self.base_dir.name, DataFrame())
+        return categorizer.match(self.rows, rules).tolist()
+
+    def test_regexes_that_cant_share_the_combined_pattern(self) -> None:
+        rules = [
+            {"name": "inline flags", "regex": "(?i)uber", "category": "Transport"},
+            {"name": "backreference", "regex": r"(\d)\1", "category": "Health"},
+            {"name": "named group", "regex": "(?P<shop>LIDL)", "category": "Groceries"},
+            {"name": "same group", "regex": "(?P<shop>SHELL)", "category": "Fuel"},
+            {"name": "keywords", "keywords": ["uber", "lidl"], "category": "Other"},
+        ]
+
+        # 1123 and 48210 hold no repeated digit, 9876 neither
+        self.assertEqual(self.match(rules), [0, 1, 2, 3, -1])
+        self.assertEqual(self.match(rules[1:]), [3, 0, 1, 2, -1])
+
+    def test_invalid_regex_names_its_rule(self) -> None:
+        rules = [
+            {"name": "rides", "keywords": ["UBER"], "category": "Transport"},
+            {"name": "broken", "regex": "LIDL(", "category": "Groceries"},
+        ]
+
+        with self.assertRaisesRegex(ValueError, "broken"):
+            self.match(rules)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from benchmarks.generator import build_workspace
+from money_manager.processor import Processor
+
+HEADER = "Account Name,Fecha,Referencia,Descripción,Débitos,Créditos,Balance\n"
+ACCOUNT = "BENCH BAC SAVINGS"
+
+
+class MergeStatementsTest(unittest.TestCase):
+    def test_later_statement_merges_into_rows_added_by_earlier_one(self) -> None:
+        with tempfile.TemporaryDirectory() as base_dir:
+            build_workspace(base_dir, 40, 8)
+            in_dir = os.path.join(base_dir, "data", "in")
+            for filename in os.listdir(in_dir):
+                os.remove(os.path.join(in_dir, filename))
+            descriptions = {
+                f"{ACCOUNT}.csv": "UBER TRIP 12345",
+                f"{ACCOUNT} (1).csv": "UBER TRIP 12345 HN",
+            }
+            for filename, description in descriptions.items():
+                with open(os.path.join(in_dir, filename), "w") as statement:
+                    statement.write(HEADER)
+                    statement.write(
+                        f"{ACCOUNT},15/03/2024,1,{description},120.00,,880.00\n"
+                    )
+
+            processor = Processor(base_dir, workers=1)
+            with contextlib.redirect_stdout(io.StringIO()):
+                processor.process()
+            ledger = processor.get_ledger()
+            trips = ledger[ledger["description"].str.startswith("UBER TRIP 12345")]
+            added = processor.get_added_rows()
+
+            # The statement merged last replaces the description of the row the first one added
+            last = processor.cleaned_statements[-1].filename
+            self.assertEqual(trips.shape[0], 1)
+            self.assertEqual(trips["description"].iloc[0], descriptions[last])
+            self.assertEqual(added["id"].tolist(), trips["id"].tolist())
+            for merges in processor.merges:
+                self.assertTrue(merges["id"].isin(ledger["id"]).all())
+
+
+class KnownStatementsTest(unittest.TestCase):
+    def run_processor(self, base_dir: str) -> Processor:
+        processor = Processor(base_dir, workers=1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.process()
+            processor.save()
+        return processor
+
+    def test_statements_already_in_the_ledger_leave_it_unread_and_unwritten(
+        self,
+    ) -> None:
+        with tempfile.TemporaryDirectory() as base_dir:
+            build_workspace(base_dir, 40, 8)
+            ledger_path = os.path.join(base_dir, "data", "out", "transactions.csv")
+            self.assertFalse(self.run_processor(base_dir).unchanged)
+            written = os.stat(ledger_path).st_mtime_ns
+
+            processor = self.run_processor(base_dir)
+            self.assertTrue(processor.unchanged)
+            self.assertEqual(os.stat(ledger_path).st_mtime_ns, written)
+
+            # One row the ledger doesn't have is merged as before
+            with open(
+                os.path.join(base_dir, "data", "in", f"{ACCOUNT}.csv"), "a"
+            ) as statement:
+                statement.write(
+                    f"{ACCOUNT},15/03/2024,1,NEW SHOP 12345,120.00,,880.00\n"
+                )
+            processor = self.run_processor(base_dir)
+            self.assertFalse(processor.unchanged)
+            self.assertEqual(processor.get_added_rows().shape[0], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()